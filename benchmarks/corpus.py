@@ -0,0 +1,247 @@
+"""
+Synthetic journals for benchmarks. Entries are generated from a seed at a
+configurable scale and written in the layouts mento reads: an Orgzly file, an
+Org list file and a directory of GPG encrypted Org Journal day files.
+
+Journal days are encrypted with a low S2K count by default, as gpg's default
+takes most of a second per file to encrypt and to decrypt. Pass
+--s2k-count=0 to keep gpg's default and measure what real journals cost.
+
+Usage: python -m benchmarks.corpus <directory> [--years=<n>] [--per-day=<n>] [--trackers=<d>]
+                                   [--people=<d>] [--contexts=<d>] [--layouts=<l,...>] [--seed=<n>]
+                                   [--s2k-count=<n>]
+"""
+
+import concurrent.futures
+import datetime
+import os
+import random
+import shutil
+import subprocess
+import sys
+from dataclasses import asdict, dataclass
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from mento.types import Source, SourceType
+
+PASSPHRASE = "benchmark"
+LAYOUTS = ["orgzly", "org_list", "org_journal"]
+
+WORDS = (
+    "felt today after long walk some reading with friends home work slept early late "
+    "meeting lunch dinner coffee tea tired calm anxious happy sad good bad great awful "
+    "nice terrible quiet busy morning evening call wrote code train rain sunny cold"
+).split()
+
+TRACKERS = [
+    ("mood", lambda rng: rng.randint(-2, 2)),
+    ("sleep", lambda rng: rng.randint(4, 10)),
+    ("coffee", lambda rng: rng.randint(0, 4)),
+    ("exercise", lambda rng: rng.randint(10, 90)),
+    ("attack", lambda rng: None),
+    ("headache", lambda rng: None),
+]
+PEOPLE = ["alice", "bob", "carol", "dave", "erin", "frank", "grace", "heidi"]
+CONTEXTS = ["work", "home", "travel", "gym", "family", "project-x"]
+
+
+@dataclass
+class CorpusConfig:
+    """
+    Scale of a synthetic journal. Densities are the mean number of
+    annotations of each kind per entry.
+    """
+
+    years: int = 2
+    per_day: float = 5.0
+    trackers: float = 1.5
+    people: float = 0.5
+    contexts: float = 0.3
+    seed: int = 0
+    s2k_count: int = 65536
+    end: datetime.date = datetime.date(2021, 12, 31)
+
+    def as_dict(self) -> Dict:
+        return {**asdict(self), "end": self.end.isoformat()}
+
+
+class RawEntry(NamedTuple):
+    date: datetime.date
+    time: datetime.time
+    title: str
+    body: str
+
+
+def _count(rng: random.Random, density: float) -> int:
+    return int(density) + (rng.random() < density % 1)
+
+
+def _body(rng: random.Random, config: CorpusConfig) -> str:
+    words = [rng.choice(WORDS) for _ in range(rng.randint(5, 60))]
+
+    for _ in range(_count(rng, config.trackers)):
+        name, value = rng.choice(TRACKERS)
+        v = value(rng)
+        words.append(f"#{name}" if v is None else f"#{name}({v})")
+    for _ in range(_count(rng, config.people)):
+        words.append(f"@{rng.choice(PEOPLE)}")
+    for _ in range(_count(rng, config.contexts)):
+        words.append(f"+{rng.choice(CONTEXTS)}")
+
+    rng.shuffle(words)
+    return " ".join(words)
+
+
+def generate(config: CorpusConfig) -> Iterator[RawEntry]:
+    """
+    Yield entries of `config.years` years till `config.end`, in order.
+    """
+
+    rng = random.Random(config.seed)
+    start = datetime.date(config.end.year - config.years + 1, 1, 1)
+
+    for ordinal in range(start.toordinal(), config.end.toordinal() + 1):
+        date = datetime.date.fromordinal(ordinal)
+        minutes = sorted(rng.randint(6 * 60, 24 * 60 - 1) for _ in range(_count(rng, rng.uniform(0, 2 * config.per_day))))
+
+        for m in minutes:
+            title = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 4)))
+            yield RawEntry(date, datetime.time(m // 60, m % 60), title, _body(rng, config))
+
+
+def _stamp(entry: RawEntry) -> str:
+    return f"[{entry.date.isoformat()} {entry.date.strftime('%a')} {entry.time.strftime('%H:%M')}]"
+
+
+def write_orgzly(path: str, entries: List[RawEntry]):
+    with open(path, "w") as fp:
+        for e in entries:
+            fp.write(f"* log\n:PROPERTIES:\n:CREATED:  {_stamp(e)}\n:END:\n{e.title}\n{e.body}\n")
+
+
+def write_org_list(path: str, entries: List[RawEntry]):
+    year = None
+    with open(path, "w") as fp:
+        for e in entries:
+            if e.date.year != year:
+                year = e.date.year
+                fp.write("* Log\n")
+            fp.write(f"+ {_stamp(e)} {e.title}\n  {e.body}\n")
+
+
+def make_gpg_home(directory: str) -> str:
+    """
+    Create an empty GPG home in `directory` so that benchmarks don't touch the
+    user's keyring or agent.
+    """
+
+    home = os.path.join(directory, "gnupg")
+    os.makedirs(home, mode=0o700, exist_ok=True)
+    return home
+
+
+def close_gpg_home(home: str):
+    """
+    Stop the agent started for `home`, if any.
+    """
+
+    if shutil.which("gpgconf"):
+        subprocess.run(["gpgconf", "--homedir", home, "--kill", "gpg-agent"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def write_org_journal(directory: str, entries: List[RawEntry], gnupghome: str, s2k_count: int = 0, workers: int = 8):
+    """
+    Write one file per day, named like org-journal does, with the whole day
+    encrypted under a heading tagged :crypt:. A zero `s2k_count` keeps gpg's
+    default.
+    """
+
+    import gnupg
+
+    gpg = gnupg.GPG(gnupghome=gnupghome)
+    extra_args = ["--s2k-count", str(s2k_count)] if s2k_count else None
+    os.makedirs(directory, exist_ok=True)
+
+    days: Dict[datetime.date, List[RawEntry]] = {}
+    for e in entries:
+        days.setdefault(e.date, []).append(e)
+
+    def _write(date: datetime.date):
+        text = "".join(f"** {e.time.strftime('%H:%M')} {e.title}\n{e.body}\n" for e in days[date])
+        ciphertext = gpg.encrypt(text, recipients=None, symmetric=True, passphrase=PASSPHRASE, armor=True, extra_args=extra_args)
+        if not ciphertext.ok:
+            raise RuntimeError(f"Encryption failed: {ciphertext.status}")
+
+        with open(os.path.join(directory, date.strftime("%Y%m%d")), "w") as fp:
+            fp.write(f"* {date.strftime('%A, %m/%d/%y')} :crypt:\n{ciphertext}")
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(_write, days))
+
+
+def build_corpus(directory: str, config: CorpusConfig, layouts: List[str] = LAYOUTS, gnupghome: Optional[str] = None) -> Tuple[int, Dict[str, Source]]:
+    """
+    Write the same entries in each of `layouts` under `directory`. Return the
+    number of entries and sources by layout. Org Journal needs `gnupghome`.
+    """
+
+    entries = list(generate(config))
+    sources = {}
+
+    for layout in layouts:
+        if layout == "orgzly":
+            path = os.path.join(directory, "orgzly.org")
+            write_orgzly(path, entries)
+            sources[layout] = Source(SourceType.ORGZLY, path, "")
+        elif layout == "org_list":
+            path = os.path.join(directory, "list.org")
+            write_org_list(path, entries)
+            sources[layout] = Source(SourceType.ORG_LIST, path, "")
+        elif layout == "org_journal":
+            if gnupghome is None:
+                raise ValueError("Org Journal layout needs a GPG home")
+            path = os.path.join(directory, "journal")
+            write_org_journal(path, entries, gnupghome, config.s2k_count)
+            sources[layout] = Source(SourceType.ORG_JOURNAL, path, "")
+        else:
+            raise ValueError(f"Unknown layout: {layout}")
+
+    return len(entries), sources
+
+
+def parse_args(argv: List[str]) -> Tuple[CorpusConfig, List[str], Dict[str, str]]:
+    """
+    Read corpus options of the form --name=value from `argv`, returning the
+    config, layouts and the other options.
+    """
+
+    opts = dict(a[2:].split("=", 1) for a in argv if a.startswith("--") and "=" in a)
+    config = CorpusConfig(
+        years=int(opts.pop("years", CorpusConfig.years)),
+        per_day=float(opts.pop("per-day", CorpusConfig.per_day)),
+        trackers=float(opts.pop("trackers", CorpusConfig.trackers)),
+        people=float(opts.pop("people", CorpusConfig.people)),
+        contexts=float(opts.pop("contexts", CorpusConfig.contexts)),
+        seed=int(opts.pop("seed", CorpusConfig.seed)),
+        s2k_count=int(opts.pop("s2k-count", CorpusConfig.s2k_count)),
+    )
+    layouts = opts.pop("layouts").split(",") if "layouts" in opts else LAYOUTS
+
+    return config, layouts, opts
+
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    if not args:
+        sys.exit(__doc__)
+
+    config, layouts, _ = parse_args(sys.argv[1:])
+    os.makedirs(args[0], exist_ok=True)
+
+    home = make_gpg_home(args[0])
+    n, sources = build_corpus(args[0], config, layouts, home if "org_journal" in layouts else None)
+    close_gpg_home(home)
+
+    print(f"{n} entries")
+    for layout, source in sources.items():
+        print(f"{layout:>12}: {source.path}")
@@ -0,0 +1,82 @@
+"""
+Compare the org scanner with orgparse on the node layouts mento reads.
+
+Usage: python -m benchmarks.scanner [--entries=<n>]
+"""
+
+import random
+import sys
+import timeit
+
+import orgparse
+
+from mento.scanner import load_node, load_nodes
+
+WORDS = "felt okay today after a long walk and some reading with friends at home".split()
+
+
+def make_body(rng):
+    words = [rng.choice(WORDS) for _ in range(rng.randint(5, 60))]
+    words.append(f"#mood({rng.randint(-2, 2)})")
+    return " ".join(words)
+
+
+def make_orgzly(n, seed=0):
+    rng = random.Random(seed)
+    lines = []
+
+    for i in range(n):
+        lines.extend([
+            "* log",
+            ":PROPERTIES:",
+            f":CREATED:  [2021-02-{i % 28 + 1:02} Sun {rng.randint(0, 23):02}:{rng.randint(0, 59):02}]",
+            ":END:",
+            make_body(rng),
+        ])
+
+    return "\n".join(lines)
+
+
+def make_journal(n, seed=0):
+    rng = random.Random(seed)
+    lines = ["* Sunday, 02/21/21"]
+
+    for _ in range(n):
+        lines.append(f"** {rng.randint(0, 23):02}:{rng.randint(0, 59):02} {make_body(rng)}")
+        lines.append(make_body(rng))
+
+    return "\n".join(lines)
+
+
+def split_nodes(text):
+    nodes = []
+    for line in text.splitlines():
+        if line.startswith("* "):
+            nodes.append([])
+        nodes[-1].append(line)
+    return nodes
+
+
+def bench(name, fn, repeat=5):
+    best = min(timeit.repeat(fn, number=1, repeat=repeat))
+    print(f"{name:>24}: {best * 1000:8.2f} ms")
+    return best
+
+
+def main(n=20000):
+    orgzly = split_nodes(make_orgzly(n))
+    journal = make_journal(n)
+    print(f"{n} entries")
+
+    for layout, base_fn, fn in [
+            ("orgzly nodes", lambda: [orgparse.loadi(lines)[1] for lines in orgzly], lambda: [load_node(lines) for lines in orgzly]),
+            ("journal day", lambda: orgparse.loads(journal)[1:], lambda: load_nodes(journal)),
+    ]:
+        base = bench(f"{layout}, orgparse", base_fn)
+        t = bench(f"{layout}, scanner", fn)
+        print(f"{'':>24}  {base / t:.2f}x")
+
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if a.startswith("--entries=")]
+    main(int(args[0].split("=")[1]) if args else 20000)
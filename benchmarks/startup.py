@@ -0,0 +1,74 @@
+"""
+Cold start times of the mento entry point, each in a new interpreter, checked
+against a budget. Exits with status 1 if any command goes over its budget.
+
+Usage: python -m benchmarks.startup [--budget=<ms>] [--gui-budget=<ms>] [--repeat=<n>]
+"""
+
+import importlib.util
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.scanner import make_orgzly
+
+# Best of the runs in milliseconds
+BUDGET = 400
+GUI_BUDGET = 3000
+
+MAIN = "import sys; from mento.cli import main; sys.argv[0] = 'mento'; main()"
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run(args, env):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, *args], env=env, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def main(budget=BUDGET, gui_budget=GUI_BUDGET, repeat=5):
+    env = {**os.environ, "PYTHONPATH": ROOT, "QT_QPA_PLATFORM": "offscreen"}
+
+    with tempfile.TemporaryDirectory() as directory:
+        db = os.path.join(directory, "db.sqlite")
+        source = os.path.join(directory, "orgzly.org")
+        with open(source, "w") as fp:
+            fp.write(make_orgzly(2000))
+
+        run(["-c", MAIN, "init", db], env)
+        with sqlite3.connect(db) as con:
+            con.execute("INSERT INTO sources (type, path) VALUES ('ORGZLY', ?)", (source, ))
+        run(["-c", MAIN, "refresh", db, "--analyzer=lexicon"], env)
+
+        commands = [
+            ("python", ["-c", "pass"], None),
+            ("import", ["-c", "import mento.cli"], budget),
+            ("init", ["-c", MAIN, "init", db], budget),
+            ("stats", ["-c", MAIN, "stats", db, "--analyzer=lexicon"], budget),
+        ]
+        if importlib.util.find_spec("PyQt5") is not None:
+            commands.append(("window", ["-c", MAIN, db, "--no-refresh", "--no-watch", "--profile-startup", "--analyzer=lexicon"], gui_budget))
+
+        over = []
+        for name, args, limit in commands:
+            best = min(run(args, env) for _ in range(repeat)) * 1000
+            status = "" if limit is None else f"budget {limit:.0f} ms" + (", OVER" if best > limit else "")
+            print(f"{name:>10}: {best:8.1f} ms  {status}")
+            if limit is not None and best > limit:
+                over.append(name)
+
+    if over:
+        print(f"Over budget: {', '.join(over)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    opts = dict(a[2:].split("=", 1) for a in sys.argv[1:] if a.startswith("--") and "=" in a)
+    main(
+        budget=float(opts.get("budget", BUDGET)),
+        gui_budget=float(opts.get("gui-budget", GUI_BUDGET)),
+        repeat=int(opts.get("repeat", 5))
+    )
@@ -0,0 +1,217 @@
+"""
+Benchmark parsing, refresh, entry loading, stats aggregates and plots on a
+synthetic journal in each source layout. Results are written as JSON so runs
+on different commits can be compared with --baseline.
+
+Usage: python -m benchmarks.suite [--years=<n>] [--per-day=<n>] [--trackers=<d>] [--people=<d>]
+                                  [--contexts=<d>] [--layouts=<l,...>] [--seed=<n>] [--s2k-count=<n>] [--repeat=<n>]
+                                  [--analyzer=<name>] [--output=<path>] [--baseline=<path>]
+"""
+
+import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import matplotlib
+matplotlib.use("Agg")
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+import mento.stats as stats
+import mento.viz as viz
+from benchmarks.corpus import (PASSPHRASE, build_corpus, close_gpg_home,
+                               make_gpg_home, parse_args)
+from mento.decrypt import Decryptor
+from mento.frame import EntryFrame
+from mento.parser import parse_source_file, source_files
+from mento.render import CORRELATION_FEATURES, calendar_colors, year_correlations
+from mento.store import SQLiteStore
+from mento.types import Source
+
+AGGREGATES = [stats.aggregate_count, stats.aggregate_mean_mood, stats.aggregate_mean_polarity, stats.aggregate_mentions]
+
+
+class Suite:
+    """
+    Runs benchmarks, keeping all durations of each under its name.
+    """
+
+    def __init__(self, repeat: int):
+        self.repeat = repeat
+        self.results: List[Dict[str, Any]] = []
+
+    def bench(self, name: str, fn: Callable[[], Any], setup: Optional[Callable[[], None]] = None, repeat: Optional[int] = None, **info):
+        runs = []
+        for _ in range(repeat or self.repeat):
+            if setup is not None:
+                setup()
+            start = time.perf_counter()
+            fn()
+            runs.append(time.perf_counter() - start)
+
+        self.results.append({"name": name, **info, "best": min(runs), "runs": runs})
+        print(f"{name:>36}: {min(runs) * 1000:10.2f} ms", file=sys.stderr)
+
+
+def git_commit() -> Optional[str]:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        out = subprocess.run(["git", "-C", root, "rev-parse", "HEAD"], capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+
+def open_store(path: str, source: Source, analyzer: str) -> SQLiteStore:
+    store = SQLiteStore(path, analyzer=analyzer)
+    store.con.execute("INSERT INTO sources (type, path, config) VALUES (?, ?, ?)", (source.source_type.name, source.path, source.config))
+    store.con.commit()
+    return store
+
+
+def bench_layout(suite: Suite, directory: str, layout: str, source: Source, analyzer: str) -> str:
+    """
+    Time parsing and refresh of a source, and return the path of its
+    refreshed database.
+    """
+
+    def _parse():
+        with Decryptor(PASSPHRASE) as decryptor:
+            for filepath in source_files(source):
+                for _ in parse_source_file(source, filepath, decryptor):
+                    pass
+
+    suite.bench(f"parse.{layout}", _parse, layout=layout)
+
+    path = os.path.join(directory, f"{layout}.sqlite")
+    state: Dict[str, SQLiteStore] = {}
+
+    def _fresh_store():
+        if os.path.exists(path):
+            os.remove(path)
+        state["store"] = open_store(path, source, analyzer)
+
+    def _refresh():
+        state["store"].refresh(ask=lambda s: PASSPHRASE)
+
+    suite.bench(f"refresh.cold.{layout}", _refresh, setup=_fresh_store, layout=layout)
+    suite.bench(f"refresh.warm.{layout}", _refresh, layout=layout)
+
+    store = state["store"]
+    suite.bench(f"entries.{layout}", lambda: store.entries, layout=layout, entries=len(store.entries))
+    store.con.close()
+
+    return path
+
+
+def bench_stats(suite: Suite, store: SQLiteStore):
+    suite.bench("frame.from_store", lambda: EntryFrame.from_store(store))
+    frame = EntryFrame.from_store(store)
+
+    for fn in AGGREGATES:
+        suite.bench(f"stats.{fn.__name__}", lambda: fn(frame))
+        suite.bench(f"stats.{fn.__name__}.by_date", lambda: stats.aggregate_by_date(frame, fn))
+
+    date_range = store.date_range()
+    assert date_range is not None
+    start, end = date_range
+
+    for metric, tracker in [("count", None), ("mean", "mood"), ("mentions", None), ("polarity", None)]:
+        suite.bench(f"store.aggregate.{metric}", lambda: store.aggregate(metric, start, end, tracker=tracker))
+        suite.bench(f"store.aggregate.{metric}.hour", lambda: store.aggregate(metric, start, end, group_by="hour", tracker=tracker))
+
+
+def bench_viz(suite: Suite, store: SQLiteStore):
+    date_range = store.date_range()
+    assert date_range is not None
+    year = date_range[1].year
+
+    def _draw(plot: Callable[[Figure], Any]):
+        def _run():
+            fig = Figure(figsize=(12, 9))
+            canvas = FigureCanvasAgg(fig)
+            plot(fig)
+            canvas.draw()
+        return _run
+
+    colors = calendar_colors(store, year, "mood")
+    points = viz.MoodPoints(store.find_entries(tracker="mood"))
+    names, matrices = year_correlations(store, year, CORRELATION_FEATURES)
+
+    suite.bench("viz.calendar_colors", lambda: calendar_colors(store, year, "mood"))
+    suite.bench("viz.mood_points", lambda: viz.MoodPoints(store.find_entries(tracker="mood")))
+    suite.bench("viz.year_correlations", lambda: year_correlations(store, year, CORRELATION_FEATURES))
+
+    suite.bench("viz.plot_year", _draw(lambda fig: viz.plot_year(fig, year, colors)))
+    suite.bench("viz.plot_year_polar", _draw(lambda fig: viz.plot_year_polar(fig, year, points)))
+    suite.bench("viz.plot_year_correlation", _draw(lambda fig: viz.plot_year_correlation(fig, year, names, matrices)))
+
+
+def compare(results: List[Dict[str, Any]], baseline_path: str):
+    with open(baseline_path) as fp:
+        baseline = {r["name"]: r["best"] for r in json.load(fp)["results"]}
+
+    print(f"\nCompared to {baseline_path}", file=sys.stderr)
+    for r in results:
+        if r["name"] in baseline:
+            print(f"{r['name']:>36}: {baseline[r['name']] / r['best']:6.2f}x", file=sys.stderr)
+
+
+def main(argv: List[str]):
+    config, layouts, opts = parse_args(argv)
+    repeat = int(opts.get("repeat", 3))
+    analyzer = opts.get("analyzer", "lexicon")
+
+    if "org_journal" in layouts and shutil.which("gpg") is None:
+        print("gpg not found, skipping org_journal", file=sys.stderr)
+        layouts = [layout for layout in layouts if layout != "org_journal"]
+
+    suite = Suite(repeat)
+
+    with tempfile.TemporaryDirectory() as directory:
+        home = make_gpg_home(directory)
+        os.environ["GNUPGHOME"] = home
+
+        try:
+            start = time.perf_counter()
+            n, sources = build_corpus(directory, config, layouts, home)
+            print(f"{n} entries, generated in {time.perf_counter() - start:.1f} s", file=sys.stderr)
+
+            paths = [bench_layout(suite, directory, layout, source, analyzer) for layout, source in sources.items()]
+
+            store = SQLiteStore(paths[0], analyzer=analyzer)
+            bench_stats(suite, store)
+            bench_viz(suite, store)
+        finally:
+            close_gpg_home(home)
+
+    output = {
+        "commit": git_commit(),
+        "time": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {**config.as_dict(), "entries": n, "layouts": layouts, "analyzer": analyzer, "repeat": repeat},
+        "results": suite.results,
+    }
+
+    if "output" in opts:
+        with open(opts["output"], "w") as fp:
+            json.dump(output, fp, indent=2)
+    else:
+        json.dump(output, sys.stdout, indent=2)
+        print()
+
+    if "baseline" in opts:
+        compare(suite.results, opts["baseline"])
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
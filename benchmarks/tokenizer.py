@@ -0,0 +1,67 @@
+"""
+Compare the single pass tokenizer with the separate regex scans it replaced.
+
+Usage: python -m benchmarks.tokenizer [--entries=<n>]
+"""
+
+import random
+import re
+import sys
+import timeit
+
+from mento.tokenizer import TOKENIZER, Tokenizer
+from mento.types import Context, Person, Tracker
+
+WORDS = "felt okay today after a long walk and some reading with friends at home".split()
+
+
+def separate_scans(text):
+    trackers = []
+    for match in re.finditer(r"#([a-zA-Z\d\-]+)(\((\-?\d+)\))?", text):
+        trackers.append(Tracker(match.group(1), int(match.group(3)) if match.group(3) is not None else None))
+
+    contexts = [Context(match.group(1)) for match in re.finditer(r"\+([a-zA-Z\d\-]+)", text)]
+    people = [Person(match.group(1)) for match in re.finditer(r"@([a-zA-Z\d\-]+)", text)]
+
+    return trackers, people, contexts
+
+
+def make_bodies(n, seed=0):
+    rng = random.Random(seed)
+    bodies = []
+
+    for _ in range(n):
+        words = [rng.choice(WORDS) for _ in range(rng.randint(5, 60))]
+        words.append(f"#mood({rng.randint(-2, 2)})")
+        if rng.random() < 0.5:
+            words.append(f"@p{rng.randint(1, 5)}")
+        if rng.random() < 0.3:
+            words.append("+work")
+        rng.shuffle(words)
+        bodies.append(" ".join(words))
+
+    return bodies
+
+
+def bench(name, fn, bodies, repeat=5):
+    best = min(timeit.repeat(lambda: [fn(b) for b in bodies], number=1, repeat=repeat))
+    print(f"{name:>24}: {best * 1000:8.2f} ms  ({best / len(bodies) * 1e6:.2f} us/entry)")
+    return best
+
+
+def main(n=20000):
+    bodies = make_bodies(n)
+    print(f"{n} entries, {sum(map(len, bodies)) / n:.0f} chars on average")
+
+    base = bench("separate scans", separate_scans, bodies)
+    for name, fn in [
+            ("tokenizer", TOKENIZER.annotations),
+            ("tokenizer, all values", Tokenizer(["duration", "float", "int"]).annotations),
+    ]:
+        t = bench(name, fn, bodies)
+        print(f"{'':>24}  {base / t:.2f}x")
+
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if a.startswith("--entries=")]
+    main(int(args[0].split("=")[1]) if args else 20000)
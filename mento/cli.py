@@ -3,47 +3,289 @@ Mento
 
 Usage:
   mento init <database>
-  mento <database> [(--no-refresh|--force-refresh)]
+  mento refresh <database> [--force] [--analyzer=<name>] [--gpg-workers=<n>] [--trace=<path>]
+  mento stats <database> [--year=<y>] [--top=<k>] [--analyzer=<name>] [--trace=<path>]
+  mento export <database> [--format=<f>] [--output=<path>] [--start=<date>] [--end=<date>] [--trace=<path>]
+  mento render <database> --year=<y> --output=<path> [--plot=<p>] [--analyzer=<name>] [--trace=<path>]
+  mento sentiment <database> [--analyzer=<name>] [--workers=<n>] [--trace=<path>]
+  mento correlation <database> [--period=<p>] [--lag=<n>] [--feature=<name>] [--top=<k>] [--min-periods=<n>] [--analyzer=<name>] [--trace=<path>]
+  mento <database> [(--no-refresh|--force-refresh)] [(--no-watch|--poll)] [--analyzer=<name>] [--gpg-workers=<n>] [--profile-startup] [--trace=<path>]
 
 Options:
-  --no-refresh                          If set, don't refresh before loading entries.
-  --force-refresh                       Force refresh all sources before loading entries.
+  --no-refresh                          If set, don't refresh sources after opening.
+  --force-refresh                       Force refresh all sources after opening.
+  --no-watch                            Don't watch sources for changes while the window is open.
+  --poll                                Watch sources by polling instead of using inotify.
+  --profile-startup                     Print timings of startup phases once the window is painted and
+                                        refreshed, then quit.
+  --trace=<path>                        Trace parsing, store and plotting, writing a Chrome trace to path and
+                                        printing a summary on exit. Same as setting MENTO_TRACE=<path>.
+  --force                               Refresh all sources, even the ones that didn't change.
+  --analyzer=<name>                     Sentiment analyzer for polarity, textblob or lexicon [default: textblob].
+  --workers=<n>                         Number of processes for scoring sentiment. Defaults to number of CPUs.
+  --gpg-workers=<n>                     Maximum number of parallel decryptions during refresh [default: 4].
+  --period=<p>                          Period of features for correlation, date or hour [default: date].
+  --lag=<n>                             Maximum lag in periods between correlated features [default: 1].
+  --feature=<name>                      Only show correlations leading to this feature, like #mood.
+  --top=<k>                             Number of correlations, or of names in stats, to show [default: 20].
+  --min-periods=<n>                     Minimum number of paired periods for a correlation [default: 7].
+  --year=<y>                            Year to report or render.
+  --format=<f>                          Export format, jsonl, csv or parquet [default: jsonl].
+  -o <path>, --output=<path>            Output file, - for standard output when exporting [default: -].
+  --start=<date>                        Only export entries from this date on, like 2021-01-31.
+  --end=<date>                          Only export entries till this date.
+  --plot=<p>                            Plot to render, one of mood, mood (hour), count, polarity, mentions or correlation [default: mood].
 
 Arguments:
   init                                  Initialize the database if not done already.
+  refresh                               Refresh sources without opening the window. Org Journal passphrase is
+                                        read from MENTO_PASSPHRASE if set.
+  stats                                 Print number of entries, yearly summaries and most common names.
+  export                                Write entries in the given format. Parquet needs pyarrow.
+  render                                Save a plot of a year to an image file, without a display.
+  sentiment                             Compute polarity of entries that are not scored yet by the analyzer.
+  correlation                           Report strongest correlations between trackers, people and contexts.
   <database>                            Database keeping entries and source information.
 """
 
+import time
+
+STARTED = time.perf_counter()
+
+# Modules needed by only some commands, like Qt for the window or numpy for
+# correlations, are imported where they are used to keep startup fast.
+import datetime
+import os
 import sys
+from typing import Optional
 
 from docopt import docopt
-from PyQt5.QtWidgets import QApplication
 
-import mento.ui as ui
+import mento.trace as trace
 from mento import __version__
+from mento.parser import source_root
+from mento.profile import StartupProfile
 from mento.store import SQLiteStore
-from mento.util import entry_dt
+from mento.types import Source, SourceType
+
+IMPORTED = time.perf_counter()
+
+# Size in inches of rendered plots
+RENDER_SIZE = (12, 9)
+
+
+def report_correlations(store: SQLiteStore, period: str, max_lag: int, feature: Optional[str], k: int, min_periods: int):
+    from mento.correlation import correlate, feature_matrix, top_correlations
+    from mento.frame import EntryFrame
+
+    matrix = feature_matrix(EntryFrame.from_store(store), period=period)
+    acc = correlate(matrix, max_lag=max_lag)
+
+    print(f"{len(matrix.values)} {period} periods, {len(matrix.names)} features")
+    for c in top_correlations(matrix, acc, k=k, min_periods=min_periods, feature=feature):
+        print(f"{c.r:+.2f}  {c.a:>20} -> {c.b:<20} lag {c.lag}  (n={c.n})")
+
+
+def report_stats(store: SQLiteStore, year: Optional[int], k: int):
+    date_range = store.date_range()
+    if date_range is None:
+        print("No entries")
+        return
+
+    counts = store.yearly("count")
+    moods = store.yearly("tracker", "mood")
+    polarities = store.yearly("polarity", store.analyzer.key)
+
+    years = sorted(counts) if year is None else [y for y in sorted(counts) if y == year]
+    entries = sum(counts[y][1] for y in years)
+    days = sum(counts[y][2] for y in years)
+    print(f"{entries} entries over {days} days, {date_range[0]} to {date_range[1]}")
+
+    def _mean(values, y):
+        if y not in values:
+            return f"{'':>8}"
+        total, n, _ = values[y]
+        return f"{total / n:>+8.2f}"
+
+    print(f"\n{'year':<6}{'entries':>8}{'days':>8}{'mood':>8}{'polarity':>10}")
+    for y in years:
+        print(f"{y:<6}{counts[y][1]:>8}{counts[y][2]:>8}{_mean(moods, y)}  {_mean(polarities, y)}")
+
+    start = datetime.date(year, 1, 1) if year is not None else None
+    end = datetime.date(year, 12, 31) if year is not None else None
+    print()
+    for kind in ["trackers", "people", "contexts"]:
+        names = store.name_counts(kind, start, end, limit=k)
+        print(f"{kind.capitalize()}: " + (", ".join(f"{name} ({n})" for name, n in names) or "none"))
+
+
+def export_entries(store: SQLiteStore, fmt: str, output: str, start: Optional[datetime.date], end: Optional[datetime.date]) -> int:
+    from mento.export import FORMATS, write_csv, write_jsonl, write_parquet
+
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+
+    entries = store.iter_entries(start, end)
+
+    if fmt == "parquet":
+        if output == "-":
+            raise ValueError("Parquet export needs an output file")
+        return write_parquet(entries, output)
+
+    write = write_csv if fmt == "csv" else write_jsonl
+    if output == "-":
+        return write(entries, sys.stdout)
+
+    with open(output, "w", newline="" if fmt == "csv" else None) as fp:
+        return write(entries, fp)
+
+
+def render_plot(store: SQLiteStore, year: int, plot_type: str, output: str):
+    import matplotlib
+    matplotlib.use("Agg")
+
+    from matplotlib.figure import Figure
+
+    from mento.render import PLOT_TYPES, render_year
+
+    if plot_type not in PLOT_TYPES:
+        raise ValueError(f"Unknown plot type: {plot_type}, expected one of: {', '.join(PLOT_TYPES)}")
+
+    fig = Figure(figsize=RENDER_SIZE)
+    render_year(fig, store, year, plot_type)
+    fig.savefig(output)
+
+
+def env_passphrase(source: Source) -> Optional[str]:
+    if source.source_type == SourceType.ORG_JOURNAL:
+        return os.environ["MENTO_PASSPHRASE"]
+    return None
+
+
+def progress_bar(unit: str):
+    from tqdm import tqdm
+
+    bar = tqdm(unit=unit)
+
+    def _progress(done: int, total: int):
+        bar.total = total
+        bar.update(done - bar.n)
+
+    return bar, _progress
 
 
 def main():
     args = docopt(__doc__, version=__version__)
 
-    store = SQLiteStore(args["<database>"])
+    if args["--trace"]:
+        trace.enable(args["--trace"])
+
+    profile = StartupProfile(STARTED)
+    profile.record("import cli", STARTED, IMPORTED)
+
+    with profile.phase("open store"):
+        store = SQLiteStore(args["<database>"], analyzer=args["--analyzer"])
 
     if args["init"]:
         sys.exit(0)
 
-    if args["--force-refresh"]:
-        store.refresh(force=True)
-    elif args["--no-refresh"]:
-        pass
-    else:
-        store.refresh()
+    if args["refresh"]:
+        bar, _progress = progress_bar("source")
+        entry_bar, _entry_progress = progress_bar("entry")
+        with bar, entry_bar:
+            dates = store.refresh(
+                force=args["--force"],
+                gpg_workers=int(args["--gpg-workers"]),
+                progress=_progress,
+                ask=env_passphrase if "MENTO_PASSPHRASE" in os.environ else None,
+                polarity_progress=_entry_progress
+            )
+        print(f"{len(dates)} days changed")
+        sys.exit(0)
 
+    if args["stats"]:
+        report_stats(store, int(args["--year"]) if args["--year"] else None, int(args["--top"]))
+        sys.exit(0)
+
+    if args["export"]:
+        try:
+            n = export_entries(
+                store,
+                args["--format"],
+                args["--output"],
+                start=datetime.date.fromisoformat(args["--start"]) if args["--start"] else None,
+                end=datetime.date.fromisoformat(args["--end"]) if args["--end"] else None
+            )
+        except (ValueError, ImportError) as e:
+            sys.exit(str(e))
+        print(f"Exported {n} entries", file=sys.stderr)
+        sys.exit(0)
+
+    if args["render"]:
+        if args["--output"] == "-":
+            sys.exit("Rendering needs an output file")
+        try:
+            render_plot(store, int(args["--year"]), args["--plot"], args["--output"])
+        except ValueError as e:
+            sys.exit(str(e))
+        sys.exit(0)
+
+    if args["sentiment"]:
+        bar, _progress = progress_bar("entry")
+        with bar:
+            workers = int(args["--workers"]) if args["--workers"] else None
+            store.backfill_polarity(workers=workers, progress=_progress)
+        sys.exit(0)
+
+    if args["correlation"]:
+        report_correlations(
+            store,
+            period=args["--period"],
+            max_lag=int(args["--lag"]),
+            feature=args["--feature"],
+            k=int(args["--top"]),
+            min_periods=int(args["--min-periods"])
+        )
+        sys.exit(0)
+
+    watcher = None
+    if not args["--no-watch"]:
+        from mento.watch import make_watcher
+        watcher = make_watcher([source_root(source) for _, source in store.sources()], poll=args["--poll"])
+
+    with profile.phase("import gui"):
+        from PyQt5.QtCore import QTimer
+        from PyQt5.QtWidgets import QApplication
+
+        import mento.ui as ui
+
+    # The window opens with entries already in the store, refresh runs in
+    # the background
     app = QApplication([])
-    entries = sorted(store.entries, key=entry_dt)
+    refresh = not args["--no-refresh"] or args["--force-refresh"]
 
-    window = ui.QWindow(entries)
+    with profile.phase("build window"):
+        window = ui.QWindow(
+            store,
+            store.entry_view(),
+            watcher,
+            refresh=refresh,
+            force_refresh=args["--force-refresh"],
+            gpg_workers=int(args["--gpg-workers"]),
+            profile=profile
+        )
+
+    profile.begin("first paint")
     window.show()
 
+    if args["--profile-startup"]:
+        def _check():
+            if profile.finished(["first paint", *(["refresh"] if refresh else [])]):
+                print(profile.report(), file=sys.stderr)
+                window.close()
+
+        timer = QTimer()
+        timer.timeout.connect(_check)
+        timer.start(20)
+
     sys.exit(app.exec_())
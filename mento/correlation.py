@@ -0,0 +1,275 @@
+"""
+Correlations between daily (or hourly) features of entries.
+
+Features are tracker values (`#mood`) and cached sentiment `polarity` as
+means per period, or counts of trackers without values, people mentions (`@name`) and contexts (`+name`).
+Periods with no entries at all have no value for any feature; periods with
+entries but without a counted feature count as zero.
+"""
+
+import datetime
+from typing import List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from mento.frame import EntryFrame
+
+PERIODS = {"date": 1, "hour": 24}
+
+
+class FeatureMatrix(NamedTuple):
+    """
+    Values of features (columns) over consecutive periods (rows) starting
+    at `start`. Missing values are NaN.
+    """
+
+    start: int
+    period: str
+    names: List[str]
+    values: np.ndarray
+
+    def period_start(self, row: int) -> datetime.datetime:
+        per_day = PERIODS[self.period]
+        day, hour = divmod(self.start + row, per_day)
+        return datetime.datetime.combine(datetime.date.fromordinal(day), datetime.time(hour * 24 // per_day))
+
+    def select(self, names: List[str]) -> "FeatureMatrix":
+        """
+        Return matrix with the given feature columns in order. Features not
+        in this matrix are all missing.
+        """
+
+        values = np.full((len(self.values), len(names)), np.nan)
+        for j, name in enumerate(names):
+            if name in self.names:
+                values[:, j] = self.values[:, self.names.index(name)]
+
+        return FeatureMatrix(self.start, self.period, names, values)
+
+    def observed(self) -> np.ndarray:
+        """
+        Number of periods with a value for each feature.
+        """
+
+        return np.count_nonzero(~np.isnan(self.values), axis=0)
+
+
+def _period_index(frame: EntryFrame, period: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Return rows of the frame that can be placed in a period, and their
+    periods as day ordinal scaled by periods per day.
+    """
+
+    if period not in PERIODS:
+        raise ValueError(f"Unknown period: {period}")
+
+    if period == "date":
+        return np.arange(len(frame)), frame.dates
+
+    rows = np.flatnonzero(frame.minutes >= 0)
+    return rows, frame.dates[rows] * 24 + frame.minutes[rows] // 60
+
+
+def feature_matrix(frame: EntryFrame, period: str = "date", min_count: int = 1) -> FeatureMatrix:
+    """
+    Build feature matrix of the frame's entries for each `period` (date or
+    hour) from the first to the last entry. Features seen in fewer than
+    `min_count` entries are left out.
+    """
+
+    rows, periods = _period_index(frame, period)
+    if len(rows) == 0:
+        return FeatureMatrix(0, period, [], np.zeros((0, 0)))
+
+    start = int(periods.min())
+    n = int(periods.max()) - start + 1
+
+    # Period of each frame row, -1 for rows that don't belong to any
+    row_period = np.full(len(frame), -1, dtype=np.int64)
+    row_period[rows] = periods - start
+
+    has_entries = np.bincount(row_period[rows], minlength=n) > 0
+
+    names = []
+    columns = []
+
+    def _add(name: str, entry_rows: np.ndarray, values: Optional[np.ndarray]):
+        p = row_period[entry_rows]
+        keep = p >= 0
+        if np.count_nonzero(keep) < min_count:
+            return
+
+        counts = np.bincount(p[keep], minlength=n).astype(np.float64)
+        if values is None:
+            column = np.where(has_entries, counts, np.nan)
+        else:
+            sums = np.bincount(p[keep], weights=values[keep], minlength=n)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                column = sums / counts
+
+        names.append(name)
+        columns.append(column)
+
+    for i, name in enumerate(frame.tracker_names.names):
+        mask = frame.tracker_name == i
+        values = frame.tracker_value[mask]
+        valued = ~np.isnan(values)
+
+        if valued.any():
+            _add(f"#{name}", frame.tracker_entry[mask][valued], values[valued])
+        else:
+            _add(f"#{name}", frame.tracker_entry[mask], None)
+
+    if frame.polarity is not None:
+        scored = np.flatnonzero(~np.isnan(frame.polarity))
+        _add("polarity", scored, frame.polarity[scored])
+
+    for prefix, names_, entry, name_ids in [
+            ("@", frame.people_names, frame.people_entry, frame.people_name),
+            ("+", frame.context_names, frame.context_entry, frame.context_name)
+    ]:
+        for i, name in enumerate(names_.names):
+            _add(f"{prefix}{name}", entry[name_ids == i], None)
+
+    values = np.column_stack(columns) if columns else np.zeros((n, 0))
+    return FeatureMatrix(start, period, names, values)
+
+
+class CorrelationAccumulator:
+    """
+    Running sums for pairwise Pearson correlations between features at lags
+    0 to `max_lag`. Rows of consecutive periods are added with `update` as
+    they arrive, so correlations over a growing history never rescan it.
+
+    For lag `k`, the correlation of features (a, b) pairs a at period t with
+    b at period t + k, skipping pairs where either is missing.
+    """
+
+    def __init__(self, n_features: int, max_lag: int = 0):
+        self.n_features = n_features
+        self.max_lag = max_lag
+        self.tail = np.zeros((0, n_features))
+
+        shape = (max_lag + 1, n_features, n_features)
+        self.n = np.zeros(shape)
+        self.sx = np.zeros(shape)
+        self.sy = np.zeros(shape)
+        self.sxx = np.zeros(shape)
+        self.syy = np.zeros(shape)
+        self.sxy = np.zeros(shape)
+
+    def update(self, values: np.ndarray):
+        """
+        Add rows of feature values for the periods right after the ones
+        already added.
+        """
+
+        rows = np.vstack([self.tail, values])
+        new = len(values)
+
+        mask = (~np.isnan(rows)).astype(np.float64)
+        x = np.nan_to_num(rows)
+        xx = x * x
+
+        for lag in range(self.max_lag + 1):
+            # Pair rows (t, t + lag) where t + lag is one of the new rows
+            hi = slice(len(rows) - new, len(rows))
+            lo = slice(max(len(rows) - new - lag, 0), len(rows) - lag)
+            if lo.stop <= lo.start:
+                continue
+            hi = slice(hi.stop - (lo.stop - lo.start), hi.stop)
+
+            xa, ma, xb, mb = x[lo], mask[lo], x[hi], mask[hi]
+            self.n[lag] += ma.T @ mb
+            self.sx[lag] += xa.T @ mb
+            self.sy[lag] += ma.T @ xb
+            self.sxx[lag] += xx[lo].T @ mb
+            self.syy[lag] += ma.T @ xx[hi]
+            self.sxy[lag] += xa.T @ xb
+
+        self.tail = rows[-self.max_lag:] if self.max_lag else rows[:0]
+
+    def result(self, lag: int = 0, min_periods: int = 3) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return (correlations, number of paired periods) matrices at `lag`.
+        Correlations from fewer than `min_periods` pairs or of constant
+        features are NaN.
+        """
+
+        n, sx, sy = self.n[lag], self.sx[lag], self.sy[lag]
+        cov = n * self.sxy[lag] - sx * sy
+        var_x = n * self.sxx[lag] - sx * sx
+        var_y = n * self.syy[lag] - sy * sy
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            r = cov / np.sqrt(var_x * var_y)
+
+        # Constant features leave only rounding errors in the variance
+        constant = (var_x <= 1e-12 * np.maximum(n * self.sxx[lag], 1)) | (var_y <= 1e-12 * np.maximum(n * self.syy[lag], 1))
+        r[(n < min_periods) | constant] = np.nan
+        return np.clip(r, -1, 1), n
+
+
+def frequent_features(matrix: FeatureMatrix, k: int, min_periods: int = 1) -> List[str]:
+    """
+    Return names of at most `k` features observed in the most periods.
+    """
+
+    observed = matrix.observed()
+    order = np.argsort(-observed, kind="stable")[:k]
+    return [matrix.names[j] for j in order if observed[j] >= min_periods]
+
+
+def correlate(matrix: FeatureMatrix, max_lag: int = 0) -> CorrelationAccumulator:
+    acc = CorrelationAccumulator(len(matrix.names), max_lag)
+    acc.update(matrix.values)
+    return acc
+
+
+class Correlation(NamedTuple):
+    a: str
+    b: str
+    lag: int
+    r: float
+    n: int
+
+
+def top_correlations(
+        matrix: FeatureMatrix,
+        acc: CorrelationAccumulator,
+        k: int = 20,
+        min_periods: int = 7,
+        feature: Optional[str] = None
+) -> List[Correlation]:
+    """
+    Return the `k` strongest correlations over all lags. If `feature` is
+    given, only correlations where it is the later (lagged) feature are
+    kept, which reads as "what precedes changes in `feature`".
+    """
+
+    found = []
+
+    for lag in range(acc.max_lag + 1):
+        r, n = acc.result(lag, min_periods)
+
+        candidates = ~np.isnan(r)
+        if lag == 0:
+            # Symmetric without lag, keep one of each pair
+            candidates &= np.triu(np.ones_like(candidates), k=1)
+        if feature is not None:
+            if feature not in matrix.names:
+                raise ValueError(f"Unknown feature: {feature}")
+            j = matrix.names.index(feature)
+            column = np.zeros_like(candidates)
+            column[:, j] = True
+            if lag == 0:
+                column[j, :] = True
+            candidates &= column
+
+        for a, b in zip(*np.nonzero(candidates)):
+            if lag == 0 and feature is not None and matrix.names[a] == feature:
+                a, b = b, a
+            found.append(Correlation(matrix.names[a], matrix.names[b], lag, float(r[a, b]), int(n[a, b])))
+
+    found.sort(key=lambda c: -abs(c.r))
+    return found[:k]
@@ -0,0 +1,143 @@
+import concurrent.futures
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, List, Optional
+
+from mento.trace import traced
+
+if TYPE_CHECKING:
+    import gnupg
+
+DEFAULT_WORKERS = 4
+
+
+class DecryptionError(Exception):
+    pass
+
+
+@dataclass
+class DecryptStats:
+    calls: int = 0
+    failures: int = 0
+    bytes: int = 0
+    latency: float = 0.0
+    max_latency: float = 0.0
+    wall_time: float = 0.0
+
+    def summary(self) -> str:
+        mean_latency = self.latency / self.calls if self.calls else 0.0
+        throughput = self.bytes / self.wall_time if self.wall_time else 0.0
+
+        return (
+            f"{self.calls} decryptions ({self.failures} failed), {self.bytes / 1024:.1f} KiB "
+            f"at {throughput / 1024:.1f} KiB/s, latency mean {mean_latency * 1000:.0f} ms, "
+            f"max {self.max_latency * 1000:.0f} ms"
+        )
+
+
+class Decryptor:
+    """
+    Decryption service shared by all files of a source. It keeps a single gpg
+    handle and passphrase, and runs decryptions on a bounded pool of workers
+    so that at most `workers` gpg processes are alive at once.
+
+    This caps concurrency, it doesn't batch. Each ciphertext is still its own
+    gpg process, as gpg can only keep the plain texts of several messages
+    apart by writing them to files, which we don't want for a journal.
+    """
+
+    def __init__(self, passphrase: Optional[str] = None, workers: int = DEFAULT_WORKERS, gnupghome: Optional[str] = None):
+        self.passphrase = passphrase
+        self.workers = workers
+        self.gnupghome = gnupghome
+        self.stats = DecryptStats()
+
+        self._gpg: Optional["gnupg.GPG"] = None
+        self._executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._active = 0
+        self._active_since = 0.0
+
+    @property
+    def gpg(self) -> "gnupg.GPG":
+        # Creating the handle runs gpg once to find its version so we only
+        # want to do this when something is actually encrypted.
+        with self._lock:
+            if self._gpg is None:
+                import gnupg
+                self._gpg = gnupg.GPG(gnupghome=self.gnupghome)
+            return self._gpg
+
+    @property
+    def executor(self) -> concurrent.futures.ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.workers)
+            return self._executor
+
+    def _track(self, size: int, fn):
+        with self._lock:
+            if self._active == 0:
+                self._active_since = time.perf_counter()
+            self._active += 1
+
+        start = time.perf_counter()
+        result = fn()
+        end = time.perf_counter()
+
+        with self._lock:
+            self._active -= 1
+            if self._active == 0:
+                self.stats.wall_time += end - self._active_since
+
+            self.stats.calls += 1
+            self.stats.bytes += size
+            self.stats.latency += end - start
+            self.stats.max_latency = max(self.stats.max_latency, end - start)
+            if not result.ok:
+                self.stats.failures += 1
+
+        return result
+
+    @traced("gpg.decrypt")
+    def _decrypt(self, ciphertext: str) -> Optional[str]:
+        dec = self._track(len(ciphertext), lambda: self.gpg.decrypt(ciphertext, passphrase=self.passphrase))
+        return str(dec) if dec.ok else None
+
+    def decrypt(self, ciphertext: str) -> Optional[str]:
+        """
+        Decrypt armored `ciphertext` and return plain text. Return None if
+        decryption fails.
+        """
+
+        return self.executor.submit(self._decrypt, ciphertext).result()
+
+    def decrypt_many(self, ciphertexts: List[str]) -> List[Optional[str]]:
+        """
+        Decrypt ciphertexts concurrently, one gpg process each, keeping
+        their order.
+        """
+
+        futures = [self.executor.submit(self._decrypt, c) for c in ciphertexts]
+        return [ft.result() for ft in futures]
+
+    @traced("gpg.decrypt_file")
+    def decrypt_file(self, filepath: str) -> str:
+        def _decrypt_file():
+            with open(filepath, "rb") as fp:
+                return self.gpg.decrypt_file(fp, passphrase=self.passphrase)
+
+        return str(self.executor.submit(self._track, os.path.getsize(filepath), _decrypt_file).result())
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
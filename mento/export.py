@@ -0,0 +1,107 @@
+"""
+Export entries as JSON lines, CSV or Parquet. Entries are written as they are
+read so that exports don't need the whole journal in memory.
+"""
+
+import csv
+import json
+from typing import IO, Any, Dict, Iterable, List
+
+from mento.types import Entry
+from mento.util import batched
+
+FORMATS = ["jsonl", "csv", "parquet"]
+CSV_FIELDS = ["date", "time", "body", "trackers", "people", "contexts"]
+
+# Number of entries in each Parquet row group
+PARQUET_BATCH_SIZE = 10000
+
+
+def entry_dict(ent: Entry) -> Dict[str, Any]:
+    """
+    Return entry as a JSON compatible dict, in the shape older versions kept
+    entries in.
+    """
+
+    return {
+        "body": ent.body,
+        "date": ent.date.isoformat(),
+        "time": ent.time.isoformat() if ent.time else None,
+        "trackers": None if ent.trackers is None else [{"name": t.name, "value": t.value} for t in ent.trackers],
+        "people": None if ent.people is None else [{"name": p.name} for p in ent.people],
+        "contexts": None if ent.contexts is None else [{"name": c.name} for c in ent.contexts],
+    }
+
+
+def entry_row(ent: Entry) -> Dict[str, str]:
+    """
+    Return entry as a flat row. Trackers are joined as name=value, or just
+    name if they have no value, and all lists are separated by semicolons.
+    """
+
+    return {
+        "date": ent.date.isoformat(),
+        "time": ent.time.isoformat() if ent.time else "",
+        "body": ent.body,
+        "trackers": ";".join(t.name if t.value is None else f"{t.name}={t.value}" for t in ent.trackers or []),
+        "people": ";".join(p.name for p in ent.people or []),
+        "contexts": ";".join(c.name for c in ent.contexts or []),
+    }
+
+
+def write_jsonl(entries: Iterable[Entry], out: IO[str]) -> int:
+    n = 0
+    for ent in entries:
+        out.write(json.dumps(entry_dict(ent), ensure_ascii=False) + "\n")
+        n += 1
+    return n
+
+
+def write_csv(entries: Iterable[Entry], out: IO[str]) -> int:
+    writer = csv.DictWriter(out, fieldnames=CSV_FIELDS)
+    writer.writeheader()
+
+    n = 0
+    for ent in entries:
+        writer.writerow(entry_row(ent))
+        n += 1
+    return n
+
+
+def write_parquet(entries: Iterable[Entry], path: str) -> int:
+    """
+    Write entries to a Parquet file at `path` in row groups. Needs pyarrow.
+    """
+
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Parquet export needs pyarrow, install it with `pip install pyarrow`")
+
+    tracker = pa.struct([("name", pa.string()), ("value", pa.float64())])
+    schema = pa.schema([
+        ("date", pa.date32()),
+        ("time", pa.time64("us")),
+        ("body", pa.string()),
+        ("trackers", pa.list_(tracker)),
+        ("people", pa.list_(pa.string())),
+        ("contexts", pa.list_(pa.string())),
+    ])
+
+    n = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        for batch in batched(entries, PARQUET_BATCH_SIZE):
+            columns: Dict[str, List[Any]] = {name: [] for name in schema.names}
+            for ent in batch:
+                columns["date"].append(ent.date)
+                columns["time"].append(ent.time)
+                columns["body"].append(ent.body)
+                columns["trackers"].append([{"name": t.name, "value": t.value} for t in ent.trackers or []])
+                columns["people"].append([p.name for p in ent.people or []])
+                columns["contexts"].append([c.name for c in ent.contexts or []])
+
+            writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+            n += len(batch)
+
+    return n
@@ -0,0 +1,203 @@
+import datetime
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+
+from mento.store import SQLiteStore
+from mento.trace import traced
+from mento.types import Entry, Names
+
+
+class EntryFrame:
+    """
+    Columnar, array backed view of entries for analytics.
+
+    Entries are rows sorted by date and time with `dates` as day ordinals and
+    `minutes` as minute of day (-1 when the entry has no time). Trackers,
+    people and contexts are long tables of (entry row, name id[, value]),
+    sorted by entry row, with names interned in `tracker_names`, `people_names` and
+    `context_names`. Tracker values without a number are NaN. `polarity`
+    holds cached sentiment scores (NaN when unscored) and `bodies` the entry
+    texts when the frame was built from entries.
+    """
+
+    def __init__(self):
+        self.dates = np.zeros(0, dtype=np.int64)
+        self.minutes = np.zeros(0, dtype=np.int16)
+        self.polarity: Optional[np.ndarray] = None
+        self.bodies: Optional[List[str]] = None
+
+        self.tracker_names = Names()
+        self.tracker_entry = np.zeros(0, dtype=np.int64)
+        self.tracker_name = np.zeros(0, dtype=np.int32)
+        self.tracker_value = np.zeros(0, dtype=np.float64)
+
+        self.people_names = Names()
+        self.people_entry = np.zeros(0, dtype=np.int64)
+        self.people_name = np.zeros(0, dtype=np.int32)
+
+        self.context_names = Names()
+        self.context_entry = np.zeros(0, dtype=np.int64)
+        self.context_name = np.zeros(0, dtype=np.int32)
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[Entry]) -> "EntryFrame":
+        frame = cls()
+        rows = sorted(entries, key=lambda e: (e.date, e.time or datetime.time.min))
+
+        frame.dates = np.array([e.date.toordinal() for e in rows], dtype=np.int64)
+        frame.minutes = np.array([e.time.hour * 60 + e.time.minute if e.time else -1 for e in rows], dtype=np.int16)
+        frame.bodies = [e.body for e in rows]
+
+        trackers = [(i, t.name, t.value) for i, e in enumerate(rows) for t in e.trackers or []]
+        people = [(i, p.name) for i, e in enumerate(rows) for p in e.people or []]
+        contexts = [(i, c.name) for i, e in enumerate(rows) for c in e.contexts or []]
+
+        frame._set_trackers(trackers)
+        frame.people_entry, frame.people_name = frame._long_table(frame.people_names, people)
+        frame.context_entry, frame.context_name = frame._long_table(frame.context_names, contexts)
+
+        return frame
+
+    @classmethod
+    @traced()
+    def from_store(cls, store: SQLiteStore, start: Optional[datetime.date] = None, end: Optional[datetime.date] = None) -> "EntryFrame":
+        """
+        Build frame of entries between `start` and `end` dates (both
+        inclusive) straight from the store's tables, without decoding entry
+        data. Polarity comes from the store's analyzer cache.
+        """
+
+        clause = "e.date BETWEEN ? AND ?"
+        params = [(start or datetime.date.min).isoformat(), (end or datetime.date.max).isoformat()]
+        frame = cls()
+
+        rows = store.con.execute(f"""
+        SELECT e.id, e.date, e.time, p.value FROM entries e
+        LEFT JOIN polarity p ON p.body_hash = e.body_hash AND p.analyzer = ?
+        WHERE {clause} ORDER BY e.date, e.time, e.id
+        """, [store.analyzer.key, *params]).fetchall()
+
+        ids = np.array([r[0] for r in rows], dtype=np.int64)
+        frame.dates = np.array([datetime.date.fromisoformat(r[1]).toordinal() for r in rows], dtype=np.int64)
+        frame.minutes = np.array([int(r[2][:2]) * 60 + int(r[2][3:5]) if r[2] else -1 for r in rows], dtype=np.int16)
+        frame.polarity = np.array([np.nan if r[3] is None else r[3] for r in rows], dtype=np.float64)
+
+        # Map entry ids to rows of the frame
+        order = np.argsort(ids)
+        sorted_ids = ids[order]
+
+        def _rows(entry_ids: List[int]) -> np.ndarray:
+            return order[np.searchsorted(sorted_ids, np.array(entry_ids, dtype=np.int64))]
+
+        def _select(table: str, columns: str) -> list:
+            return store.con.execute(f"""
+            SELECT t.entry_id, {columns} FROM {table} t JOIN entries e ON e.id = t.entry_id
+            WHERE {clause} ORDER BY t.rowid
+            """, params).fetchall()
+
+        trackers = _select("trackers", "t.name, t.value")
+        entry_rows = _rows([t[0] for t in trackers])
+        frame._set_trackers([(i, name, value) for i, (_, name, value) in zip(entry_rows, trackers)])
+
+        people = _select("people", "t.name")
+        frame.people_entry, frame.people_name = frame._long_table(
+            frame.people_names, list(zip(_rows([p[0] for p in people]), [p[1] for p in people]))
+        )
+
+        contexts = _select("contexts", "t.name")
+        frame.context_entry, frame.context_name = frame._long_table(
+            frame.context_names, list(zip(_rows([c[0] for c in contexts]), [c[1] for c in contexts]))
+        )
+
+        return frame
+
+    def _set_trackers(self, trackers: List[Tuple[int, str, Optional[Union[int, float]]]]):
+        trackers = sorted(trackers, key=lambda t: t[0])
+        self.tracker_entry, self.tracker_name = self._long_table(self.tracker_names, [(i, name) for i, name, _ in trackers])
+        self.tracker_value = np.array([np.nan if v is None else v for _, _, v in trackers], dtype=np.float64)
+
+    @staticmethod
+    def _long_table(names: Names, items: List[Tuple[int, str]]) -> Tuple[np.ndarray, np.ndarray]:
+        items = sorted(items, key=lambda it: it[0])
+        entry = np.array([i for i, _ in items], dtype=np.int64)
+        name = np.array([names.intern(n) for _, n in items], dtype=np.int32)
+        return entry, name
+
+    def tracker(self, name: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return (entry rows, values) of tracker `name`, skipping missing values.
+        """
+
+        mask = (self.tracker_name == self.tracker_names.get(name)) & ~np.isnan(self.tracker_value)
+        return self.tracker_entry[mask], self.tracker_value[mask]
+
+    def take(self, rows: np.ndarray) -> "EntryFrame":
+        """
+        Return a frame with only the given (sorted) rows.
+        """
+
+        frame = EntryFrame()
+        frame.dates = self.dates[rows]
+        frame.minutes = self.minutes[rows]
+        if self.polarity is not None:
+            frame.polarity = self.polarity[rows]
+        if self.bodies is not None:
+            frame.bodies = [self.bodies[i] for i in rows]
+
+        # Position of old rows in the new frame, -1 for dropped ones
+        remap = np.full(len(self), -1, dtype=np.int64)
+        remap[rows] = np.arange(len(rows))
+
+        frame.tracker_names = self.tracker_names
+        keep = remap[self.tracker_entry] >= 0
+        frame.tracker_entry = remap[self.tracker_entry[keep]]
+        frame.tracker_name = self.tracker_name[keep]
+        frame.tracker_value = self.tracker_value[keep]
+
+        frame.people_names = self.people_names
+        keep = remap[self.people_entry] >= 0
+        frame.people_entry = remap[self.people_entry[keep]]
+        frame.people_name = self.people_name[keep]
+
+        frame.context_names = self.context_names
+        keep = remap[self.context_entry] >= 0
+        frame.context_entry = remap[self.context_entry[keep]]
+        frame.context_name = self.context_name[keep]
+
+        return frame
+
+    def date_groups(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return unique day ordinals of entries and, for each row, the index of
+        its day in them.
+        """
+
+        return np.unique(self.dates, return_inverse=True)
+
+    def to_dates(self, ordinals: np.ndarray) -> List[datetime.date]:
+        return [datetime.date.fromordinal(int(o)) for o in ordinals]
+
+
+def group_count(groups: np.ndarray, n: int) -> np.ndarray:
+    """
+    Count items per group for group indices in [0, n).
+    """
+
+    return np.bincount(groups, minlength=n)
+
+
+def group_mean(groups: np.ndarray, values: np.ndarray, n: int) -> np.ndarray:
+    """
+    Mean of `values` per group for group indices in [0, n). Groups without
+    values are NaN.
+    """
+
+    counts = np.bincount(groups, minlength=n)
+    sums = np.bincount(groups, weights=values, minlength=n)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return sums / counts
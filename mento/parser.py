@@ -1,82 +1,161 @@
 import concurrent.futures
 import datetime
 import getpass
+import itertools
 import os
 import re
-from glob import glob
-from typing import List, Optional
+from typing import Iterable, Iterator, List, Optional
 
-import gnupg
 import orgparse
 
+from mento.decrypt import Decryptor
+from mento.scanner import TODO_SETTING_RE, Node, load_node, load_nodes
+from mento.tokenizer import TOKENIZER
+from mento.trace import traced
 from mento.types import Context, Entry, Person, Source, SourceType, Tracker
 
 
-def parse_source(source: Source) -> List[Entry]:
+ORG_HEADING_RE = re.compile(r"\*+ ")
+LIST_ITEM_PREFIXES = ("+ [", "- [")
+JOURNAL_FILE_RE = re.compile(r"(\d{4})(\d{2})(\d{2})")
+
+
+@traced()
+def parse_source(source: Source) -> Iterator[Entry]:
     if source.source_type == SourceType.ORGZLY:
-        return parse_orgzly(source.path)
+        yield from parse_orgzly(source.path)
     elif source.source_type == SourceType.ORG_LIST:
-        return parse_list_journal(source.path)
+        yield from parse_list_journal(source.path)
     elif source.source_type == SourceType.ORG_JOURNAL:
-        passphrase = getpass.getpass("Passphrase for Org Journal: ")
-        return parse_org_journal(source.path, passphrase)
+        with Decryptor(ask_passphrase(source)) as decryptor:
+            yield from parse_org_journal(source.path, decryptor)
+            return
     else:
         raise TypeError("Wrong source type")
 
 
-def read_file(filepath: str) -> str:
+def ask_passphrase(source: Source) -> Optional[str]:
+    """
+    Prompt for passphrase if the source needs one for decryption.
+    """
+
+    if source.source_type == SourceType.ORG_JOURNAL:
+        return getpass.getpass("Passphrase for Org Journal: ")
+    return None
+
+
+def source_files(source: Source) -> List[str]:
+    """
+    List files that make up the given source. Entries in a source are always
+    keyed to one of these files.
+    """
+
+    if source.source_type in (SourceType.ORGZLY, SourceType.ORG_LIST):
+        return [source.path]
+    elif source.source_type == SourceType.ORG_JOURNAL:
+        return journal_files(source.path)
+    else:
+        raise TypeError("Wrong source type")
+
+
+def source_root(source: Source) -> str:
+    """
+    Return the path holding all files of the source, the file itself or the
+    journal directory.
+    """
+
+    return os.path.abspath(os.path.expanduser(source.path))
+
+
+def parse_source_file(source: Source, filepath: str, decryptor: Optional[Decryptor] = None) -> Iterator[Entry]:
+    """
+    Parse entries from a single file of the source. Encrypted content is
+    decrypted using `decryptor`.
+    """
+
+    decryptor = decryptor or Decryptor()
+
+    if source.source_type == SourceType.ORGZLY:
+        return parse_orgzly(filepath, decryptor)
+    elif source.source_type == SourceType.ORG_LIST:
+        return parse_list_journal(filepath, decryptor)
+    elif source.source_type == SourceType.ORG_JOURNAL:
+        return parse_org_journal_file(filepath, decryptor)
+    else:
+        raise TypeError("Wrong source type")
+
+
+def read_file(filepath: str, decryptor: Optional[Decryptor] = None) -> str:
     """
     Read file `filepath` and return string content. If the file is encrypted,
     decrypt and read.
     """
 
     if filepath.endswith(".gpg"):
-        gpg = gnupg.GPG()
-
-        with open(filepath, "rb") as fp:
-            dec = gpg.decrypt_file(fp)
-            return str(dec)
+        return (decryptor or Decryptor()).decrypt_file(filepath)
     else:
         with open(filepath) as fp:  # type: ignore
             return fp.read()  # type: ignore
 
 
-def parse_trackers(text: str) -> List[Tracker]:
+def read_lines(filepath: str, decryptor: Optional[Decryptor] = None) -> Iterator[str]:
     """
-    Parser trackers in nomie format from the given body. A tracker without a
-    value specification is a boolean type. For values, we only support integers
-    right now. Interpretation of values are left to the consumer.
+    Read lines of file `filepath` lazily. Encrypted files are decrypted as a
+    whole first.
+    """
+
+    if filepath.endswith(".gpg"):
+        yield from read_file(filepath, decryptor).splitlines()
+    else:
+        with open(filepath) as fp:
+            for line in fp:
+                yield line.rstrip("\n")
+
+
+def split_org_nodes(lines: Iterable[str]) -> Iterator[Iterator[str]]:
     """
+    Split org lines in groups, one per node, with the heading line followed by
+    the node's own body lines. Lines before the first heading are dropped.
+    Groups are lazy and need to be consumed in order.
+    """
+
+    n_headings = 0
 
-    trackers = []
+    def _key(line: str) -> int:
+        nonlocal n_headings
+        if ORG_HEADING_RE.match(line):
+            n_headings += 1
+        return n_headings
 
-    for match in re.finditer(r"#([a-zA-Z\d\-]+)(\((\-?\d+)\))?", text):
+    for n, group in itertools.groupby(lines, _key):
+        if n > 0:
+            yield group
 
-        name = match.group(1)
-        if match.group(3) is not None:
-            value: Optional[int] = int(match.group(3))
-        else:
-            value = None
-        trackers.append(Tracker(name, value))
 
-    return trackers
+@traced(timeline=False)
+def parse_trackers(text: str) -> List[Tracker]:
+    """
+    Parser trackers in nomie format from the given body. A tracker without a
+    value specification is a boolean type. Values are integers unless the
+    tokenizer is set up for more types. Interpretation of values are left to
+    the consumer.
+    """
+
+    return TOKENIZER.annotations(text)[0]
 
 
+@traced(timeline=False)
 def parse_contexts(text: str) -> List[Context]:
-    return [
-        Context(match.group(1))
-        for match in re.finditer(r"\+([a-zA-Z\d\-]+)", text)
-    ]
+    return TOKENIZER.annotations(text)[2]
 
 
+@traced(timeline=False)
 def parse_people(text: str) -> List[Person]:
-    return [
-        Person(match.group(1))
-        for match in re.finditer(r"@([a-zA-Z\d\-]+)", text)
-    ]
+    return TOKENIZER.annotations(text)[1]
 
 
-def parse_orgzly_node(node: orgparse.node.OrgNode) -> Entry:
+@traced(timeline=False)
+def parse_orgzly_node(node: Node) -> Entry:
     """
     Parse orgzly capture style node.
     """
@@ -90,36 +169,36 @@ def parse_orgzly_node(node: orgparse.node.OrgNode) -> Entry:
         raise TypeError("Invalid number of timestamps found")
 
     body = node.body.strip()
+    trackers, people, contexts = TOKENIZER.annotations(body)
 
     return Entry(
         body=body,
         date=dts[0].start.date(),
         time=dts[0].start.time(),
-        trackers=parse_trackers(body),
-        people=parse_people(body),
-        contexts=parse_contexts(body)
+        trackers=trackers,
+        people=people,
+        contexts=contexts
     )
 
 
-def parse_orgzly(filepath: str) -> List[Entry]:
+@traced()
+def parse_orgzly(filepath: str, decryptor: Optional[Decryptor] = None) -> Iterator[Entry]:
     """
     Parse entries from an orgzly style file where I keep entries with a heading
-    'log'.
+    'log'. Nodes are parsed one at a time as the file is read.
     """
 
     entry_heading = "log"
-    root = orgparse.loads(read_file(filepath))
 
-    valid_nodes = []
-    for n in root[1:]:
-        if n.heading == entry_heading:
-            valid_nodes.append(n)
-
-    return [parse_orgzly_node(n) for n in valid_nodes]
+    for node_lines in split_org_nodes(read_lines(filepath, decryptor)):
+        node = load_node(list(node_lines))
+        if node.heading == entry_heading:
+            yield parse_orgzly_node(node)
 
 
+@traced(timeline=False)
 def parse_list_journal_entry(text: str) -> Optional[Entry]:
-    text = re.sub(r"$(\+|\-) ?", "", text).strip()
+    text = text.strip()
 
     dt_i = text.index("]")
     dt_string = text[:dt_i + 1]
@@ -138,64 +217,87 @@ def parse_list_journal_entry(text: str) -> Optional[Entry]:
         date = dt
         time = None
 
+    trackers, people, contexts = TOKENIZER.annotations(body)
+
     return Entry(
         body=body,
         date=date,
         time=time,
-        trackers=parse_trackers(body),
-        people=parse_people(body),
-        contexts=parse_contexts(body)
+        trackers=trackers,
+        people=people,
+        contexts=contexts
     )
 
 
-def parse_list_journal_heading(text: str) -> List[Entry]:
-    entry_texts = []
+@traced()
+def parse_list_journal_lines(lines: Iterable[str]) -> Iterator[Entry]:
+    """
+    Parse list items from lines of a heading body, yielding each entry once
+    the next item starts.
+    """
 
     accum: List[str] = []
-    for line in text.splitlines():
-        if re.match(r"(\+|\-) \[", line, flags=re.I):
+
+    for line in lines:
+        if line.startswith(LIST_ITEM_PREFIXES):
             # New entry
             if accum:
-                entry_texts.append("\n".join(accum))
+                entry = parse_list_journal_entry("\n".join(accum))
+                if entry:
+                    yield entry
                 accum = []
         accum.append(line)
 
     if accum:
-        entry_texts.append("\n".join(accum))
+        entry = parse_list_journal_entry("\n".join(accum))
+        if entry:
+            yield entry
+
 
-    entries = [parse_list_journal_entry(t) for t in entry_texts]
-    return [e for e in entries if e]
+@traced()
+def parse_list_journal_heading(text: str) -> List[Entry]:
+    return list(parse_list_journal_lines(text.splitlines()))
 
 
-def parse_list_journal(filepath: str) -> List[Entry]:
+@traced()
+def parse_list_journal(filepath: str, decryptor: Optional[Decryptor] = None) -> Iterator[Entry]:
     """
-    Lists are kept directly under headings.
+    Lists are kept directly under headings. Nodes are read and parsed one at
+    a time, unless the file has in-buffer TODO settings, which apply to all
+    headings and need the whole file parsed at once.
     """
 
-    root = orgparse.loads(read_file(filepath))
-    entries = []
+    # Encrypted files are decrypted once and then read from memory
+    text = read_file(filepath, decryptor) if filepath.endswith(".gpg") else None
+
+    def _lines() -> Iterable[str]:
+        return text.splitlines() if text is not None else read_lines(filepath)
 
-    for node in root[1:]:
+    nodes: Iterable[Node]
+    if any(TODO_SETTING_RE.match(line) for line in _lines()):
+        nodes = load_nodes("\n".join(_lines()))
+    else:
+        nodes = (load_node(list(node_lines)) for node_lines in split_org_nodes(_lines()))
+
+    for node in nodes:
         # TODO: Remove this restriction
         if node.heading == "Log":
-            entries.extend(parse_list_journal_heading(node.body))
-
-    return entries
+            yield from parse_list_journal_lines(node.body.splitlines())
 
 
-def parse_org_journal_body(text: str, date: datetime.date, passphrase: str) -> List[Entry]:
-    root = orgparse.loads(text)
+@traced()
+def parse_org_journal_body(text: str, date: datetime.date, decryptor: Decryptor) -> Iterator[Entry]:
+    nodes = load_nodes(text)
+    decrypted = decryptor.decrypt_many([node.body for node in nodes])
 
-    gpg = gnupg.GPG()
+    failed = decrypted.count(None)
+    if failed:
+        print(f"Error in decrypting {failed} of {len(decrypted)} nodes on {date}")
 
-    entries = []
-    for node in root[1:]:
-        dec = gpg.decrypt(node.body, passphrase=passphrase)
-        if not dec.ok:
-            print("Error in decrypting")
+    for dec in decrypted:
+        if dec is None:
             continue
-        sub_root = orgparse.loads(str(dec))
-        for n in sub_root[1:]:
+        for n in load_nodes(dec):
             # Ignoring other internal headings
             if n.level != 2:
                 continue
@@ -211,43 +313,70 @@ def parse_org_journal_body(text: str, date: datetime.date, passphrase: str) -> L
             else:
                 body = n.body
 
-            entries.append(Entry(
+            trackers, people, contexts = TOKENIZER.annotations(body)
+
+            yield Entry(
                 body=body,
                 date=date,
                 time=time,
-                trackers=parse_trackers(body),
-                people=parse_people(body),
-                contexts=parse_contexts(body)
-            ))
-
-    return entries
+                trackers=trackers,
+                people=people,
+                contexts=contexts
+            )
 
 
-def parse_org_journal_file(filepath: str, passphrase: str) -> List[Entry]:
-    bname = os.path.basename(filepath)
-    match = re.match(r"(\d{4})(\d{2})(\d{2})", bname)
+def journal_file_date(filepath: str) -> Optional[datetime.date]:
+    """
+    Return date of an Org Journal day file from its name, or None if the name
+    isn't a date.
+    """
 
+    match = JOURNAL_FILE_RE.match(os.path.basename(filepath))
     if not match:
-        return []
+        return None
 
-    year_s, month_s, day_s = match.groups()
-    date = datetime.date(int(year_s), int(month_s), int(day_s))
+    try:
+        return datetime.date(*(int(g) for g in match.groups()))
+    except ValueError:
+        return None
+
+
+@traced()
+def parse_org_journal_file(filepath: str, decryptor: Decryptor) -> Iterator[Entry]:
+    date = journal_file_date(filepath)
+    if date is None:
+        return
 
     with open(filepath) as fp:
         body = fp.read()
 
-    return parse_org_journal_body(body, date, passphrase)
+    yield from parse_org_journal_body(body, date, decryptor)
 
 
-def parse_org_journal(directory: str, passphrase: str) -> List[Entry]:
-    files = glob(os.path.join(os.path.expanduser(directory), "*"))
+def journal_files(directory: str) -> List[str]:
+    """
+    Return sorted day files of an Org Journal directory. Like org-journal,
+    only files at the top level named by their date are picked.
+    """
+
+    directory = os.path.expanduser(directory)
+    if not os.path.isdir(directory):
+        return []
+
+    return sorted(
+        entry.path for entry in os.scandir(directory)
+        if entry.is_file() and journal_file_date(entry.name) is not None
+    )
 
-    entries = []
 
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        futures = [executor.submit(parse_org_journal_file, f, passphrase) for f in files]
+@traced()
+def parse_org_journal(directory: str, decryptor: Decryptor) -> Iterator[Entry]:
+    files = journal_files(directory)
 
-    for ft in concurrent.futures.as_completed(futures):
-        entries.extend(ft.result())
+    # Files only wait on the decryptor, so there is no point in having more of
+    # them in flight than it has workers
+    with concurrent.futures.ThreadPoolExecutor(max_workers=decryptor.workers) as executor:
+        futures = [executor.submit(lambda f: list(parse_org_journal_file(f, decryptor)), f) for f in files]
 
-    return entries
+        for ft in concurrent.futures.as_completed(futures):
+            yield from ft.result()
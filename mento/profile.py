@@ -0,0 +1,55 @@
+"""
+Timings of startup phases, as reported by `mento --profile-startup`.
+"""
+
+import contextlib
+import time
+from typing import Dict, Iterable, Iterator, Optional
+
+
+class StartupProfile:
+    """
+    Begin and end times of named phases relative to `start`. Phases can
+    overlap, like a refresh running in the background while the window
+    paints. Only the first begin and end of a phase are kept.
+    """
+
+    def __init__(self, start: Optional[float] = None):
+        self.start = time.perf_counter() if start is None else start
+        self.begins: Dict[str, float] = {}
+        self.ends: Dict[str, float] = {}
+
+    def begin(self, name: str):
+        self.begins.setdefault(name, time.perf_counter())
+
+    def end(self, name: str):
+        if name in self.begins:
+            self.ends.setdefault(name, time.perf_counter())
+
+    def record(self, name: str, begin: float, end: float):
+        self.begins.setdefault(name, begin)
+        self.ends.setdefault(name, end)
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        self.begin(name)
+        try:
+            yield
+        finally:
+            self.end(name)
+
+    def finished(self, names: Iterable[str]) -> bool:
+        return all(name in self.ends for name in names)
+
+    def report(self) -> str:
+        """
+        Return a table of phases in the order they began with their start,
+        relative to `start`, and duration in milliseconds.
+        """
+
+        lines = [f"{'phase':<16}{'start ms':>10}{'took ms':>10}"]
+        for name, begin in sorted(self.begins.items(), key=lambda it: it[1]):
+            took = f"{(self.ends[name] - begin) * 1000:>10.1f}" if name in self.ends else f"{'-':>10}"
+            lines.append(f"{name:<16}{(begin - self.start) * 1000:>10.1f}{took}")
+
+        return "\n".join(lines)
@@ -0,0 +1,89 @@
+"""
+Plot data for calendar views computed from the store, and static rendering
+of a year plot to a figure. Nothing here needs Qt, so plots can be rendered
+headless with the Agg backend.
+"""
+
+import datetime
+from typing import Any, Dict, List, Tuple
+
+from matplotlib.artist import Artist
+from matplotlib.figure import Figure
+
+import mento.viz as viz
+from mento.correlation import correlate, feature_matrix, frequent_features
+from mento.frame import EntryFrame
+from mento.store import SQLiteStore
+from mento.trace import traced
+
+PLOT_TYPES = ["mood", "mood (hour)", "count", "polarity", "mentions", "correlation"]
+
+# Number of most frequent features in correlation plots
+CORRELATION_FEATURES = 12
+
+
+@traced()
+def calendar_colors(store: SQLiteStore, year: int, plot_type: str) -> Dict[datetime.date, Any]:
+    """
+    Return colors of days of `year` for a grid plot type.
+    """
+
+    start = datetime.date(year, 1, 1)
+    end = datetime.date(year, 12, 31)
+
+    colors = {}
+    if plot_type == "polarity":
+        ct = viz.color_transform((-1, 1))
+        for dt, v in store.aggregate("polarity", start, end).items():
+            colors[dt] = ct(v)
+
+    elif plot_type == "mood":
+        ct = viz.color_transform((-2, 2))
+        for dt, v in store.aggregate("mean", start, end, tracker="mood").items():
+            colors[dt] = ct(v)
+
+    elif plot_type in ["count", "mentions"]:
+        aggregated = store.aggregate(plot_type, start, end)
+        ct = viz.color_transform((0, max(aggregated.values(), default=0) or 1))
+        for dt, v in aggregated.items():
+            colors[dt] = ct(v)
+
+    return colors
+
+
+@traced()
+def year_correlations(store: SQLiteStore, year: int, n_features: int) -> Tuple[List[str], List[Tuple[str, Any]]]:
+    """
+    Return the most frequent features of the year with their same and next
+    day correlations.
+    """
+
+    start, end = datetime.date(year, 1, 1), datetime.date(year, 12, 31)
+    matrix = feature_matrix(EntryFrame.from_store(store, start, end))
+    names = frequent_features(matrix, n_features, min_periods=7)
+    acc = correlate(matrix.select(names), max_lag=1)
+
+    return names, [
+        ("same day", acc.result(0, min_periods=7)[0]),
+        ("next day", acc.result(1, min_periods=7)[0])
+    ]
+
+
+@traced()
+def render_year(fig: Figure, store: SQLiteStore, year: int, plot_type: str) -> List[Artist]:
+    """
+    Plot `year` as `plot_type` on `fig` and return the artists added.
+    """
+
+    if plot_type not in PLOT_TYPES:
+        raise ValueError(f"Unknown plot type: {plot_type}")
+
+    if plot_type == "mood (hour)":
+        start, end = datetime.date(year, 1, 1), datetime.date(year, 12, 31)
+        return viz.plot_year_polar(fig, year, viz.MoodPoints(store.find_entries(start, end, tracker="mood")))
+
+    if plot_type == "correlation":
+        return viz.plot_year_correlation(fig, year, *year_correlations(store, year, CORRELATION_FEATURES))
+
+    grid = viz.plot_year(fig, year, calendar_colors(store, year, plot_type))
+    return [*grid.axs, *grid.animated_artists, grid.title]
@@ -0,0 +1,124 @@
+"""
+Line scanner for org nodes in the layouts mento reads. Headings, property
+drawers and bodies are picked out directly from lines without building an
+orgparse tree. Anything the scanner doesn't handle the way orgparse would,
+like planning lines, clocks or in-buffer TODO settings, makes it fall back to
+orgparse.
+"""
+
+import re
+from typing import Dict, List, NamedTuple, Optional, Sequence, Union
+
+import orgparse
+from orgparse.inline import to_plain_text
+from orgparse.node import (parse_heading_priority, parse_heading_tags,
+                           parse_heading_todos)
+
+import mento.trace as trace
+from mento.trace import traced
+
+NODE_HEADER_RE = re.compile(r"\*+ ")
+HEADING_RE = re.compile(r"(\*+)\s+(.*?)\s*$")
+PROPERTY_RE = re.compile(r"\s*:(.*?):\s*(.*?)\s*$")
+
+# In-buffer TODO keyword settings, which orgparse applies to the whole file
+TODO_SETTING = r"(?i:^\s*#\+(?:seq_|typ_)?todo:)"
+TODO_SETTING_RE = re.compile(TODO_SETTING)
+
+# Text that orgparse gives a special meaning to in a node's lines
+ANOMALY_RE = re.compile(r"CLOCK:|SCHEDULED:|DEADLINE:|CLOSED:|:Effort:|State\s+\"|" + TODO_SETTING, re.MULTILINE)
+
+TODO_KEYS = ["TODO", "DONE"]
+
+
+class ScannedNode(NamedTuple):
+    level: int
+    heading: str
+    properties: Dict[str, str]
+    body: str
+
+
+Node = Union[ScannedNode, orgparse.node.OrgNode]
+
+
+def _plain(text: str) -> str:
+    return to_plain_text(text) if "[[" in text else text
+
+
+def _scan(lines: Sequence[str]) -> ScannedNode:
+    match = HEADING_RE.match(lines[0])
+    assert match is not None
+
+    heading = match.group(2)
+    if heading.endswith(":"):
+        # Tag matching is slow on long headings, and tags can only be at the end
+        heading, _ = parse_heading_tags(heading)
+    heading, _ = parse_heading_todos(heading, TODO_KEYS)
+    heading, _ = parse_heading_priority(heading)
+
+    properties: Dict[str, str] = {}
+    body_lines = lines[1:]
+
+    for i, line in enumerate(body_lines):
+        if ":PROPERTIES:" in line:
+            rest = iter(body_lines[i + 1:])
+            for prop_line in rest:
+                if ":END:" in prop_line:
+                    break
+                prop = PROPERTY_RE.match(prop_line)
+                if prop:
+                    properties[prop.group(1)] = prop.group(2)
+            body_lines = [*body_lines[:i], *rest]
+            break
+
+    return ScannedNode(len(match.group(1)), _plain(heading), properties, _plain("\n".join(body_lines)))
+
+
+def scan_node(lines: Sequence[str]) -> Optional[ScannedNode]:
+    """
+    Scan a single node from its heading and body lines. Return None if the
+    node needs orgparse.
+    """
+
+    if not lines or not NODE_HEADER_RE.match(lines[0]) or ANOMALY_RE.search("\n".join(lines)):
+        return None
+
+    return _scan(lines)
+
+
+def scan_nodes(lines: Sequence[str]) -> Optional[List[ScannedNode]]:
+    """
+    Scan all nodes of a document in order, dropping lines before the first
+    heading. Return None if any part of the document needs orgparse.
+    """
+
+    if ANOMALY_RE.search("\n".join(lines)):
+        return None
+
+    starts = [i for i, line in enumerate(lines) if line.startswith("*") and NODE_HEADER_RE.match(line)]
+    return [_scan(lines[i:j]) for i, j in zip(starts, [*starts[1:], len(lines)])]
+
+
+@traced("orgparse", timeline=False)
+def _orgparse(lines: Sequence[str]) -> List[Node]:
+    trace.count("scanner.orgparse_fallbacks")
+    return list(orgparse.loadi(lines)[1:])
+
+
+def load_node(lines: Sequence[str]) -> Node:
+    """
+    Parse a single node, with orgparse if the scanner can't.
+    """
+
+    node = scan_node(lines)
+    return _orgparse(lines)[0] if node is None else node
+
+
+def load_nodes(text: str) -> List[Node]:
+    """
+    Parse all nodes of an org document, with orgparse if the scanner can't.
+    """
+
+    lines = text.splitlines()
+    nodes = scan_nodes(lines)
+    return _orgparse(lines) if nodes is None else list(nodes)
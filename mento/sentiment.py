@@ -0,0 +1,163 @@
+import abc
+import concurrent.futures
+import os
+import re
+import statistics
+import xml.etree.ElementTree as ET
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from mento.trace import traced
+
+DEFAULT_ANALYZER = "textblob"
+
+
+class Analyzer(abc.ABC):
+    """
+    Scores polarity of texts in range [-1, 1]. `key` identifies the analyzer
+    and its version so that cached scores are invalidated when either changes.
+    """
+
+    name = ""
+    version = ""
+
+    @property
+    def key(self) -> str:
+        return f"{self.name}-{self.version}"
+
+    @abc.abstractmethod
+    def score(self, texts: List[str]) -> List[float]:
+        ...
+
+
+class TextBlobAnalyzer(Analyzer):
+    """
+    Pattern based analyzer from TextBlob.
+    """
+
+    name = "textblob"
+
+    @property
+    def key(self) -> str:
+        # Reading package metadata is slow, so the version is only looked up
+        # once scores are needed
+        if not self.version:
+            from importlib.metadata import version
+            self.version = version("textblob")
+        return super().key
+
+    @traced()
+    def score(self, texts: List[str]) -> List[float]:
+        from textblob import TextBlob
+        return [TextBlob(text).sentiment.polarity for text in texts]
+
+
+class LexiconAnalyzer(Analyzer):
+    """
+    Faster analyzer that averages word polarities from TextBlob's adjective
+    lexicon with simple handling of negations. It skips the part of speech
+    tagging and modifier rules of TextBlob so scores differ from it.
+    """
+
+    name = "lexicon"
+    version = "2"
+
+    # Contractions like "don't" are negations too
+    negations = {"not", "no", "never", "cannot"}
+
+    def __init__(self):
+        self._lexicon: Optional[Dict[str, float]] = None
+
+    @property
+    def lexicon(self) -> Dict[str, float]:
+        if self._lexicon is None:
+            import textblob.en
+
+            path = os.path.join(os.path.dirname(textblob.en.__file__), "en-sentiment.xml")
+            polarities: Dict[str, List[float]] = {}
+            for word in ET.parse(path).getroot().iter("word"):
+                polarities.setdefault(word.attrib["form"].lower(), []).append(float(word.attrib["polarity"]))
+
+            self._lexicon = {form: statistics.mean(ps) for form, ps in polarities.items() if any(ps)}
+
+        return self._lexicon
+
+    def score_text(self, text: str) -> float:
+        lexicon = self.lexicon
+        scores = []
+        negated = False
+
+        for token in re.findall(r"[a-z]+n't|[a-z]+", text.lower().replace("’", "'")):
+            if token in self.negations or token.endswith("n't"):
+                negated = True
+            elif token in lexicon:
+                scores.append(-0.5 * lexicon[token] if negated else lexicon[token])
+                negated = False
+
+        return statistics.mean(scores) if scores else 0.0
+
+    @traced()
+    def score(self, texts: List[str]) -> List[float]:
+        return [self.score_text(text) for text in texts]
+
+
+ANALYZERS = {
+    "textblob": TextBlobAnalyzer,
+    "lexicon": LexiconAnalyzer,
+}
+
+# Analyzers already loaded in this process, mostly for pool workers
+_analyzers: Dict[str, Analyzer] = {}
+
+
+def get_analyzer(name: str = DEFAULT_ANALYZER) -> Analyzer:
+    if name not in ANALYZERS:
+        raise ValueError(f"Unknown analyzer: {name}")
+
+    if name not in _analyzers:
+        _analyzers[name] = ANALYZERS[name]()
+
+    return _analyzers[name]
+
+
+def _score_batch(name: str, texts: List[str]) -> List[float]:
+    return get_analyzer(name).score(texts)
+
+
+def score_texts(
+        texts: List[str],
+        analyzer: str = DEFAULT_ANALYZER,
+        workers: Optional[int] = None,
+        batch_size: int = 256,
+        progress: Optional[Callable[[int, int], None]] = None
+) -> Iterator[Tuple[int, float]]:
+    """
+    Score `texts` in batches and yield (index, polarity) pairs as batches
+    finish. Work is spread over `workers` processes unless everything fits in
+    a single batch. `progress` is called with (done, total) after each batch.
+    """
+
+    batches = [(i, texts[i:i + batch_size]) for i in range(0, len(texts), batch_size)]
+    done = 0
+
+    if len(batches) <= 1 or workers == 1:
+        for start, batch in batches:
+            yield from enumerate(_score_batch(analyzer, batch), start=start)
+            done += len(batch)
+            if progress:
+                progress(done, len(texts))
+        return
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(_score_batch, analyzer, batch): (start, len(batch)) for start, batch in batches}
+
+        try:
+            for ft in concurrent.futures.as_completed(futures):
+                start, size = futures[ft]
+                yield from enumerate(ft.result(), start=start)
+                done += size
+                if progress:
+                    progress(done, len(texts))
+        finally:
+            # Don't wait for batches that haven't started when stopped early
+            for ft in futures:
+                ft.cancel()
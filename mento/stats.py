@@ -1,32 +1,110 @@
 import datetime
-import statistics
-from typing import Any, Callable, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Union
 
-from pydash import py_
-from textblob import TextBlob
+import numpy as np
 
+from mento.frame import EntryFrame, group_count, group_mean
+from mento.sentiment import get_analyzer
+from mento.trace import traced
 from mento.types import Entry
 
+Entries = Union[EntryFrame, List[Entry]]
 
-def aggregate_mean_mood(entries: List[Entry]) -> Optional[float]:
-    trackers = py_.flatten([e.trackers for e in entries])
-    mood_trackers = [t for t in trackers if t.name == "mood"]
 
-    if mood_trackers:
-        return statistics.mean([t.value for t in mood_trackers])
+def as_frame(entries: Entries) -> EntryFrame:
+    if isinstance(entries, EntryFrame):
+        return entries
+    return EntryFrame.from_entries(entries)
+
+
+def entry_polarity(frame: EntryFrame) -> np.ndarray:
+    """
+    Polarity of each entry of the frame, scoring bodies when the frame has no
+    cached scores.
+    """
+
+    if frame.polarity is not None:
+        return frame.polarity
+    return np.array(get_analyzer().score(frame.bodies or []), dtype=np.float64)
+
+
+@traced()
+def aggregate_mean_mood(entries: Entries) -> Optional[float]:
+    _, values = as_frame(entries).tracker("mood")
+
+    if len(values):
+        return float(values.mean())
     return None
 
 
-def aggregate_mean_polarity(entries: List[Entry]) -> float:
-    return statistics.mean([TextBlob(ent.body).sentiment.polarity for ent in entries])
+@traced()
+def aggregate_mean_polarity(entries: Entries) -> float:
+    return float(np.nanmean(entry_polarity(as_frame(entries))))
+
+
+@traced()
+def aggregate_mentions(entries: Entries) -> int:
+    return len(as_frame(entries).people_entry)
+
+
+@traced()
+def aggregate_count(entries: Entries) -> int:
+    return len(as_frame(entries))
+
+
+def _by_date(frame: EntryFrame, values: np.ndarray) -> Dict[datetime.date, Any]:
+    days, _ = frame.date_groups()
+    return {date: None if np.isnan(v) else v.item() for date, v in zip(frame.to_dates(days), values)}
+
+
+def mean_mood_by_date(frame: EntryFrame) -> Dict[datetime.date, Optional[float]]:
+    days, groups = frame.date_groups()
+    rows, values = frame.tracker("mood")
+    return _by_date(frame, group_mean(groups[rows], values, len(days)))
+
+
+def mean_polarity_by_date(frame: EntryFrame) -> Dict[datetime.date, Optional[float]]:
+    days, groups = frame.date_groups()
+    polarity = entry_polarity(frame)
+    scored = ~np.isnan(polarity)
+    return _by_date(frame, group_mean(groups[scored], polarity[scored], len(days)))
+
+
+def mentions_by_date(frame: EntryFrame) -> Dict[datetime.date, int]:
+    days, groups = frame.date_groups()
+    return _by_date(frame, group_count(groups[frame.people_entry], len(days)))
+
+
+def count_by_date(frame: EntryFrame) -> Dict[datetime.date, int]:
+    days, groups = frame.date_groups()
+    return _by_date(frame, group_count(groups, len(days)))
+
+
+BY_DATE: Dict[Callable, Callable[[EntryFrame], Dict[datetime.date, Any]]] = {
+    aggregate_mean_mood: mean_mood_by_date,
+    aggregate_mean_polarity: mean_polarity_by_date,
+    aggregate_mentions: mentions_by_date,
+    aggregate_count: count_by_date,
+}
+
 
+@traced()
+def aggregate_by_date(entries: Entries, aggregate_fn: Callable[[EntryFrame], Any]) -> Dict[datetime.date, Any]:
+    """
+    Apply `aggregate_fn` to entries of each date. Aggregates of this module
+    run as a single group by over the frame. Others are called once per date
+    with an `EntryFrame` of the entries of that date, not a list of entries.
+    """
 
-def aggregate_mentions(entries: List[Entry]) -> int:
-    return len(py_.flatten([e.people for e in entries]))
+    frame = as_frame(entries)
 
+    if aggregate_fn in BY_DATE:
+        return BY_DATE[aggregate_fn](frame)
 
-def aggregate_by_date(entries: List[Entry], aggregate_fn: Callable[[List[Entry]], Any]) -> Dict[datetime.date, Any]:
+    days, groups = frame.date_groups()
+    order = np.argsort(groups, kind="stable")
+    bounds = np.searchsorted(groups[order], np.arange(1, len(days)))
     return {
-        date: aggregate_fn(entries)
-        for date, entries in py_.group_by(entries, lambda e: e.date).items()
+        date: aggregate_fn(frame.take(rows))
+        for date, rows in zip(frame.to_dates(days), np.split(order, bounds))
     }
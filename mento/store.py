@@ -1,60 +1,848 @@
+import collections
+import concurrent.futures
+import contextlib
+import datetime
+import itertools
+import multiprocessing
+import os
+import queue
 import sqlite3
-from typing import List
+from typing import (Any, Callable, Dict, Iterable, Iterator, List, Optional,
+                    Sequence, Set, Tuple, overload)
 
-from mento.parser import parse_source
-from mento.types import Entry, Source, SourceType, entry_dumps, entry_loads
-from mento.util import directory_hash, file_hash
+import mento.trace as trace
+from mento.decrypt import DEFAULT_WORKERS, DecryptionError, Decryptor
+from mento.parser import (ask_passphrase, parse_source_file, source_files,
+                          source_root)
+from mento.sentiment import DEFAULT_ANALYZER, get_analyzer, score_texts
+from mento.trace import traced
+from mento.types import (Entry, Names, Source, SourceType, entry_dumps,
+                         entry_loads)
+from mento.util import (Fingerprint, batched, file_fingerprint, file_hash,
+                        text_hash)
 
+# Number of entries inserted at once and number of such batches a source can
+# have parsed ahead of the writer
+BATCH_SIZE = 500
+QUEUE_SIZE = 8
 
-def calculate_cache_state(source: Source) -> str:
-    if source.source_type == SourceType.ORGZLY:
-        return file_hash(source.path)
-    elif source.source_type == SourceType.ORG_LIST:
-        return file_hash(source.path)
-    elif source.source_type == SourceType.ORG_JOURNAL:
-        return directory_hash(source.path)
+# Cache state of a single file as (stat fingerprint, content hash)
+FileState = Tuple[Fingerprint, str]
+
+
+@traced()
+def calculate_cache_state(source: Source, known: Optional[Dict[str, FileState]] = None) -> Dict[str, FileState]:
+    """
+    Return mapping of each file in the source to its cache state. Files whose
+    stat fingerprint matches the one in `known` are trusted to be unchanged and
+    are not read. Only the rest are hashed.
+    """
+
+    known = known or {}
+    state = {}
+
+    for filepath in source_files(source):
+        fingerprint = file_fingerprint(filepath)
+
+        if filepath in known and known[filepath][0] == fingerprint:
+            state[filepath] = known[filepath]
+        else:
+            state[filepath] = (fingerprint, file_hash(filepath))
+
+    return state
+
+
+@traced()
+def parse_files(source: Source, filepaths: List[str], out: queue.Queue, passphrase: Optional[str] = None, gpg_workers: int = DEFAULT_WORKERS):
+    """
+    Parse entries from given files of the source and put them on `out` as
+    (filepath, batch of entries) items. None is put once all files are done,
+    or the exception if parsing fails. Nodes that fail to decrypt are
+    skipped, but if none of them decrypt parsing fails with DecryptionError.
+    """
+
+    try:
+        with Decryptor(passphrase, workers=gpg_workers) as decryptor, \
+             concurrent.futures.ThreadPoolExecutor(max_workers=gpg_workers) as executor:
+
+            def _parse(filepath: str):
+                for batch in batched(parse_source_file(source, filepath, decryptor), BATCH_SIZE):
+                    out.put((filepath, batch))
+
+            for ft in [executor.submit(_parse, filepath) for filepath in filepaths]:
+                ft.result()
+
+        if decryptor.stats.calls:
+            print(f":: {source.path}: {decryptor.stats.summary()}")
+            if decryptor.stats.failures == decryptor.stats.calls:
+                # Most likely a wrong passphrase
+                raise DecryptionError(f"Failed to decrypt anything in {source.path}")
+
+        out.put(None)
+    except Exception as e:
+        out.put(e)
+
+
+def _forward_failure(out: queue.Queue) -> Callable[[concurrent.futures.Future], None]:
+    """
+    Return a done callback for a parse_files future that puts its exception
+    on `out`, for when the worker died or never started and couldn't.
+    """
+
+    def _done(ft: concurrent.futures.Future):
+        if not ft.cancelled() and ft.exception() is not None:
+            out.put(ft.exception())
+
+    return _done
+
+
+def _drain(out: queue.Queue):
+    """
+    Discard items from `out` till its producer is done so that it doesn't
+    block forever.
+    """
+
+    while True:
+        item = out.get()
+        if item is None or isinstance(item, Exception):
+            return
+
+
+def _migrate_file_manifest(cur: sqlite3.Cursor):
+    """
+    Keep a manifest of files per source so that refresh only re-parses the
+    files that changed. Entries without a file can't be invalidated, so we drop
+    them and let the next refresh parse everything again.
+    """
+
+    cur.execute("CREATE TABLE files (id INTEGER PRIMARY KEY, source_id, path, size, mtime, hash, FOREIGN KEY (source_id) REFERENCES sources (id))")
+    cur.execute("ALTER TABLE entries ADD COLUMN file_id REFERENCES files (id)")
+    cur.execute("CREATE INDEX entries_file_id ON entries (file_id)")
+    cur.execute("DELETE FROM entries")
+    cur.execute("UPDATE sources SET cache_state = NULL")
+
+
+def _migrate_file_inode(cur: sqlite3.Cursor):
+    """
+    Track inode with size and mtime for stat based change detection. Old rows
+    don't have it so they get hashed once again on next refresh.
+    """
+
+    cur.execute("ALTER TABLE files ADD COLUMN inode")
+
+
+def _save_names(cur: sqlite3.Cursor, names: Names):
+    """
+    Store names interned since the last save. Needs the write lock to have
+    been held since `names` were loaded.
+    """
+
+    saved = cur.execute("SELECT COUNT(*) FROM names").fetchone()[0]
+    cur.executemany("INSERT INTO names (id, name) VALUES (?, ?)", [(i, names.names[i]) for i in range(saved, len(names))])
+
+
+@traced()
+def _insert_entries(cur: sqlite3.Cursor, entries: Iterable[Entry], s_id: int, f_id: Optional[int], names: Names):
+    for ent in entries:
+        cur.execute(
+            "INSERT INTO entries (source_id, file_id, date, time, body_hash, data) VALUES (?, ?, ?, ?, ?, ?)",
+            (s_id, f_id, ent.date.isoformat(), ent.time.isoformat() if ent.time else None, text_hash(ent.body), entry_dumps(ent, names))
+        )
+        e_id = cur.lastrowid
+
+        cur.executemany("INSERT INTO trackers (entry_id, name, value) VALUES (?, ?, ?)", [(e_id, t.name, t.value) for t in ent.trackers or []])
+        cur.executemany("INSERT INTO people (entry_id, name) VALUES (?, ?)", [(e_id, p.name) for p in ent.people or []])
+        cur.executemany("INSERT INTO contexts (entry_id, name) VALUES (?, ?)", [(e_id, c.name) for c in ent.contexts or []])
+
+    _save_names(cur, names)
+
+
+def _migrate_normalized(cur: sqlite3.Cursor):
+    """
+    Move from a JSON blob per entry to typed columns for date and time with
+    child tables for trackers, people and contexts. The blob is kept for
+    loading complete entries.
+    """
+
+    rows = cur.execute("SELECT data, source_id, file_id FROM entries").fetchall()
+    cur.execute("DROP TABLE entries")
+
+    cur.execute("""
+    CREATE TABLE entries (
+      id INTEGER PRIMARY KEY,
+      source_id REFERENCES sources (id),
+      file_id REFERENCES files (id),
+      date TEXT NOT NULL,
+      time TEXT,
+      data
+    )""")
+    cur.execute("CREATE TABLE trackers (entry_id INTEGER NOT NULL REFERENCES entries (id), name TEXT NOT NULL, value INTEGER)")
+    cur.execute("CREATE TABLE people (entry_id INTEGER NOT NULL REFERENCES entries (id), name TEXT NOT NULL)")
+    cur.execute("CREATE TABLE contexts (entry_id INTEGER NOT NULL REFERENCES entries (id), name TEXT NOT NULL)")
+
+    cur.execute("CREATE INDEX entries_date ON entries (date, time)")
+    cur.execute("CREATE INDEX entries_file_id ON entries (file_id)")
+    for table in ["trackers", "people", "contexts"]:
+        cur.execute(f"CREATE INDEX {table}_name ON {table} (name, entry_id)")
+        cur.execute(f"CREATE INDEX {table}_entry_id ON {table} (entry_id)")
+
+    # Children go away with their entry without needing foreign key support
+    # to be turned on for the connection
+    cur.execute("""
+    CREATE TRIGGER entries_delete AFTER DELETE ON entries BEGIN
+      DELETE FROM trackers WHERE entry_id = OLD.id;
+      DELETE FROM people WHERE entry_id = OLD.id;
+      DELETE FROM contexts WHERE entry_id = OLD.id;
+    END""")
+
+    for data, s_id, f_id in rows:
+        ent = entry_loads(data)
+        cur.execute(
+            "INSERT INTO entries (source_id, file_id, date, time, data) VALUES (?, ?, ?, ?, ?)",
+            (s_id, f_id, ent.date.isoformat(), ent.time.isoformat() if ent.time else None, data)
+        )
+        e_id = cur.lastrowid
+
+        cur.executemany("INSERT INTO trackers (entry_id, name, value) VALUES (?, ?, ?)", [(e_id, t.name, t.value) for t in ent.trackers or []])
+        cur.executemany("INSERT INTO people (entry_id, name) VALUES (?, ?)", [(e_id, p.name) for p in ent.people or []])
+        cur.executemany("INSERT INTO contexts (entry_id, name) VALUES (?, ?)", [(e_id, c.name) for c in ent.contexts or []])
+
+
+def _migrate_polarity_cache(cur: sqlite3.Cursor):
+    """
+    Cache sentiment polarity per distinct entry body and analyzer.
+    """
+
+    cur.execute("ALTER TABLE entries ADD COLUMN body_hash TEXT")
+    rows = cur.execute("SELECT id, data FROM entries").fetchall()
+    cur.executemany("UPDATE entries SET body_hash = ? WHERE id = ?", [(text_hash(entry_loads(data).body), e_id) for e_id, data in rows])
+    cur.execute("CREATE INDEX entries_body_hash ON entries (body_hash)")
+
+    cur.execute("CREATE TABLE polarity (body_hash TEXT NOT NULL, analyzer TEXT NOT NULL, value REAL NOT NULL, PRIMARY KEY (body_hash, analyzer))")
+
+
+@traced()
+def _update_rollups(cur: sqlite3.Cursor, dates: Optional[Iterable[str]] = None):
+    """
+    Recompute daily rollups of the given ISO `dates`, or of all dates if not
+    given. Rollups keep the sum and number of values of a metric per day so
+    that both totals and means can be read without touching entries.
+    """
+
+    if dates is None:
+        cur.execute("DELETE FROM daily_rollups")
+        where = ""
     else:
-        raise TypeError("Wrong source type")
+        cur.execute("CREATE TEMP TABLE IF NOT EXISTS rollup_dates (date TEXT PRIMARY KEY)")
+        cur.execute("DELETE FROM rollup_dates")
+        cur.executemany("INSERT OR IGNORE INTO rollup_dates (date) VALUES (?)", [(dt, ) for dt in dates])
+        cur.execute("DELETE FROM daily_rollups WHERE date IN (SELECT date FROM rollup_dates)")
+        where = "WHERE e.date IN (SELECT date FROM rollup_dates)"
+
+    cur.execute(f"""
+    INSERT INTO daily_rollups (date, metric, key, total, n)
+    SELECT e.date, 'count', '', COUNT(*), COUNT(*) FROM entries e {where} GROUP BY e.date
+    """)
+    cur.execute(f"""
+    INSERT INTO daily_rollups (date, metric, key, total, n)
+    SELECT e.date, 'mentions', '', SUM((SELECT COUNT(*) FROM people p WHERE p.entry_id = e.id)), COUNT(*)
+    FROM entries e {where} GROUP BY e.date
+    """)
+    cur.execute(f"""
+    INSERT INTO daily_rollups (date, metric, key, total, n)
+    SELECT e.date, 'tracker', t.name, SUM(t.value), COUNT(t.value) FROM entries e JOIN trackers t ON t.entry_id = e.id
+    {where} {"AND" if where else "WHERE"} t.value IS NOT NULL GROUP BY e.date, t.name
+    """)
+    cur.execute(f"""
+    INSERT INTO daily_rollups (date, metric, key, total, n)
+    SELECT e.date, 'polarity', p.analyzer, SUM(p.value), COUNT(*) FROM entries e JOIN polarity p ON p.body_hash = e.body_hash
+    {where} GROUP BY e.date, p.analyzer
+    """)
+
+
+def _migrate_daily_rollups(cur: sqlite3.Cursor):
+    """
+    Keep per day aggregates that refresh updates for the dates it touches.
+    """
+
+    cur.execute("""
+    CREATE TABLE daily_rollups (
+      date TEXT NOT NULL,
+      metric TEXT NOT NULL,
+      key TEXT NOT NULL,
+      total REAL,
+      n INTEGER NOT NULL,
+      PRIMARY KEY (metric, key, date)
+    )""")
+    cur.execute("CREATE INDEX daily_rollups_date ON daily_rollups (date)")
+    _update_rollups(cur)
+
+
+def _migrate_binary_entries(cur: sqlite3.Cursor):
+    """
+    Re-encode entry data from JSON to the binary layout. Names in entries are
+    stored once in the names table and referred to by id.
+    """
+
+    cur.execute("CREATE TABLE names (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)")
+
+    names = Names()
+    rows = cur.execute("SELECT id, data FROM entries").fetchall()
+    cur.executemany("UPDATE entries SET data = ? WHERE id = ?", [(entry_dumps(entry_loads(data), names), e_id) for e_id, data in rows])
+    _save_names(cur, names)
+
+
+# Migrations are applied in order and the number of applied migrations is
+# tracked in sqlite's user_version.
+MIGRATIONS: List[Callable[[sqlite3.Cursor], None]] = [
+    _migrate_file_manifest,
+    _migrate_file_inode,
+    _migrate_normalized,
+    _migrate_polarity_cache,
+    _migrate_daily_rollups,
+    _migrate_binary_entries,
+]
+
+
+class EntryView(Sequence[Entry]):
+    """
+    Entries of a store sorted by date and time. Only the entries asked for
+    are loaded. The view is pinned to the entries there were when it was
+    made, so indices stay put while other connections write. Entries deleted
+    since are left out of what is returned.
+    """
+
+    def __init__(self, store: "SQLiteStore"):
+        self.store = store
+        self.con = store.con
+
+        rows = self.con.execute("SELECT id, date FROM entries ORDER BY date, time, id").fetchall()
+        self.ids: List[int] = [it[0] for it in rows]
+        self.counts: List[Tuple[datetime.date, int]] = [
+            (datetime.date.fromisoformat(date), len(list(group)))
+            for date, group in itertools.groupby(it[1] for it in rows)
+        ]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @overload
+    def __getitem__(self, i: int) -> Entry: ...
+
+    @overload
+    def __getitem__(self, i: slice) -> List[Entry]: ...
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            start, stop, step = i.indices(len(self))
+            if step != 1:
+                raise ValueError("Entry views only support contiguous slices")
+
+            data = {}
+            for batch in batched(self.ids[start:stop], BATCH_SIZE):
+                query = f"SELECT id, data FROM entries WHERE id IN ({', '.join('?' * len(batch))})"
+                data.update(self.con.execute(query, batch).fetchall())
+
+            return [self.store._loads(data[e_id]) for e_id in self.ids[start:stop] if e_id in data]
+
+        entries = self[i:i + 1] if i >= 0 else self[len(self) + i:len(self) + i + 1]
+        if not entries:
+            raise IndexError("Entry index out of range")
+        return entries[0]
+
+    def date_counts(self) -> List[Tuple[datetime.date, int]]:
+        """
+        Return dates with entries, in order, with their number of entries.
+        """
+
+        return self.counts
 
 
 class SQLiteStore:
     """
-    Basic SQLite database without much schema for storing sources and entries.
+    SQLite database for storing sources and entries. Entries have their date,
+    time, trackers, people and contexts in indexed columns so that queries run
+    in SQL and only load the entries they match.
     """
 
-    def __init__(self, path: str):
+    def __init__(self, path: str, analyzer: str = DEFAULT_ANALYZER):
+        self.path = path
         self.con = sqlite3.connect(path)
+        self.analyzer = get_analyzer(analyzer)
+
+        # Passphrases by source id, asked for once and kept for later refreshes
+        self.passphrases: Dict[int, str] = {}
 
         if not self.con.execute("SELECT name FROM sqlite_master").fetchall():
             self._init_db()
 
+        self._migrate()
+        self.names = self._load_names()
+
+    def _load_names(self) -> Names:
+        return Names([it[0] for it in self.con.execute("SELECT name FROM names ORDER BY id")])
+
+    def reload(self):
+        """
+        Pick up names written by other connections to the same database.
+        """
+
+        self.names = self._load_names()
+
+    def _loads(self, data: Any) -> Entry:
+        try:
+            return entry_loads(data, self.names)
+        except IndexError:
+            # Saved by another connection with names we haven't seen yet
+            self.reload()
+            return entry_loads(data, self.names)
+
+    def sources(self) -> List[Tuple[int, Source]]:
+        return [
+            (row[0], Source(SourceType[row[1]], row[2], row[3]))
+            for row in self.con.execute("SELECT id, type, path, config FROM sources").fetchall()
+        ]
+
     @property
+    @traced("SQLiteStore.entries")
     def entries(self) -> List[Entry]:
         cur = self.con.cursor()
-        return [entry_loads(it[0]) for it in cur.execute("SELECT data FROM entries")]
+        entries = [self._loads(it[0]) for it in cur.execute("SELECT data FROM entries")]
+        trace.count("entries.decoded", len(entries))
+        return entries
+
+    def entry_view(self) -> EntryView:
+        return EntryView(self)
+
+    def iter_entries(self, start: Optional[datetime.date] = None, end: Optional[datetime.date] = None) -> Iterator[Entry]:
+        """
+        Yield entries sorted by date and time, between `start` and `end`
+        dates (both inclusive), without holding all of them in memory.
+        """
+
+        query = "SELECT data FROM entries WHERE date BETWEEN ? AND ? ORDER BY date, time, id"
+        params = ((start or datetime.date.min).isoformat(), (end or datetime.date.max).isoformat())
+
+        for row in self.con.cursor().execute(query, params):
+            yield self._loads(row[0])
+
+    @traced()
+    def find_entries(
+            self,
+            start: Optional[datetime.date] = None,
+            end: Optional[datetime.date] = None,
+            tracker: Optional[str] = None,
+            person: Optional[str] = None,
+            context: Optional[str] = None
+    ) -> List[Entry]:
+        """
+        Return entries, sorted by time, between `start` and `end` dates (both
+        inclusive) that have all of the given tracker, person and context.
+        """
+
+        clauses = []
+        params: List[Any] = []
+
+        if start:
+            clauses.append("date >= ?")
+            params.append(start.isoformat())
+
+        if end:
+            clauses.append("date <= ?")
+            params.append(end.isoformat())
+
+        for table, name in [("trackers", tracker), ("people", person), ("contexts", context)]:
+            if name is not None:
+                clauses.append(f"id IN (SELECT entry_id FROM {table} WHERE name = ?)")
+                params.append(name)
+
+        query = "SELECT data FROM entries"
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY date, time"
+
+        return [self._loads(it[0]) for it in self.con.execute(query, params)]
+
+    @traced()
+    def aggregate(
+            self,
+            metric: str,
+            start: datetime.date,
+            end: datetime.date,
+            group_by: str = "date",
+            tracker: Optional[str] = None
+    ) -> Dict[Any, Any]:
+        """
+        Aggregate entries between `start` and `end` dates (both inclusive)
+        grouped by `date` or `hour` of entry. Supported metrics are:
+
+        - count :: number of entries.
+        - mean :: mean value of `tracker`, skipping entries without value.
+        - mentions :: number of people mentioned.
+        - polarity :: mean cached sentiment polarity of entries from the
+          store's analyzer.
+
+        Groups without any value for the metric are left out. Date groups are
+        read from the daily rollups.
+        """
+
+        if metric == "mean" and tracker is None:
+            raise ValueError("Tracker name is needed for mean")
+
+        if group_by == "date":
+            return self._aggregate_rollups(metric, start, end, tracker)
+
+        if group_by == "hour":
+            key = "CAST(substr(e.time, 1, 2) AS INTEGER)"
+        else:
+            raise ValueError(f"Unknown grouping: {group_by}")
+
+        params: List[Any] = [start.isoformat(), end.isoformat()]
+
+        if metric == "count":
+            query = f"SELECT {key}, COUNT(*) FROM entries e WHERE e.date BETWEEN ? AND ?"
+        elif metric == "mean":
+            query = f"""
+            SELECT {key}, AVG(t.value) FROM entries e JOIN trackers t ON t.entry_id = e.id
+            WHERE e.date BETWEEN ? AND ? AND t.name = ? AND t.value IS NOT NULL
+            """
+            params.append(tracker)
+        elif metric == "mentions":
+            query = f"""
+            SELECT {key}, COUNT(p.entry_id) FROM entries e LEFT JOIN people p ON p.entry_id = e.id
+            WHERE e.date BETWEEN ? AND ?
+            """
+        elif metric == "polarity":
+            query = f"""
+            SELECT {key}, AVG(p.value) FROM entries e JOIN polarity p ON p.body_hash = e.body_hash
+            WHERE p.analyzer = ? AND e.date BETWEEN ? AND ?
+            """
+            params.insert(0, self.analyzer.key)
+        else:
+            raise ValueError(f"Unknown metric: {metric}")
+
+        query += f" AND e.time IS NOT NULL GROUP BY {key}"
+
+        return dict(self.con.execute(query, params).fetchall())
+
+    def _aggregate_rollups(self, metric: str, start: datetime.date, end: datetime.date, tracker: Optional[str]) -> Dict[datetime.date, Any]:
+        key: Optional[str]
+        if metric in ["count", "mentions"]:
+            value, key = "CAST(total AS INTEGER)", ""
+        elif metric == "mean":
+            value, key = "total / n", tracker
+        elif metric == "polarity":
+            value, key = "total / n", self.analyzer.key
+        else:
+            raise ValueError(f"Unknown metric: {metric}")
+
+        rows = self.con.execute(f"""
+        SELECT date, {value} FROM daily_rollups
+        WHERE metric = ? AND key = ? AND date BETWEEN ? AND ? AND n > 0
+        """, ("tracker" if metric == "mean" else metric, key, start.isoformat(), end.isoformat()))
+
+        return {datetime.date.fromisoformat(date): v for date, v in rows}
+
+    def yearly(self, metric: str, key: str = "") -> Dict[int, Tuple[float, int, int]]:
+        """
+        Return total, number of values and number of days of a daily rollup
+        `metric` and `key` per year.
+        """
+
+        rows = self.con.execute("""
+        SELECT CAST(substr(date, 1, 4) AS INTEGER), SUM(total), SUM(n), COUNT(*) FROM daily_rollups
+        WHERE metric = ? AND key = ? AND n > 0 GROUP BY 1
+        """, (metric, key))
+
+        return {year: (total, int(n), days) for year, total, n, days in rows}
+
+    def name_counts(
+            self,
+            kind: str,
+            start: Optional[datetime.date] = None,
+            end: Optional[datetime.date] = None,
+            limit: Optional[int] = None
+    ) -> List[Tuple[str, int]]:
+        """
+        Return names of `kind`, trackers, people or contexts, with the number
+        of entries between `start` and `end` having them, most common first.
+        """
+
+        if kind not in ["trackers", "people", "contexts"]:
+            raise ValueError(f"Unknown kind: {kind}")
+
+        rows = self.con.execute(f"""
+        SELECT x.name, COUNT(DISTINCT x.entry_id) FROM {kind} x JOIN entries e ON e.id = x.entry_id
+        WHERE e.date BETWEEN ? AND ? GROUP BY x.name ORDER BY 2 DESC, x.name LIMIT ?
+        """, ((start or datetime.date.min).isoformat(), (end or datetime.date.max).isoformat(), -1 if limit is None else limit))
+
+        return [(name, n) for name, n in rows]
+
+    def date_range(self) -> Optional[Tuple[datetime.date, datetime.date]]:
+        """
+        Return dates of the first and the last entry, None if there are no
+        entries.
+        """
+
+        first, last = self.con.execute("SELECT MIN(date), MAX(date) FROM daily_rollups").fetchone()
+        if first is None:
+            return None
+        return datetime.date.fromisoformat(first), datetime.date.fromisoformat(last)
+
+    @traced()
+    def refresh(
+            self,
+            force=False,
+            gpg_workers: int = DEFAULT_WORKERS,
+            workers: Optional[int] = None,
+            paths: Optional[Iterable[str]] = None,
+            progress: Optional[Callable[[int, int], None]] = None,
+            ask: Optional[Callable[[Source], Optional[str]]] = None,
+            polarity_progress: Optional[Callable[[int, int], None]] = None
+    ) -> Set[datetime.date]:
+        """
+        Bring entries in sync with the sources and return dates whose entries
+        changed. Only files that are new or have changed since the last
+        refresh are parsed again, unless `force` is set. If `paths` are given,
+        only sources holding any of them are looked at.
+
+        Sources are hashed and parsed concurrently. Passphrases are asked for,
+        with `ask` if given, before any parsing starts. Journals are parsed on
+        threads, with at most `gpg_workers` decryptions at a time, and other
+        sources on up to `workers` processes. Results of each source are
+        written in their own transaction as soon as the source is done, and
+        `progress` is called with the number of sources done and their total.
+        Then `polarity_progress`, or `progress` if not given, is called with
+        the number of new entries whose polarity is computed and their total.
+        An exception from either stops the refresh after the sources written
+        till then.
+        """
+
+        cur = self.con.cursor()
+        sources = self.sources()
+
+        if paths is not None:
+            paths = [os.path.abspath(p) for p in paths]
+            roots = {s_id: source_root(source) for s_id, source in sources}
+            sources = [
+                (s_id, source) for s_id, source in sources
+                if any(p == roots[s_id] or p.startswith(roots[s_id] + os.sep) for p in paths)
+            ]
+
+        manifests = {
+            s_id: {
+                it[1]: (it[0], ((it[2], it[3], it[4]), it[5]))
+                for it in cur.execute("SELECT id, path, size, mtime, inode, hash FROM files WHERE source_id = ?", (s_id, ))
+            }
+            for s_id, _ in sources
+        }
+
+        with concurrent.futures.ThreadPoolExecutor() as executor:
+            states = list(executor.map(
+                lambda it: calculate_cache_state(it[1], {filepath: v[1] for filepath, v in manifests[it[0]].items()}),
+                sources
+            ))
+
+        plans = []
+        for (s_id, source), current_cache_state in zip(sources, states):
+            manifest = manifests[s_id]
+
+            changed = []
+            for filepath, (fingerprint, h) in current_cache_state.items():
+                if force or (filepath not in manifest) or (manifest[filepath][1][1] != h):
+                    changed.append(filepath)
+                elif manifest[filepath][1][0] != fingerprint:
+                    # Touched without a change in content, only the fingerprint
+                    # needs an update
+                    cur.execute(
+                        "UPDATE files SET size = ?, mtime = ?, inode = ? WHERE id = ?",
+                        (*fingerprint, manifest[filepath][0])
+                    )
+
+            deleted = [filepath for filepath in manifest if filepath not in current_cache_state]
+
+            if changed or deleted:
+                print(f":: Refreshing source: {source.path} ({len(changed)} changed, {len(deleted)} deleted)")
+                plans.append((s_id, source, current_cache_state, changed, deleted))
+
+        self.con.commit()
+
+        trace.count("refresh.files_changed", sum(len(p[3]) for p in plans))
+
+        ready = []
+        for plan in plans:
+            s_id, source, _, changed, _ = plan
+            if changed and s_id not in self.passphrases:
+                passphrase = (ask or ask_passphrase)(source)
+                if passphrase is not None:
+                    self.passphrases[s_id] = passphrase
+                elif source.source_type == SourceType.ORG_JOURNAL:
+                    # Left as it is till there is a passphrase for it
+                    print(f":: Skipping source without a passphrase: {source.path}")
+                    continue
+            ready.append(plan)
+        plans = ready
+
+        # A process pool only pays off with more than one CPU bound source
+        n_cpu_bound = len([p for p in plans if p[3] and p[1].source_type != SourceType.ORG_JOURNAL])
+
+        with contextlib.ExitStack() as stack:
+            threads = stack.enter_context(concurrent.futures.ThreadPoolExecutor())
+            processes = stack.enter_context(concurrent.futures.ProcessPoolExecutor(max_workers=workers))
+            manager = stack.enter_context(multiprocessing.Manager()) if n_cpu_bound > 1 else None
+
+            queues: List[queue.Queue] = []
+            for s_id, source, _, changed, _ in plans:
+                if source.source_type != SourceType.ORG_JOURNAL and manager is not None:
+                    out = manager.Queue(maxsize=QUEUE_SIZE)
+                    processes.submit(parse_files, source, changed, out).add_done_callback(_forward_failure(out))
+                else:
+                    out = queue.Queue(maxsize=QUEUE_SIZE)
+                    threads.submit(parse_files, source, changed, out, self.passphrases.get(s_id), gpg_workers)
+                queues.append(out)
+
+            # Sources are written in the order they were submitted so the one
+            # being written is always running. Others wait once their queues
+            # are full.
+            dates: Set[str] = set()
+            for i, (plan, out) in enumerate(zip(plans, queues)):
+                try:
+                    try:
+                        dates |= self._write_source(*plan, out)
+                    except DecryptionError as e:
+                        # Rolled back, so the files are parsed again once
+                        # there is a passphrase that works
+                        print(f":: Skipping source: {e}")
+                        self.passphrases.pop(plan[0], None)
+                    if progress:
+                        progress(i + 1, len(plans))
+                except Exception:
+                    for rest in queues[i + 1:]:
+                        _drain(rest)
+                    raise
+
+        self.backfill_polarity(progress=polarity_progress or progress)
+
+        return {datetime.date.fromisoformat(dt) for dt in dates}
+
+    @traced()
+    def _write_source(
+            self,
+            s_id: int,
+            source: Source,
+            current_cache_state: Dict[str, FileState],
+            changed: List[str],
+            deleted: List[str],
+            out: queue.Queue
+    ) -> Set[str]:
+        """
+        Replace entries of changed and deleted files of a source in a single
+        transaction, reading parsed entries from `out` as they come. Return
+        ISO dates that lost or gained entries.
+        """
 
-    def refresh(self, force=False):
         cur = self.con.cursor()
 
-        rows = cur.execute("SELECT id, type, path, config, cache_state FROM sources").fetchall()
+        manifest = {it[1]: it[0] for it in cur.execute("SELECT id, path FROM files WHERE source_id = ?", (s_id, ))}
+        producer_done = False
+
+        # Entries as (date, time, body hash) before and after, to tell dates
+        # that lose or gain entries and need their rollups updated
+        before: collections.Counter = collections.Counter()
+        after: collections.Counter = collections.Counter()
+
+        def _touch(f_id: int):
+            before.update(cur.execute("SELECT date, time, body_hash FROM entries WHERE file_id = ?", (f_id, )))
+
+        try:
+            # Other connections may have saved names since ours were loaded.
+            # Holding the write lock while reloading keeps new ids from
+            # colliding with theirs.
+            self.con.commit()
+            cur.execute("BEGIN IMMEDIATE")
+            self.names = self._load_names()
+
+            for filepath in deleted:
+                _touch(manifest[filepath])
+                cur.execute("DELETE FROM entries WHERE file_id = ?", (manifest[filepath], ))
+                cur.execute("DELETE FROM files WHERE id = ?", (manifest[filepath], ))
+
+            file_ids = {}
+            for filepath in changed:
+                fingerprint, h = current_cache_state[filepath]
+
+                if filepath in manifest:
+                    f_id = manifest[filepath]
+                    _touch(f_id)
+                    cur.execute("DELETE FROM entries WHERE file_id = ?", (f_id, ))
+                    cur.execute(
+                        "UPDATE files SET size = ?, mtime = ?, inode = ?, hash = ? WHERE id = ?",
+                        (*fingerprint, h, f_id)
+                    )
+                else:
+                    cur.execute(
+                        "INSERT INTO files (source_id, path, size, mtime, inode, hash) VALUES (?, ?, ?, ?, ?, ?)",
+                        (s_id, filepath, *fingerprint, h)
+                    )
+                    f_id = cur.lastrowid
 
-        for row in rows:
-            s_id = row[0]
-            source = Source(SourceType[row[1]], row[2], row[3])
+                file_ids[filepath] = f_id
 
-            stored_cache_state = row[4]
-            current_cache_state = calculate_cache_state(source)
+            item = out.get()
+            while item is not None:
+                if isinstance(item, Exception):
+                    producer_done = True
+                    raise item
 
-            if force or (stored_cache_state != current_cache_state):
-                print(f":: Refreshing source: {source.path}")
-                cur.execute("DELETE FROM entries WHERE source_id = ?", (s_id, ))
-                entries = parse_source(source)
+                filepath, batch = item
+                _insert_entries(cur, batch, s_id, file_ids[filepath], self.names)
+                trace.count("refresh.entries_written", len(batch))
+                after.update((ent.date.isoformat(), ent.time.isoformat() if ent.time else None, text_hash(ent.body)) for ent in batch)
+                item = out.get()
+
+            dates = {key[0] for key in (before - after) + (after - before)}
+            _update_rollups(cur, dates)
+        except Exception:
+            if not producer_done:
+                _drain(out)
+            self.con.rollback()
+            self.names = self._load_names()
+            raise
+
+        self.con.commit()
+        return dates
+
+    @traced()
+    def backfill_polarity(self, workers: Optional[int] = None, progress: Optional[Callable[[int, int], None]] = None):
+        """
+        Compute and cache polarity of entry bodies that don't have it yet.
+        Nothing is saved if `progress` raises.
+        """
+
+        cur = self.con.cursor()
+
+        rows = cur.execute("""
+        SELECT body_hash, MIN(data) FROM entries
+        WHERE body_hash NOT IN (SELECT body_hash FROM polarity WHERE analyzer = ?)
+        GROUP BY body_hash
+        """, (self.analyzer.key, )).fetchall()
+
+        if rows:
+            print(f":: Computing polarity for {len(rows)} entries using {self.analyzer.key}")
+            texts = [self._loads(data).body for _, data in rows]
+            try:
                 cur.executemany(
-                    "INSERT INTO entries (data, source_id) VALUES (?, ?)",
-                    [(entry_dumps(ent), s_id) for ent in entries]
+                    "INSERT INTO polarity (body_hash, analyzer, value) VALUES (?, ?, ?)",
+                    [(rows[i][0], self.analyzer.key, v) for i, v in score_texts(texts, self.analyzer.name, workers, progress=progress)]
                 )
+            except BaseException:
+                self.con.rollback()
+                raise
 
-            cur.execute("UPDATE sources SET cache_state = ? WHERE id = ?", (current_cache_state, s_id))
+            cur.execute("CREATE TEMP TABLE IF NOT EXISTS scored (body_hash TEXT PRIMARY KEY)")
+            cur.execute("DELETE FROM scored")
+            cur.executemany("INSERT INTO scored (body_hash) VALUES (?)", [(h, ) for h, _ in rows])
+            _update_rollups(cur, [it[0] for it in cur.execute("SELECT DISTINCT date FROM entries WHERE body_hash IN (SELECT body_hash FROM scored)").fetchall()])
 
         self.con.commit()
 
@@ -65,3 +853,25 @@ class SQLiteStore:
         cur.execute("CREATE TABLE entries (id INTEGER PRIMARY KEY, data, source_id, FOREIGN KEY (source_id) REFERENCES sources (id))")
 
         self.con.commit()
+
+    def _migrate(self):
+        cur = self.con.cursor()
+        version = cur.execute("PRAGMA user_version").fetchone()[0]
+
+        # Each migration runs in one transaction with its version so that a
+        # failed one, DDL included, leaves the database as it was. sqlite3
+        # doesn't open transactions for DDL by itself.
+        while version < len(MIGRATIONS):
+            self.con.commit()
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                # Another connection may have migrated in the meantime
+                version = cur.execute("PRAGMA user_version").fetchone()[0]
+                if version < len(MIGRATIONS):
+                    MIGRATIONS[version](cur)
+                    version += 1
+                    cur.execute(f"PRAGMA user_version = {version}")
+                self.con.commit()
+            except BaseException:
+                self.con.rollback()
+                raise
@@ -0,0 +1,112 @@
+"""
+Single pass extraction of annotations from entry bodies: trackers like
+`#mood(-1)`, people like `@name` and contexts like `+name`.
+"""
+
+import re
+from typing import (Any, Callable, Dict, Iterator, List, NamedTuple,
+                    Optional, Sequence, Tuple)
+
+from mento.types import Context, Person, Tracker
+
+NAME = r"[a-zA-Z\d\-]+"
+
+
+class ValueType(NamedTuple):
+    """
+    Kind of tracker value, as a pattern for text inside the parentheses and a
+    function that converts the matched text.
+    """
+
+    pattern: str
+    parse: Callable[[str], Any]
+
+
+def parse_duration(text: str) -> int:
+    """
+    Convert durations like 1h30m, 45m or 20s to seconds.
+    """
+
+    units = {"h": 3600, "m": 60, "s": 1}
+    return sum(int(n) * units[unit] for n, unit in re.findall(r"(\d+)([hms])", text))
+
+
+VALUE_TYPES: Dict[str, ValueType] = {
+    "int": ValueType(r"-?\d+", int),
+    "float": ValueType(r"-?\d+\.\d+", float),
+    "duration": ValueType(r"(?:\d+h)?(?:\d+m)?(?:\d+s)?(?<=[hms])", parse_duration),
+}
+
+
+KINDS = {"#": "tracker", "@": "person", "+": "context"}
+
+
+class Token(NamedTuple):
+    kind: str
+    name: str
+    value: Any
+    start: int
+    end: int
+
+
+class Tokenizer:
+    """
+    Tokenizer for annotations in a body. Tracker values are tried against
+    `value_types`, names from VALUE_TYPES, in the given order; a tracker with a
+    value that none of them match has no value.
+    """
+
+    def __init__(self, value_types: Sequence[str] = ("int", )):
+        for name in value_types:
+            if name not in VALUE_TYPES:
+                raise ValueError(f"Unknown value type: {name}")
+
+        self.value_types = list(value_types)
+        self.parsers = [VALUE_TYPES[name].parse for name in value_types]
+
+        # A single pattern for all kinds. Values are only kept for trackers,
+        # for others the parentheses can't hold another annotation anyway.
+        values = "|".join(f"({VALUE_TYPES[name].pattern})" for name in value_types)
+        self.regex = re.compile(rf"([#@+])({NAME})(?:\((?:{values})\))?" if values else rf"([#@+])({NAME})")
+
+    def _value(self, groups: Sequence[Optional[str]]) -> Any:
+        for text, parse in zip(groups, self.parsers):
+            if text:
+                return parse(text)
+        return None
+
+    def tokens(self, text: str) -> Iterator[Token]:
+        for match in self.regex.finditer(text):
+            sigil, name, *values = match.groups()
+            value = self._value(values) if sigil == "#" else None
+            yield Token(KINDS[sigil], name, value, match.start(), match.end())
+
+    def annotations(self, text: str) -> Tuple[List[Tracker], List[Person], List[Context]]:
+        """
+        Return trackers, people and contexts of `text`, each in order of
+        appearance.
+        """
+
+        trackers = []
+        people = []
+        contexts = []
+
+        parsers = self.parsers
+        for groups in self.regex.findall(text):
+            sigil = groups[0]
+            if sigil == "#":
+                value = None
+                for i, parse in enumerate(parsers, start=2):
+                    if groups[i]:
+                        value = parse(groups[i])
+                        break
+                trackers.append(Tracker(groups[1], value))
+            elif sigil == "@":
+                people.append(Person(groups[1]))
+            else:
+                contexts.append(Context(groups[1]))
+
+        return trackers, people, contexts
+
+
+TOKENIZER = Tokenizer()
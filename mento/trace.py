@@ -0,0 +1,225 @@
+"""
+Timing spans and counters for hot paths. Tracing is off unless enabled with
+the MENTO_TRACE environment variable or `--trace`, both set to a file path.
+When on, a Chrome trace (for chrome://tracing or Perfetto) is written to the
+path on exit and a summary table is printed to stderr. When off, a traced
+function costs an extra call and a check.
+"""
+
+import atexit
+import contextlib
+import functools
+import inspect
+import json
+import os
+import sys
+import threading
+import time
+from typing import (Any, Callable, Dict, Generator, Iterator, List, Optional,
+                    TypeVar, cast)
+
+ENV_VAR = "MENTO_TRACE"
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+class Tracer:
+    """
+    Collects spans and counters from all threads. Each span name keeps its
+    number of calls, total and maximum time for the summary, and spans with
+    `timeline` set are also kept as events for the trace.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.start = time.perf_counter()
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+        self.events: List[Dict[str, Any]] = []
+        self.threads: Dict[int, str] = {}
+        self.spans: Dict[str, List[float]] = {}
+        self.counters: Dict[str, float] = {}
+
+    def _event(self, event: Dict[str, Any]):
+        tid = threading.get_ident()
+        if tid not in self.threads:
+            self.threads[tid] = threading.current_thread().name
+        self.events.append({**event, "pid": self.pid, "tid": tid})
+
+    def add_span(self, name: str, begin: float, duration: float, timeline: bool = True, wall: Optional[float] = None, args: Optional[Dict[str, Any]] = None):
+        with self.lock:
+            stats = self.spans.setdefault(name, [0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += duration
+            stats[2] = max(stats[2], duration)
+
+            if timeline:
+                self._event({
+                    "name": name,
+                    "ph": "X",
+                    "ts": (begin - self.start) * 1e6,
+                    "dur": (duration if wall is None else wall) * 1e6,
+                    "args": args or {},
+                })
+
+    def add_count(self, name: str, n: float):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+            self._event({"name": name, "ph": "C", "ts": (time.perf_counter() - self.start) * 1e6, "args": {"value": self.counters[name]}})
+
+    def chrome_trace(self) -> Dict[str, Any]:
+        with self.lock:
+            names = [
+                {"name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid, "args": {"name": name}}
+                for tid, name in self.threads.items()
+            ]
+            return {"traceEvents": [*names, *self.events], "displayTimeUnit": "ms"}
+
+    def summary(self) -> str:
+        """
+        Return a table of spans, by total time, and of counters.
+        """
+
+        with self.lock:
+            lines = [f"{'span':<40}{'calls':>8}{'total ms':>12}{'mean ms':>10}{'max ms':>10}"]
+            for name, (calls, total, longest) in sorted(self.spans.items(), key=lambda it: -it[1][1]):
+                lines.append(f"{name:<40}{int(calls):>8}{total * 1000:>12.1f}{total / calls * 1000:>10.2f}{longest * 1000:>10.2f}")
+
+            if self.counters:
+                lines.append("")
+                lines.append(f"{'counter':<40}{'value':>8}")
+                for name, value in sorted(self.counters.items()):
+                    lines.append(f"{name:<40}{value:>8g}")
+
+        return "\n".join(lines)
+
+
+_tracer: Optional[Tracer] = None
+
+
+def enabled() -> bool:
+    return _tracer is not None
+
+
+def enable(path: Optional[str] = None) -> Tracer:
+    """
+    Start tracing, writing the trace to `path`, if given, and printing the
+    summary on exit.
+    """
+
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer(path)
+        atexit.register(finish)
+    return _tracer
+
+
+def disable() -> Optional[Tracer]:
+    """
+    Stop tracing and return the tracer with what was collected.
+    """
+
+    global _tracer
+    tracer, _tracer = _tracer, None
+    return tracer
+
+
+def finish():
+    import multiprocessing
+
+    # Workers inherit the setting, only the main process reports
+    tracer = disable()
+    if tracer is None or multiprocessing.parent_process() is not None:
+        return
+
+    if tracer.path:
+        with open(tracer.path, "w") as fp:
+            json.dump(tracer.chrome_trace(), fp)
+        print(f":: Trace written to {tracer.path}", file=sys.stderr)
+
+    print(tracer.summary(), file=sys.stderr)
+
+
+def count(name: str, n: float = 1):
+    tracer = _tracer
+    if tracer is not None:
+        tracer.add_count(name, n)
+
+
+@contextlib.contextmanager
+def span(name: str, **args) -> Iterator[None]:
+    tracer = _tracer
+    if tracer is None:
+        yield
+        return
+
+    begin = time.perf_counter()
+    try:
+        yield
+    finally:
+        tracer.add_span(name, begin, time.perf_counter() - begin, args=args)
+
+
+def _traced_iter(tracer: Tracer, name: str, timeline: bool, it: Generator[Any, None, None]) -> Iterator[Any]:
+    # Only time spent producing items counts, not the consumer's time between
+    # them, while the timeline shows the span from first to last item
+    begin = time.perf_counter()
+    busy = 0.0
+    items = 0
+
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(it)
+            except StopIteration:
+                return
+            finally:
+                busy += time.perf_counter() - start
+            items += 1
+            yield item
+    finally:
+        it.close()
+        tracer.add_span(name, begin, busy, timeline, wall=time.perf_counter() - begin, args={"items": items, "busy_ms": busy * 1000})
+
+
+def traced(name: Optional[str] = None, timeline: bool = True) -> Callable[[F], F]:
+    """
+    Decorator timing each call of a function as a span named `name`, or the
+    function's qualified name. Generators are timed over their iteration.
+    Spans of functions called very often should set `timeline` off so that
+    they only add up in the summary.
+    """
+
+    def _decorate(fn: F) -> F:
+        label = name or fn.__qualname__
+
+        if inspect.isgeneratorfunction(fn):
+            @functools.wraps(fn)
+            def _generator(*args, **kwargs):
+                tracer = _tracer
+                if tracer is None:
+                    return fn(*args, **kwargs)
+                return _traced_iter(tracer, label, timeline, fn(*args, **kwargs))
+
+            return cast(F, _generator)
+
+        @functools.wraps(fn)
+        def _wrapper(*args, **kwargs):
+            tracer = _tracer
+            if tracer is None:
+                return fn(*args, **kwargs)
+
+            begin = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                tracer.add_span(label, begin, time.perf_counter() - begin, timeline)
+
+        return cast(F, _wrapper)
+
+    return _decorate
+
+
+if os.environ.get(ENV_VAR):
+    enable(os.environ[ENV_VAR])
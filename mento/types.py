@@ -1,27 +1,51 @@
 import dataclasses
 import datetime
 import json
+import struct
 from dataclasses import dataclass
 from enum import Enum
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Type, TypeVar, Union
 
+T = TypeVar("T")
 
+
+def slotted(cls: Type[T]) -> Type[T]:
+    """
+    Rebuild a dataclass with __slots__ for its fields. This is what
+    `dataclass(slots=True)` does on newer pythons.
+    """
+
+    klass: Any = cls
+    fields = tuple(f.name for f in dataclasses.fields(klass))
+
+    namespace = dict(klass.__dict__)
+    namespace["__slots__"] = fields
+    for name in (*fields, "__dict__", "__weakref__"):
+        namespace.pop(name, None)
+
+    return type(klass)(klass.__name__, klass.__bases__, namespace)
+
+
+@slotted
 @dataclass
 class Tracker:
     name: str
-    value: Optional[int] = None
+    value: Optional[Union[int, float]] = None
 
 
+@slotted
 @dataclass
 class Person:
     name: str
 
 
+@slotted
 @dataclass
 class Context:
     name: str
 
 
+@slotted
 @dataclass
 class Entry:
     body: str
@@ -49,32 +73,155 @@ class Source:
     config: str
 
 
-def entry_dumps(ent: Entry) -> str:
-    def _enc(o):
-        if isinstance(o, (datetime.date, datetime.time)):
-            return o.isoformat()
+class Names:
+    """
+    Interned strings. Each name gets a small integer id in order of first
+    appearance.
+    """
+
+    def __init__(self, names: Optional[List[str]] = None):
+        self.names: List[str] = []
+        self.ids: Dict[str, int] = {}
+
+        for name in names or []:
+            self.intern(name)
+
+    def intern(self, name: str) -> int:
+        if name not in self.ids:
+            self.ids[name] = len(self.names)
+            self.names.append(name)
+        return self.ids[name]
+
+    def get(self, name: str) -> int:
+        """
+        Return id of `name`, or -1 if it was never seen.
+        """
+
+        return self.ids.get(name, -1)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+
+# Binary entry layout, all little endian:
+#
+#   header   :: version, date ordinal, seconds of day (-1 without time) and
+#               number of trackers, people and contexts (NONE for None)
+#   trackers :: name id, kind of value (VALUE_NONE, VALUE_INT or
+#               VALUE_FLOAT) and the value
+#   people and contexts :: name ids
+#   body     :: utf-8 till the end
+ENTRY_VERSION = 1
+NONE = 0xFFFF
+HEADER = struct.Struct("<BIiHHH")
+TRACKER = struct.Struct("<IBq")
+TRACKER_FLOAT = struct.Struct("<IBd")
+VALUE_NONE, VALUE_INT, VALUE_FLOAT = 0, 1, 2
 
-    return json.dumps(
-        dataclasses.asdict(ent),
-        default=_enc
-    )
 
+# Structs for runs of name ids by length
+_id_structs: Dict[int, struct.Struct] = {}
 
-def entry_loads(text: str) -> Entry:
+
+def _ids(n: int) -> struct.Struct:
+    if n not in _id_structs:
+        _id_structs[n] = struct.Struct(f"<{n}I")
+    return _id_structs[n]
+
+
+def _count(items: Optional[list]) -> int:
+    return NONE if items is None else len(items)
+
+
+def entry_dumps(ent: Entry, names: Names) -> bytes:
+    """
+    Encode entry in the compact binary layout, interning names of trackers,
+    people and contexts in `names`.
+    """
+
+    seconds = ent.time.hour * 3600 + ent.time.minute * 60 + ent.time.second if ent.time else -1
+    parts = [HEADER.pack(ENTRY_VERSION, ent.date.toordinal(), seconds, _count(ent.trackers), _count(ent.people), _count(ent.contexts))]
+
+    for t in ent.trackers or []:
+        if t.value is None:
+            parts.append(TRACKER.pack(names.intern(t.name), VALUE_NONE, 0))
+        elif isinstance(t.value, float):
+            parts.append(TRACKER_FLOAT.pack(names.intern(t.name), VALUE_FLOAT, t.value))
+        else:
+            parts.append(TRACKER.pack(names.intern(t.name), VALUE_INT, t.value))
+
+    people = [names.intern(p.name) for p in ent.people or []]
+    contexts = [names.intern(c.name) for c in ent.contexts or []]
+    parts.append(_ids(len(people) + len(contexts)).pack(*people, *contexts))
+
+    parts.append(ent.body.encode("utf-8"))
+    return b"".join(parts)
+
+
+def _entry_loads_json(text: str) -> Entry:
     d = json.loads(text)
 
-    d["date"] = datetime.datetime.strptime(d["date"], "%Y-%m-%d").date()
+    d["date"] = datetime.date.fromisoformat(d["date"])
     if d["time"]:
-        d["time"] = datetime.datetime.strptime(d["time"], "%H:%M:%S").time()
+        d["time"] = datetime.time.fromisoformat(d["time"])
 
-    # HACK: Nested dataclasses
-    if d["trackers"]:
-        d["trackers"] = [Tracker(**t) for t in d["trackers"]]
+    if d["trackers"] is not None:
+        d["trackers"] = [Tracker(t["name"], t["value"]) for t in d["trackers"]]
 
-    if d["people"]:
-        d["people"] = [Person(**t) for t in d["people"]]
+    if d["people"] is not None:
+        d["people"] = [Person(p["name"]) for p in d["people"]]
 
-    if d["contexts"]:
-        d["contexts"] = [Context(**t) for t in d["contexts"]]
+    if d["contexts"] is not None:
+        d["contexts"] = [Context(c["name"]) for c in d["contexts"]]
 
     return Entry(**d)
+
+
+def entry_loads(data: Union[bytes, str], names: Optional[Names] = None) -> Entry:
+    """
+    Decode entry from the binary layout, resolving names from `names`, or
+    from JSON as kept by older versions.
+    """
+
+    if isinstance(data, str):
+        return _entry_loads_json(data)
+
+    version, ordinal, seconds, n_trackers, n_people, n_contexts = HEADER.unpack_from(data)
+    if version != ENTRY_VERSION:
+        raise ValueError(f"Unknown entry version: {version}")
+
+    lookup = names.names if names is not None else []
+    offset = HEADER.size
+
+    trackers = None
+    if n_trackers != NONE:
+        trackers = []
+        for _ in range(n_trackers):
+            name_id, kind, value = TRACKER.unpack_from(data, offset)
+            if kind == VALUE_FLOAT:
+                value = TRACKER_FLOAT.unpack_from(data, offset)[2]
+            trackers.append(Tracker(lookup[name_id], value if kind else None))
+            offset += TRACKER.size
+
+    people = None
+    if n_people != NONE:
+        people = [Person(lookup[i]) for i in _ids(n_people).unpack_from(data, offset)]
+        offset += 4 * n_people
+
+    contexts = None
+    if n_contexts != NONE:
+        contexts = [Context(lookup[i]) for i in _ids(n_contexts).unpack_from(data, offset)]
+        offset += 4 * n_contexts
+
+    time = None
+    if seconds >= 0:
+        time = datetime.time(seconds // 3600, seconds // 60 % 60, seconds % 60)
+
+    return Entry(
+        str(data[offset:], "utf-8"),
+        datetime.date.fromordinal(ordinal),
+        time,
+        trackers,
+        people,
+        contexts
+    )
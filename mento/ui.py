@@ -1,46 +1,275 @@
+import bisect
+import contextlib
 import datetime
-from typing import Callable, List
+import queue
+import threading
+from collections import OrderedDict
+from typing import (Any, Callable, Dict, List, Optional, Sequence, Set,
+                    Tuple)
 
 import dominate.tags as T
 import dominate.util
 import matplotlib.pyplot as plt
 import orgpython
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import QObject, QRunnable, Qt, QThreadPool, pyqtSignal
 from PyQt5.QtGui import QTextCursor, QTextDocument
-from PyQt5.QtWidgets import (QComboBox, QHBoxLayout, QMainWindow, QSplitter,
+from PyQt5.QtWidgets import (QComboBox, QHBoxLayout, QInputDialog, QLineEdit,
+                             QMainWindow, QProgressBar, QScrollBar, QSplitter,
                              QStatusBar, QTextEdit, QToolButton, QVBoxLayout,
                              QWidget)
 
-import mento.stats as stats
 import mento.viz as viz
-from mento.types import Entry
+from mento.decrypt import DEFAULT_WORKERS
+from mento.profile import StartupProfile
+from mento.render import (CORRELATION_FEATURES, PLOT_TYPES, calendar_colors,
+                          year_correlations)
+from mento.store import EntryView, SQLiteStore
+from mento.trace import traced
+from mento.types import Entry, Source, SourceType
+from mento.util import text_hash
+from mento.watch import Watcher, watch_changes
+
+
+class Cancelled(Exception):
+    pass
+
+
+class TaskSignals(QObject):
+    done = pyqtSignal(object)
+    failed = pyqtSignal(str)
+    progress = pyqtSignal(int, int)
+    finished = pyqtSignal()
+
+
+class Task(QRunnable):
+    """
+    Job for a thread pool. `fn` is called with the task so that it can report
+    progress and stop early once cancelled. Results are sent to the GUI
+    thread with the task's signals.
+    """
+
+    def __init__(self, label: str, fn: Callable[["Task"], Any]):
+        super().__init__()
+        self.label = label
+        self.fn = fn
+        self.signals = TaskSignals()
+        self.cancelled = threading.Event()
+        self.progress: Optional[Tuple[int, int]] = None
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def check(self):
+        """
+        Raise Cancelled if the task has been cancelled.
+        """
+
+        if self.cancelled.is_set():
+            raise Cancelled()
+
+    def report(self, done: int, total: int):
+        self.check()
+        self.signals.progress.emit(done, total)
+
+    def run(self):
+        try:
+            self.check()
+            result = self.fn(self)
+            self.check()
+            self.signals.done.emit(result)
+        except Cancelled:
+            pass
+        except Exception as e:
+            self.signals.failed.emit(str(e))
+        finally:
+            self.signals.finished.emit()
+
+
+class QTasks(QObject):
+    """
+    Runs jobs on thread pools with the running job and its progress shown in
+    a status bar. A job submitted with a `key` cancels the earlier job with
+    the same key, whose result is then dropped. Serial jobs run one at a
+    time, in order.
+    """
+
+    def __init__(self, status_bar: QStatusBar):
+        super().__init__()
+        self.pool = QThreadPool()
+        self.serial_pool = QThreadPool()
+        self.serial_pool.setMaxThreadCount(1)
+
+        self.status_bar = status_bar
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setMaximumWidth(160)
+        self.progress_bar.hide()
+        status_bar.addPermanentWidget(self.progress_bar)
+
+        self.running: List[Task] = []
+        self.keyed: Dict[str, Task] = {}
+        self.message = ""
+
+    def submit(self, label: str, fn: Callable[[Task], Any], on_done: Callable[[Any], None], key: Optional[str] = None, serial: bool = False) -> Task:
+        if key is not None and key in self.keyed:
+            self.keyed.pop(key).cancel()
+
+        task = Task(label, fn)
+        task.signals.done.connect(lambda result: None if task.cancelled.is_set() else on_done(result))
+        task.signals.failed.connect(lambda message: self.status_bar.showMessage(f"{label} failed: {message}"))
+        task.signals.progress.connect(lambda done, total: self.on_progress(task, done, total))
+        task.signals.finished.connect(lambda: self.on_finished(task, key))
+
+        if key is not None:
+            self.keyed[key] = task
+        self.running.append(task)
+        self.show_status()
+
+        (self.serial_pool if serial else self.pool).start(task)
+        return task
+
+    def on_progress(self, task: Task, done: int, total: int):
+        task.progress = (done, total)
+        self.show_status()
+
+    def on_finished(self, task: Task, key: Optional[str]):
+        self.running.remove(task)
+        if key is not None and self.keyed.get(key) is task:
+            del self.keyed[key]
+        self.show_status()
+
+    def show_status(self):
+        running = [task for task in self.running if not task.cancelled.is_set()]
+
+        if not running:
+            if self.message and self.status_bar.currentMessage() == self.message:
+                self.status_bar.clearMessage()
+            self.message = ""
+            self.progress_bar.hide()
+            return
+
+        task = running[-1]
+        self.message = f"{task.label}..."
+        self.status_bar.showMessage(self.message)
+
+        if task.progress:
+            self.progress_bar.setRange(0, task.progress[1])
+            self.progress_bar.setValue(task.progress[0])
+        else:
+            self.progress_bar.setRange(0, 0)
+        self.progress_bar.show()
+
+    def shutdown(self):
+        """
+        Cancel all jobs and wait for the running ones to stop.
+        """
+
+        for task in self.running:
+            task.cancel()
+        for pool in [self.pool, self.serial_pool]:
+            pool.clear()
+            pool.waitForDone()
+
+
+_local = threading.local()
+
+
+def thread_store(store: SQLiteStore) -> SQLiteStore:
+    """
+    Return a store on the database of `store` for the calling thread, as
+    sqlite connections can't be shared across threads. Stores are kept per
+    thread and pick up names written since their last use.
+    """
+
+    stores = _local.__dict__.setdefault("stores", {})
+
+    if store.path not in stores:
+        stores[store.path] = SQLiteStore(store.path, analyzer=store.analyzer.name)
+        stores[store.path].passphrases = store.passphrases
+    else:
+        stores[store.path].reload()
+
+    return stores[store.path]
+
+
+class QPassphrase(QObject):
+    """
+    Asks for passphrases in a dialog on the GUI thread on behalf of
+    background jobs, which wait for the answer.
+    """
+
+    asked = pyqtSignal(object)
+
+    def __init__(self, parent: QWidget):
+        super().__init__(parent)
+        self.widget = parent
+        self.answers: queue.Queue = queue.Queue()
+        self.asked.connect(self.on_asked)
+
+    def __call__(self, source: Source) -> Optional[str]:
+        if source.source_type != SourceType.ORG_JOURNAL:
+            return None
+
+        self.asked.emit(source)
+        return self.answers.get()
+
+    def on_asked(self, source: Source):
+        text, ok = QInputDialog.getText(self.widget, "mento", f"Passphrase for {source.path}", QLineEdit.Password)
+        self.answers.put(text if ok else None)
+
+    def close(self):
+        # Let a job waiting for an answer go on
+        self.answers.put(None)
 
 
 class QJournal(QTextEdit):
     """
-    Widget for displaying journal entries.
+    Widget for displaying journal entries. Only a window of entries is
+    rendered. Pages are added as scrolling reaches either end of the
+    document and dropped from the other end once the window holds more than
+    `max_pages` pages. Jumping to a date away from the window renders a new
+    window around it.
     """
 
+    page_size = 50
+    max_pages = 6
+
     def __init__(self):
         super().__init__()
         self.setReadOnly(True)
         self.setStyleSheet("QTextEdit { padding:10; border: none; background-color: transparent; }")
         self.font_family = "Lora"
 
+        self.entries: Sequence[Entry] = []
+        # Rendered entries are entries[start:end], each starting at its
+        # document position in `positions`
+        self.start = self.end = 0
+        self.positions: List[int] = []
+        self.paging = False
+        # Body HTML keyed by hash of entry body
+        self.html_cache: Dict[str, str] = {}
+
+        self.scrollbar().valueChanged.connect(self.on_scroll)
+
     def format_entry_dt(self, entry: Entry) -> str:
         if entry.time:
             return datetime.datetime.combine(entry.date, entry.time).strftime("%b %d %Y %H:%M:%S")
         else:
             return entry.date.strftime("%b %d %Y")
 
+    def format_body(self, body: str) -> str:
+        key = text_hash(body)
+        if key not in self.html_cache:
+            self.html_cache[key] = orgpython.to_html(body.strip())
+        return self.html_cache[key]
+
     def format_entry(self, entry: Entry) -> str:
         div = T.div(style=f"font-family: {self.font_family}")
 
         div += T.div(self.format_entry_dt(entry), style="color: #999999; font-size: 13px;")
         div += T.br()
 
-        body = dominate.util.raw(orgpython.to_html(entry.body.strip()))
+        body = dominate.util.raw(self.format_body(entry.body))
         div += T.div(body, style="color: #555555; font-size: 13px;")
 
         div += T.br()
@@ -49,118 +278,537 @@ class QJournal(QTextEdit):
 
         return div.render()
 
-    def render(self, entries: List[Entry]):
-        for entry in entries:
-            self.textCursor().insertHtml(self.format_entry(entry))
+    def scrollbar(self) -> QScrollBar:
+        scrollbar = self.verticalScrollBar()
+        assert scrollbar is not None
+        return scrollbar
 
-    def scroll_to_date(self, date: datetime.date):
+    def text_document(self) -> QTextDocument:
+        document = self.document()
+        assert document is not None
+        return document
+
+    @contextlib.contextmanager
+    def changing(self):
         """
-        Scroll journal to entry on given `date`. If date is not present, don't do
-        anything.
+        Keep scrolling caused by changes to the document from paging.
         """
 
-        current_position = self.textCursor().position()
-        date_str = date.strftime("%b %d %Y")
+        paging, self.paging = self.paging, True
+        try:
+            yield
+        finally:
+            self.paging = paging
+
+    @property
+    def n_rendered(self) -> int:
+        return self.end - self.start
 
-        cursor = self.textCursor()
-        cursor.movePosition(QTextCursor.End)
-        self.setTextCursor(cursor)
+    @traced()
+    def render(self, entries: Sequence[Entry]):
+        self.entries = entries
+        self.index_dates()
+        self.render_window(0)
+
+    def render_window(self, start: int, n: Optional[int] = None):
+        """
+        Drop what is rendered and render `n` entries, a page by default, from
+        index `start`.
+        """
+
+        with self.changing():
+            self.clear()
+            self.start = self.end = min(start, len(self.entries))
+            self.positions = []
+            self.render_more(n)
 
-        found = False
-        while self.find(date_str, QTextDocument.FindFlag.FindBackward):
-            found = True
+    def index_dates(self):
+        """
+        Keep sorted dates with entries and index of the first entry for each.
+        """
 
-        if found:
-            pos = self.textCursor().position()
+        entries = self.entries
+        self.dates: List[datetime.date] = []
+        self.date_starts: List[int] = []
+        if isinstance(entries, EntryView):
+            i = 0
+            for date, n in entries.date_counts():
+                self.dates.append(date)
+                self.date_starts.append(i)
+                i += n
         else:
-            pos = current_position
+            for i, entry in enumerate(entries):
+                if not self.dates or self.dates[-1] != entry.date:
+                    self.dates.append(entry.date)
+                    self.date_starts.append(i)
+        self.date_index = dict(zip(self.dates, self.date_starts))
+
+    def first_index(self, date: datetime.date) -> int:
+        """
+        Return index of the first entry on or after `date`.
+        """
+
+        i = bisect.bisect_left(self.dates, date)
+        return self.date_starts[i] if i < len(self.dates) else len(self.entries)
+
+    def date_position(self, date: datetime.date) -> Optional[int]:
+        """
+        Return document position of the first entry on `date` if it is
+        rendered.
+        """
+
+        i = self.date_index.get(date)
+        if i is None or not self.start <= i < self.end:
+            return None
+        return self.positions[i - self.start]
+
+    def update_entries(self, entries: Sequence[Entry], dates: Set[datetime.date]):
+        """
+        Switch to `entries` where only entries on `dates` have changed. Only
+        the rendered part from the first changed date onwards is rendered
+        again. Everything till the last entry stays rendered if it was.
+        """
 
-        cursor = self.textCursor()
-        cursor.setPosition(pos)
-        self.setTextCursor(cursor)
+        first = min(dates)
+        at_end = self.end >= len(self.entries)
+        window_date, window_index = None, 0
+        if self.start < self.end:
+            i = bisect.bisect_right(self.date_starts, self.start) - 1
+            window_date, window_index = self.dates[i], self.date_starts[i]
+        n_rendered = self.n_rendered
+
+        self.entries = entries
+        self.index_dates()
+
+        # Entries before the first changed date keep their indices
+        changed = self.first_index(first)
+
+        with self.changing():
+            if window_date is not None and first <= window_date:
+                if max(dates) < window_date:
+                    # Only entries before the window changed, which moves it
+                    shift = self.first_index(window_date) - window_index
+                    self.start += shift
+                    self.end += shift
+                else:
+                    self.render_window(self.first_index(window_date), n_rendered)
+            elif changed < self.end:
+                cursor = QTextCursor(self.text_document())
+                cursor.setPosition(self.positions[changed - self.start])
+                cursor.movePosition(QTextCursor.End, QTextCursor.KeepAnchor)
+                cursor.removeSelectedText()
+
+                del self.positions[changed - self.start:]
+                self.end = changed
+
+            target = len(entries) if at_end else self.start + n_rendered
+            if target > self.end:
+                self.render_more(target - self.end)
+
+    def render_more(self, n: Optional[int] = None):
+        """
+        Render next `n` entries, a page by default, at the end of the
+        document, dropping entries from the start over `max_pages` pages.
+        """
+
+        end = min(len(self.entries), self.end + (n or self.page_size))
+
+        with self.changing():
+            cursor = QTextCursor(self.text_document())
+            cursor.movePosition(QTextCursor.End)
+
+            for entry in self.entries[self.end:end]:
+                self.positions.append(cursor.position())
+                cursor.insertHtml(self.format_entry(entry))
+            self.end = end
+
+            excess = self.n_rendered - self.max_pages * self.page_size
+            if excess > 0:
+                self.drop_first(excess)
+
+    def render_before(self, n: Optional[int] = None):
+        """
+        Render `n` entries, a page by default, before the window at the start
+        of the document, dropping entries from the end over `max_pages` pages.
+        The view stays where it was.
+        """
+
+        start = max(0, self.start - (n or self.page_size))
+        document = self.text_document()
+        scrollbar = self.scrollbar()
+
+        with self.changing():
+            height, count = document.size().height(), document.characterCount()
+
+            cursor = QTextCursor(document)
+            positions = []
+            for entry in self.entries[start:self.start]:
+                positions.append(cursor.position())
+                cursor.insertHtml(self.format_entry(entry))
+
+            added = document.characterCount() - count
+            self.positions = positions + [p + added for p in self.positions]
+            self.start = start
+            scrollbar.setValue(scrollbar.value() + int(document.size().height() - height))
+
+            excess = self.n_rendered - self.max_pages * self.page_size
+            if excess > 0:
+                cursor.setPosition(self.positions[-excess])
+                cursor.movePosition(QTextCursor.End, QTextCursor.KeepAnchor)
+                cursor.removeSelectedText()
+                del self.positions[-excess:]
+                self.end -= excess
+
+    def drop_first(self, n: int):
+        """
+        Drop the first `n` rendered entries, keeping the view where it was.
+        """
+
+        document = self.text_document()
+        scrollbar = self.scrollbar()
+        height = document.size().height()
+
+        cursor = QTextCursor(document)
+        cursor.setPosition(self.positions[n], QTextCursor.KeepAnchor)
+        cursor.removeSelectedText()
+
+        removed = self.positions[n]
+        self.positions = [p - removed for p in self.positions[n:]]
+        self.start += n
+        scrollbar.setValue(scrollbar.value() - int(height - document.size().height()))
+
+    def on_scroll(self, value: int):
+        if self.paging:
+            return
+
+        scrollbar = self.scrollbar()
+        if value >= scrollbar.maximum() - scrollbar.pageStep() and self.end < len(self.entries):
+            self.render_more()
+        elif value <= scrollbar.minimum() + scrollbar.pageStep() and self.start > 0:
+            self.render_before()
+
+    def nearest_date(self, date: datetime.date) -> Optional[datetime.date]:
+        """
+        Return the date closest to `date` that has entries.
+        """
+
+        i = bisect.bisect_left(self.dates, date)
+        candidates = self.dates[max(0, i - 1):i + 1]
+
+        if not candidates:
+            return None
+        return min(candidates, key=lambda dt: abs(dt - date))
+
+    def scroll_to_date(self, date: datetime.date):
+        """
+        Scroll journal to the first entry on given `date`, or on the nearest
+        date with entries if there are none on `date`. Dates just past the
+        window are rendered up to, others get a new window around them.
+        """
+
+        target = self.nearest_date(date)
+        if target is None:
+            return
+
+        i = self.date_index[target]
+        if i >= self.end and i < self.end + self.page_size:
+            self.render_more(i + 1 - self.end)
+        elif not self.start <= i < self.end:
+            self.render_window(max(0, i - self.page_size // 2))
+            if i >= self.end:
+                self.render_more(i + 1 - self.end)
+
+        with self.changing():
+            cursor = self.textCursor()
+            cursor.setPosition(self.positions[i - self.start])
+            self.setTextCursor(cursor)
+
+            # Bring the entry to the top of the view
+            scrollbar = self.scrollbar()
+            scrollbar.setValue(scrollbar.value() + self.cursorRect().top())
 
 
 class QCalendar(FigureCanvasQTAgg):
     """
     Calendar plotted using matplotlib.
+
+    Grids for recently shown years are kept around and only recolored for a
+    new plot type. Day boxes are blitted over a cached background of the year
+    and finished frames are cached per (year, plot type), both with LRU
+    eviction.
+
+    With `tasks`, data for plots is computed in the background and only the
+    latest requested plot is drawn.
     """
 
-    def __init__(self, entries: List[Entry], journal_callback: Callable[[datetime.date], None]):
+    cache_size = 8
+    correlation_features = CORRELATION_FEATURES
+
+    def __init__(self, store: SQLiteStore, journal_callback: Callable[[datetime.date], None], tasks: Optional[QTasks] = None):
         self.fig = plt.figure()
         super().__init__(self.fig)
-        self.entries = entries
+        self.store = store
+        self.tasks = tasks
         self.fig.canvas.mpl_connect("pick_event", self.on_pick)
+        self.fig.canvas.mpl_connect("draw_event", self.on_draw)
+        self.fig.canvas.mpl_connect("resize_event", self.on_resize)
         self.journal_callback = journal_callback
 
+        self.grids: OrderedDict[int, viz.YearGrid] = OrderedDict()
+        self.grid: Optional[viz.YearGrid] = None
+        self.plot_artists: List[Any] = []
+        self.mood_points: Optional[viz.MoodPoints] = None
+
+        # Pixels of grid backgrounds per year and finished frames per (year,
+        # plot type). Both are only valid for the current canvas size.
+        self.backgrounds: Dict[int, Any] = {}
+        self.frames: OrderedDict[Tuple[int, str], Any] = OrderedDict()
+        self.colors: OrderedDict[Tuple[int, str], Dict[datetime.date, Any]] = OrderedDict()
+        self.key: Optional[Tuple[int, str]] = None
+
+        # Year and plot type of the colors on the grid, which can lag behind
+        # the requested `key` while its colors are computed
+        self.drawn: Optional[Tuple[int, str]] = None
+
+        # Bumped when entries change so that results computed before are
+        # dropped
+        self.generation = 0
+
     def on_pick(self, event):
         """
         Function called when a date is selected. We highlight the date and scroll
         the journal to the given position.
         """
 
-        rect = event.artist
-        self.journal_callback(rect._data["date"])
+        if self.grid and event.artist is self.grid.collection:
+            self.journal_callback(self.grid.dates[event.ind[0]])
 
-    def render(self, year: int, plot_type: str):
-        self.fig.clear()
-
-        colors = {}
-        if plot_type == "polarity":
-            ct = viz.color_transform((-1, 1))
-            for dt, v in stats.aggregate_by_date(self.entries, stats.aggregate_mean_polarity).items():
-                colors[dt] = ct(v)
-            viz.plot_year(self.fig, year, colors)
-
-        elif plot_type == "mood":
-            ct = viz.color_transform((-2, 2))
-            for dt, v in stats.aggregate_by_date(self.entries, stats.aggregate_mean_mood).items():
-                if v is not None:
-                    colors[dt] = ct(v)
-            viz.plot_year(self.fig, year, colors)
-
-        elif plot_type == "count":
-            aggregated = stats.aggregate_by_date(self.entries, len)
-            ct = viz.color_transform((0, max(aggregated.values())))
-            for dt, v in aggregated.items():
-                colors[dt] = ct(v)
-            viz.plot_year(self.fig, year, colors)
-
-        elif plot_type == "mentions":
-            aggregated = stats.aggregate_by_date(self.entries, stats.aggregate_mentions)
-            ct = viz.color_transform((0, max(aggregated.values())))
-            for dt, v in aggregated.items():
-                colors[dt] = ct(v)
-            viz.plot_year(self.fig, year, colors)
-
-        elif plot_type == "mood (hour)":
-            viz.plot_year_polar(self.fig, year, self.entries)
+    @traced()
+    def draw(self):
+        super().draw()
+
+    def on_draw(self, event):
+        """
+        After a full draw, keep the background of current grid and blit its
+        days over it.
+        """
+
+        if self.grid:
+            self.backgrounds[self.grid.year] = self.copy_from_bbox(self.fig.bbox)
+            self.blit_days()
+
+    def on_resize(self, event):
+        self.backgrounds.clear()
+        self.frames.clear()
+
+    def invalidate(self, years: Optional[Set[int]] = None):
+        """
+        Drop cached colors and frames of `years`, or of all years, to be
+        called when entries change.
+        """
+
+        for cache in [self.colors, self.frames]:
+            for key in [key for key in cache if years is None or key[0] in years]:
+                del cache[key]
+        if self.drawn and (years is None or self.drawn[0] in years):
+            self.drawn = None
+        self.mood_points = None
+        self.generation += 1
+
+    def blit_days(self):
+        for artist in self.grid.animated_artists:
+            self.fig.draw_artist(artist)
+        self.blit(self.fig.bbox)
+
+        if self.drawn is not None:
+            self.frames[self.drawn] = self.copy_from_bbox(self.fig.bbox)
+            self.frames.move_to_end(self.drawn)
+            if len(self.frames) > self.cache_size:
+                self.frames.popitem(last=False)
+
+    def compute(self, label: str, fn: Callable[[SQLiteStore], Any], on_done: Callable[[Any], None]):
+        """
+        Call `on_done` with the result of `fn` over the store, computed in the
+        background if there are tasks. A newer computation replaces a pending
+        one and results from before a change in entries are dropped.
+        """
+
+        generation = self.generation
+
+        def _done(result):
+            if self.generation == generation:
+                on_done(result)
+
+        if self.tasks is None:
+            _done(fn(self.store))
+        else:
+            self.tasks.submit(label, lambda task: fn(thread_store(self.store)), _done, key="calendar")
+
+    def set_colors(self, key: Tuple[int, str], colors: Dict[datetime.date, Any]):
+        self.colors[key] = colors
+        if len(self.colors) > self.cache_size:
+            self.colors.popitem(last=False)
+
+        if self.key == key:
+            self.draw_grid(*key)
+
+    def set_mood_points(self, points: viz.MoodPoints):
+        self.mood_points = points
+        if self.key and self.key[1] == "mood (hour)":
+            self.render(*self.key)
+
+    def show_grid(self, year: int) -> viz.YearGrid:
+        """
+        Make grid of `year` the only visible one, creating it if needed, and
+        return it.
+        """
+
+        for artist in self.plot_artists:
+            artist.remove()
+        self.plot_artists = []
+
+        for grid in self.grids.values():
+            grid.set_visible(grid.year == year)
+
+        if year not in self.grids:
+            self.grids[year] = viz.YearGrid(self.fig, year, animated=True)
+            if len(self.grids) > self.cache_size:
+                _, old = self.grids.popitem(last=False)
+                old.remove()
+                self.backgrounds.pop(old.year, None)
+
+        self.grids.move_to_end(year)
+        self.grid = self.grids[year]
+        return self.grid
 
+    @traced()
+    def plot(self, fn: Callable[[], List[Any]]):
+        """
+        Replace the grid with artists of a plot made by `fn`.
+        """
+
+        for grid in self.grids.values():
+            grid.set_visible(False)
+        for artist in self.plot_artists:
+            artist.remove()
+
+        self.grid = None
+        self.drawn = None
+        self.plot_artists = fn()
         self.fig.canvas.draw_idle()
 
+    @traced()
+    def render(self, year: int, plot_type: str):
+        self.key = key = (year, plot_type)
+
+        if plot_type == "mood (hour)":
+            points = self.mood_points
+            if points is None:
+                self.compute("Loading mood entries", lambda store: viz.MoodPoints(store.find_entries(tracker="mood")), self.set_mood_points)
+            else:
+                self.plot(lambda: viz.plot_year_polar(self.fig, year, points))
+
+        elif plot_type == "correlation":
+            def _plot(result):
+                if self.key == key:
+                    self.plot(lambda: viz.plot_year_correlation(self.fig, year, *result))
+
+            self.compute(f"Correlating {year}", lambda store: year_correlations(store, year, self.correlation_features), _plot)
+
+        elif key in self.colors:
+            self.colors.move_to_end(key)
+            self.draw_grid(year, plot_type)
+
+        else:
+            self.compute(f"Computing {plot_type} for {year}", lambda store: calendar_colors(store, year, plot_type), lambda colors: self.set_colors(key, colors))
+
+    @traced()
+    def draw_grid(self, year: int, plot_type: str):
+        key = (year, plot_type)
+        self.show_grid(year).set_colors(self.colors[key])
+        self.drawn = key
+
+        if key in self.frames:
+            self.frames.move_to_end(key)
+            self.restore_region(self.frames[key])
+            self.blit(self.fig.bbox)
+        elif year in self.backgrounds:
+            self.restore_region(self.backgrounds[year])
+            self.blit_days()
+        else:
+            self.fig.canvas.draw_idle()
+
+
+class QWatcher(QObject):
+    """
+    Watches sources from a background thread and sends batches of changed
+    paths with `changed`.
+    """
+
+    changed = pyqtSignal(object)
+
+    def __init__(self, watcher: Watcher):
+        super().__init__()
+        self.watcher = watcher
+        self.stop = threading.Event()
+        self.worker = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.worker.start()
+
+    def run(self):
+        for paths in watch_changes(self.watcher, self.stop):
+            self.changed.emit(paths)
+
+    def close(self):
+        self.stop.set()
+        self.worker.join()
+        self.watcher.close()
+
 
 class QWindow(QMainWindow):
     """
-    Main app window
+    Main app window. It opens with the entries already in the store and runs
+    refreshes, if asked for with `refresh`, in the background. With a
+    `watcher`, entries are also refreshed as sources change.
     """
 
-    def __init__(self, entries):
+    def __init__(
+            self,
+            store,
+            entries,
+            watcher: Optional[Watcher] = None,
+            refresh: bool = False,
+            force_refresh: bool = False,
+            gpg_workers: int = DEFAULT_WORKERS,
+            profile: Optional[StartupProfile] = None
+    ):
         super().__init__()
         self.setWindowTitle("mento")
+        self.store = store
+        self.gpg_workers = gpg_workers
+        self.profile = profile or StartupProfile()
 
         widget = QWidget(self)
         self.setCentralWidget(widget)
 
         layout = QHBoxLayout()
-        min_year = min([e.date for e in entries]).year
-        max_year = max([e.date for e in entries]).year
 
-        self.year = max_year
+        date_range = store.date_range()
+        self.year = date_range[1].year if date_range else datetime.date.today().year
         self.plot_type = "mood"
 
+        self.status_bar = QStatusBar()
+        self.setStatusBar(self.status_bar)
+        self.tasks = QTasks(self.status_bar)
+        self.passphrase = QPassphrase(self)
+
         self.journal = QJournal()
-        self.journal.render(entries)
+        with self.profile.phase("load entries"):
+            self.journal.render(entries)
 
-        self.calendar = QCalendar(entries, self.journal.scroll_to_date)
+        self.calendar = QCalendar(store, self.journal.scroll_to_date, self.tasks)
+        self.first_draw = self.calendar.mpl_connect("draw_event", self.on_first_draw)
 
         side_pane = QWidget()
         side_pane_layout = QVBoxLayout()
@@ -169,21 +817,19 @@ class QWindow(QMainWindow):
         controls_layout = QHBoxLayout()
 
         left_button = QToolButton()
-        left_button.setArrowType(Qt.LeftArrow)
+        left_button.setArrowType(Qt.ArrowType.LeftArrow)
         left_button.clicked.connect(self.left_click)
 
         right_button = QToolButton()
-        right_button.setArrowType(Qt.RightArrow)
+        right_button.setArrowType(Qt.ArrowType.RightArrow)
         right_button.clicked.connect(self.right_click)
 
-        years = [str(y) for y in range(min_year, max_year + 1)]
         self.combo_year = QComboBox()
-        self.combo_year.addItems(years)
         self.combo_year.activated.connect(self.combo_year_click)
-        self.refresh_combo_year()
+        self.refresh_years()
 
         self.combo_plot = QComboBox()
-        self.combo_plot.addItems(["mood", "mood (hour)", "count", "polarity", "mentions"])
+        self.combo_plot.addItems(PLOT_TYPES)
         self.combo_plot.activated.connect(self.combo_plot_click)
 
         controls_layout.addWidget(left_button)
@@ -196,18 +842,91 @@ class QWindow(QMainWindow):
         side_pane_layout.addWidget(self.journal)
         side_pane.setLayout(side_pane_layout)
 
-        splitter = QSplitter(Qt.Horizontal)
+        splitter = QSplitter(Qt.Orientation.Horizontal)
         splitter.addWidget(self.calendar)
         splitter.addWidget(side_pane)
 
         layout.addWidget(splitter)
         widget.setLayout(layout)
 
-        self.status_bar = QStatusBar()
-        self.setStatusBar(self.status_bar)
+        self.refresh_calendar()
 
+        if refresh or force_refresh:
+            self.start_refresh(force=force_refresh)
+
+        self.watcher: Optional[QWatcher] = None
+        if watcher is not None:
+            self.watcher = QWatcher(watcher)
+            self.watcher.changed.connect(lambda paths: self.start_refresh(paths=paths))
+            self.watcher.start()
+
+    def start_refresh(self, paths: Optional[Set[str]] = None, force: bool = False):
+        """
+        Refresh sources, or only those holding `paths`, in the background.
+        Refreshes run one after another.
+        """
+
+        def _refresh(task: Task) -> Set[datetime.date]:
+            return thread_store(self.store).refresh(
+                force=force,
+                gpg_workers=self.gpg_workers,
+                paths=paths,
+                progress=task.report,
+                ask=self.passphrase
+            )
+
+        task = self.tasks.submit("Refreshing sources", _refresh, self.on_refreshed, serial=True)
+
+        self.profile.begin("refresh")
+        task.signals.finished.connect(lambda: self.profile.end("refresh"))
+
+    def on_first_draw(self, event):
+        self.profile.end("first paint")
+        self.calendar.mpl_disconnect(self.first_draw)
+
+    def on_refreshed(self, dates: Set[datetime.date]):
+        if not dates:
+            return
+
+        self.store.reload()
+
+        # Move to the latest year once entries show up in an empty store
+        if not self.journal.entries:
+            self.year = max(dates).year
+
+        if isinstance(self.journal.entries, EntryView):
+            self.journal.update_entries(self.store.entry_view(), dates)
+        else:
+            self.journal.update_entries(self.store.find_entries(), dates)
+
+        self.calendar.invalidate({dt.year for dt in dates})
+        self.refresh_years()
         self.refresh_calendar()
 
+        self.status_bar.showMessage(f"Updated entries of {len(dates)} day(s)", 5000)
+
+    def closeEvent(self, event):
+        if self.watcher is not None:
+            self.watcher.close()
+        self.passphrase.close()
+        self.tasks.shutdown()
+        super().closeEvent(event)
+
+    def refresh_years(self):
+        """
+        Fill the year selector with years that have entries.
+        """
+
+        date_range = self.store.date_range()
+        if date_range:
+            min_year, max_year = date_range[0].year, date_range[1].year
+        else:
+            min_year = max_year = datetime.date.today().year
+
+        self.combo_year.clear()
+        self.combo_year.addItems([str(y) for y in range(min_year, max_year + 1)])
+        self.refresh_combo_year()
+
     def refresh_combo_year(self):
         self.combo_year.setCurrentIndex(self.combo_year.findText(str(self.year)))
 
@@ -1,28 +1,51 @@
 import datetime
 import hashlib
+import itertools
 import os
-from glob import glob
+from typing import Iterable, Iterator, List, Tuple, TypeVar
 
+from mento.trace import traced
 from mento.types import Entry
 
+# (size, mtime_ns, inode) of a file. Cheap to get and good enough to tell
+# that a file has not changed without reading it.
+Fingerprint = Tuple[int, int, int]
 
+HASH_CHUNK_SIZE = 1 << 20
+
+T = TypeVar("T")
+
+
+def file_fingerprint(filepath: str) -> Fingerprint:
+    stat = os.stat(filepath)
+    return (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+
+
+@traced()
 def file_hash(filepath: str) -> str:
-    h = hashlib.md5()
+    """
+    Hash file content in chunks so that memory use doesn't depend on the size
+    of the file.
+    """
+
+    h = hashlib.blake2b(digest_size=16)
     with open(filepath, "rb") as fp:
-        h.update(fp.read())
+        for chunk in iter(lambda: fp.read(HASH_CHUNK_SIZE), b""):
+            h.update(chunk)
     return h.hexdigest()
 
 
-def directory_hash(directory: str) -> str:
-    files = glob(os.path.join(directory, "**/*"), recursive=True)
+def text_hash(text: str) -> str:
+    return hashlib.blake2b(bytes(text, "utf-8"), digest_size=16).hexdigest()
 
-    h = hashlib.md5()
-    for filepath in files:
-        h.update(bytes(filepath, "utf-8"))
-        with open(filepath, "rb") as fp:
-            h.update(fp.read())
 
-    return h.hexdigest()
+def batched(items: Iterable[T], size: int) -> Iterator[List[T]]:
+    it = iter(items)
+    while True:
+        batch = list(itertools.islice(it, size))
+        if not batch:
+            return
+        yield batch
 
 
 def entry_dt(entry: Entry) -> datetime.datetime:
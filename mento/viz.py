@@ -1,14 +1,18 @@
 import calendar
 import datetime
-from typing import Any, Callable, Dict, List, Tuple
+from typing import Any, Callable, Dict, Iterable, List, Tuple, Union
 
 import matplotlib.colors
 import matplotlib.patches as patches
 import matplotlib.pyplot as plt
 import numpy as np
+from matplotlib.artist import Artist
 from matplotlib.axes import Axes
-from pydash import py_
+from matplotlib.collections import PatchCollection
+from matplotlib.figure import Figure
+from matplotlib.text import Text
 
+from mento.trace import traced
 from mento.types import Entry
 
 
@@ -27,56 +31,151 @@ def color_transform(bounds: Tuple[Any, Any]) -> Callable[[Any], str]:
     return lambda v: cmap((v - lb) / (ub - lb))
 
 
-def plot_year(fig: plt.Figure, year: int, colors: Dict[datetime.date, str]):
+class YearGrid:
+    """
+    Calendar grid for a year with all its artists made once. Day boxes of the
+    whole year are a single PatchCollection in figure coordinates so that
+    different plots only need to update face colors of the collection and
+    colors of the day texts. Texts are figure artists too, drawn over the
+    boxes.
+
+    With `animated` set, day boxes and texts are left out of normal draws and
+    are meant to be blitted over a cached background.
+    """
+
+    def __init__(self, fig: Figure, year: int, animated=False):
+        self.fig = fig
+        self.year = year
+        self.axs = [fig.add_subplot(4, 3, i) for i in range(1, 13)]
+
+        self.dates: List[datetime.date] = []
+        self.texts: List[Text] = []
+        boxes = []
+
+        for i, ax in enumerate(self.axs):
+            month = i + 1
+            to_fig = ax.transData + fig.transFigure.inverted()
+
+            for dt, (x, y, side) in plot_month(ax, year, month):
+                self.dates.append(dt)
+                (x0, y0), (x1, y1) = to_fig.transform([(x, y), (x + side, y + side)])
+                boxes.append(patches.Rectangle((x0, y0), x1 - x0, y1 - y0))
+                self.texts.append(fig.text((x0 + x1) / 2, (y0 + y1) / 2, f"{dt.day}", ha="center", va="center", fontfamily="Lora", fontsize="x-small", zorder=3, animated=animated))
+
+        self.collection = PatchCollection(boxes, transform=fig.transFigure, edgecolor="#eeeeee", picker=True, animated=animated)
+        fig.add_artist(self.collection)
+
+        self.title = fig.text(0.9, 0.95, f"{year}", color="#999999", fontfamily="Lora", fontsize="xx-large", ha="right")
+
+    @property
+    def animated_artists(self) -> List[Artist]:
+        return [self.collection, *self.texts]
+
+    def set_colors(self, colors: Dict[datetime.date, Any]):
+        """
+        Color day boxes using given mapping of date to color. Days without a
+        color are white.
+        """
+
+        facecolors = [colors.get(dt, "white") for dt in self.dates]
+        self.collection.set_facecolor(facecolors)
+
+        for text, color in zip(self.texts, facecolors):
+            text.set_color("#777777" if dark_foreground(color) else "white")
+
+    def set_visible(self, visible: bool):
+        for artist in [*self.axs, self.collection, *self.texts, self.title]:
+            artist.set_visible(visible)
+
+    def remove(self):
+        for artist in [*self.axs, self.collection, *self.texts, self.title]:
+            artist.remove()
+
+
+@traced()
+def plot_year(fig: Figure, year: int, colors: Dict[datetime.date, Any]) -> YearGrid:
     """
     Plot a complete year using given mapping of date to color.
     """
 
-    axs = [fig.add_subplot(4, 3, i) for i in range(1, 13)]
+    grid = YearGrid(fig, year)
+    grid.set_colors(colors)
 
-    date_patches = []
-    for i in range(0, 12):
-        month = i + 1
-        date_patches.extend(plot_month(axs[i], year, month, colors))
+    return grid
+
+
+class MoodPoints:
+    """
+    Mood entries with a time as columnar arrays sorted by month, so that
+    points of any month are a slice instead of a scan over all entries.
+    """
+
+    def __init__(self, entries: Iterable[Entry]):
+        days, minutes, moods = [], [], []
+        for e in entries:
+            if not e.time:
+                continue
+
+            mood_trackers = [t for t in e.trackers or [] if t.name == "mood"]
+            if mood_trackers:
+                # Assuming only one mood track in an entry
+                days.append(e.date.toordinal())
+                minutes.append(e.time.hour * 60 + e.time.minute)
+                moods.append(mood_trackers[0].value)
+
+        # Ordinal 1 is 0001-01-01, shift it to numpy's epoch to get months
+        dates = np.array(days, dtype=np.int64) - datetime.date(1970, 1, 1).toordinal()
+        month_keys = dates.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+        order = np.argsort(month_keys, kind="stable")
 
-    fig.suptitle(f"{year}", color="#999999", fontfamily="Lora", fontsize="xx-large", x=0.9, y=0.95, ha="right")
+        self.month_keys = month_keys[order]
+        self.theta = 2 * np.pi * np.array(minutes, dtype=np.float64)[order] / (24 * 60)
+        self.mood = np.array(moods, dtype=np.float64)[order]
+        self.jitter = np.random.normal(scale=0.2, size=len(self.mood))
 
+    def __len__(self) -> int:
+        return len(self.mood)
+
+    def month(self, year: int, month: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Return (theta, mood, jitter) arrays for points of the given month.
+        """
+
+        key = (year - 1970) * 12 + month - 1
+        lo, hi = np.searchsorted(self.month_keys, [key, key + 1])
+        return self.theta[lo:hi], self.mood[lo:hi], self.jitter[lo:hi]
+
+
+@traced()
+def plot_year_polar(fig: Figure, year: int, points: Union[MoodPoints, List[Entry]]) -> List[Artist]:
+    """
+    Plot mood entries of a year by hour of day and return the artists added
+    to the figure.
+    """
+
+    if not isinstance(points, MoodPoints):
+        points = MoodPoints(points)
 
-def plot_year_polar(fig: plt.Figure, year: int, entries: List[Entry]):
     axs = [fig.add_subplot(4, 3, i, projection="polar") for i in range(1, 13)]
 
     for i in range(0, 12):
         month = i + 1
-        plot_month_polar(axs[i], year, month, entries, show_theta_labels=(month == 1))
+        plot_month_polar(axs[i], year, month, points, show_theta_labels=(month == 1))
 
-    fig.suptitle(f"{year}", color="#999999", fontfamily="Lora", fontsize="xx-large", x=0.9, y=0.95, ha="right")
+    title = fig.text(0.9, 0.95, f"{year}", color="#999999", fontfamily="Lora", fontsize="xx-large", ha="right")
 
+    return [*axs, title]
 
-def plot_month_polar(ax: Axes, year: int, month: int, entries: List[Entry], show_theta_labels=True):
-    items = []
-    for e in entries:
-        if not e.time:
-            continue
-
-        if e.date.month != month:
-            continue
 
-        if e.date.year != year:
-            continue
-
-        mood_trackers = [t for t in e.trackers if t.name == "mood"]
-        if mood_trackers:
-            # Assuming only one mood track in an entry
-            r = mood_trackers[0].value
-            theta = 2 * np.pi * (e.time.hour * 60 + e.time.minute) / (24 * 60)
-            items.append((theta, r))
+def plot_month_polar(ax: Axes, year: int, month: int, points: MoodPoints, show_theta_labels=True):
+    theta, mood, jitter = points.month(year, month)
 
     ct = color_transform((-2, 2))
 
     ax.grid(True)
     ax.axis("off")
 
-    ax.scatter([theta for theta, _ in items], [r + np.random.normal(scale=0.2) for _, r in items], c=[ct(r) for _, r in items], alpha=0.5)
+    ax.scatter(theta, mood + jitter, c=ct(mood), alpha=0.5)
 
     ax.set_rlim(-10, 4)
     ax.set_rmax(3)
@@ -99,6 +198,37 @@ def plot_month_polar(ax: Axes, year: int, month: int, entries: List[Entry], show
     ax.text(0.16 * 2 * np.pi, 13, calendar.month_name[month], ha="right", va="top", color="#777777", fontfamily="Lora", fontstyle="italic", fontsize="medium")
 
 
+@traced()
+def plot_year_correlation(fig: Figure, year: int, names: List[str], matrices: List[Tuple[str, np.ndarray]]) -> List[Artist]:
+    """
+    Plot correlation matrices between features `names` of a year side by
+    side, one per (title, matrix), and return the artists added to the
+    figure. Rows are the earlier feature and columns the later one.
+    """
+
+    cmap = plt.get_cmap("RdBu")
+    artists: List[Artist] = []
+
+    for i, (label, matrix) in enumerate(matrices):
+        ax = fig.add_subplot(1, len(matrices), i + 1)
+        ax.imshow(np.ma.masked_invalid(matrix), cmap=cmap, vmin=-1, vmax=1)
+
+        ax.set_xticks(range(len(names)))
+        ax.set_yticks(range(len(names)))
+        ax.set_xticklabels(names, rotation=90, color="#777777", fontfamily="Lora", fontsize="x-small")
+        ax.set_yticklabels(names if i == 0 else [], color="#777777", fontfamily="Lora", fontsize="x-small")
+        ax.tick_params(length=0)
+        for spine in ax.spines.values():
+            spine.set_visible(False)
+
+        ax.set_title(label, color="#777777", fontfamily="Lora", fontstyle="italic", fontsize="medium")
+        artists.append(ax)
+
+    title = fig.text(0.9, 0.95, f"{year}", color="#999999", fontfamily="Lora", fontsize="xx-large", ha="right")
+
+    return [*artists, title]
+
+
 def dark_foreground(c) -> bool:
     """
     Tell whether the given background color needs a dark foreground.
@@ -110,12 +240,10 @@ def dark_foreground(c) -> bool:
     return brightness > (186 / 255)
 
 
-def plot_month(ax: Axes, year: int, month: int, colors: Dict[datetime.date, str]) -> List[plt.Artist]:
+def plot_month(ax: Axes, year: int, month: int) -> List[Tuple[datetime.date, Tuple[float, float, float]]]:
     """
-    Plot a month using given color mapping and return a list of rectangular
-    patches mapping to days.
-
-    Each patch has an extra `_data` property which contains date value.
+    Plot labels of a month and return (date, (x, y, side)) for boxes of its
+    days in data coordinates of `ax`.
     """
 
     ax.set_xlim((1, 8))
@@ -129,7 +257,7 @@ def plot_month(ax: Axes, year: int, month: int, colors: Dict[datetime.date, str]
 
     ax.text(8 - padding, 9 - padding, calendar.month_name[month], ha="right", va="top", color="#777777", fontfamily="Lora", fontstyle="italic", fontsize="medium")
 
-    date_patches = []
+    boxes = []
 
     row = 1
     for dt in cal.itermonthdates(year, month):
@@ -144,18 +272,10 @@ def plot_month(ax: Axes, year: int, month: int, colors: Dict[datetime.date, str]
         y = y_grid + padding
         side = 1 - 2 * padding
 
-        color = colors.get(dt, "white")
-        text_color = "#777777" if dark_foreground(color) else "white"
-
-        rect = patches.FancyBboxPatch((x, y), side, side, boxstyle="Round, pad=0, rounding_size=0.0", facecolor=color, edgecolor="#eeeeee", picker=True)
-        ax.add_patch(rect)
-
-        rect._data = {"date": dt}
-        date_patches.append(rect)
-        ax.text(x + side / 2, y + side / 2, f"{dt.day}", ha="center", va="center", color=text_color, fontfamily="Lora", fontsize="x-small")
+        boxes.append((dt, (x, y, side)))
 
         if weekday == 6:
             row += 1
 
     ax.axis("off")
-    return date_patches
+    return boxes
@@ -0,0 +1,202 @@
+"""
+Watch source files for changes. On Linux this uses inotify through libc,
+elsewhere, or if inotify can't be set up, files are polled for changes in
+their stat fingerprint.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from typing import Dict, Iterable, Iterator, List, Set
+
+from mento.util import Fingerprint, file_fingerprint
+
+# Seconds without new changes before a batch of changes is reported, and
+# between scans when polling
+DEBOUNCE = 0.5
+POLL_INTERVAL = 2.0
+
+IN_MODIFY = 0x2
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+IN_ISDIR = 0x40000000
+
+IN_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+IN_EVENT = struct.Struct("iIII")
+
+
+def directory_files(directory: str) -> List[str]:
+    """
+    Return paths of regular files directly in `directory`.
+    """
+
+    with os.scandir(directory) as it:
+        return sorted(entry.path for entry in it if entry.is_file())
+
+
+class Watcher:
+    """
+    Watches files, and files directly in directories. `poll` waits for at most
+    `timeout` seconds and returns paths that changed since the last call.
+    """
+
+    def __init__(self, paths: Iterable[str]):
+        self.paths = [os.path.abspath(p) for p in paths]
+
+    def poll(self, timeout: float) -> Set[str]:
+        raise NotImplementedError()
+
+    def close(self):
+        pass
+
+
+class PollingWatcher(Watcher):
+    def __init__(self, paths: Iterable[str], interval: float = POLL_INTERVAL):
+        super().__init__(paths)
+        self.interval = interval
+        self.state = self._scan()
+
+    def _scan(self) -> Dict[str, Fingerprint]:
+        state = {}
+        for path in self.paths:
+            for filepath in directory_files(path) if os.path.isdir(path) else [path]:
+                try:
+                    state[filepath] = file_fingerprint(filepath)
+                except FileNotFoundError:
+                    pass
+        return state
+
+    def poll(self, timeout: float) -> Set[str]:
+        time.sleep(min(timeout, self.interval))
+
+        state = self._scan()
+        changed = {p for p in state.keys() | self.state.keys() if state.get(p) != self.state.get(p)}
+        self.state = state
+
+        return changed
+
+
+class InotifyWatcher(Watcher):
+    """
+    Watcher using inotify. Files are watched through their directory so that
+    editors replacing a file on save don't end the watch.
+    """
+
+    def __init__(self, paths: Iterable[str]):
+        super().__init__(paths)
+
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "Could not initialize inotify")
+
+        self.dirs = {p for p in self.paths if os.path.isdir(p)}
+        self.files = {p for p in self.paths if p not in self.dirs}
+        self.directories: Dict[int, str] = {}
+
+        try:
+            for directory in self.dirs:
+                self._add(directory)
+            for filepath in self.files:
+                self._add(os.path.dirname(filepath))
+        except OSError:
+            os.close(self.fd)
+            raise
+
+    def _add(self, directory: str):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), IN_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"Could not watch {directory}")
+        self.directories[wd] = directory
+
+    def _wanted(self, path: str, mask: int) -> bool:
+        if path in self.files:
+            return True
+        return not mask & IN_ISDIR and os.path.dirname(path) in self.dirs
+
+    def _read(self) -> bytes:
+        chunks = []
+        while True:
+            try:
+                chunks.append(os.read(self.fd, 1 << 16))
+            except BlockingIOError:
+                return b"".join(chunks)
+
+    def poll(self, timeout: float) -> Set[str]:
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set()
+
+        data = self._read()
+        changed = set()
+        offset = 0
+
+        while offset < len(data):
+            wd, mask, _, length = IN_EVENT.unpack_from(data, offset)
+            name = data[offset + IN_EVENT.size:offset + IN_EVENT.size + length].rstrip(b"\0")
+            offset += IN_EVENT.size + length
+
+            if mask & IN_Q_OVERFLOW:
+                # Events were lost, anything could have changed
+                changed.update(self.paths)
+                continue
+
+            if mask & IN_IGNORED:
+                self.directories.pop(wd, None)
+                continue
+
+            if wd not in self.directories:
+                continue
+
+            path = os.path.join(self.directories[wd], os.fsdecode(name))
+            if self._wanted(path, mask):
+                changed.add(path)
+
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+def make_watcher(paths: Iterable[str], poll: bool = False) -> Watcher:
+    """
+    Return an inotify watcher for `paths` if possible, a polling one
+    otherwise or if `poll` is set.
+    """
+
+    paths = list(paths)
+    if not poll and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(paths)
+        except (OSError, AttributeError):
+            pass
+
+    return PollingWatcher(paths)
+
+
+def watch_changes(watcher: Watcher, stop: threading.Event, debounce: float = DEBOUNCE, idle: float = POLL_INTERVAL) -> Iterator[Set[str]]:
+    """
+    Yield sets of changed paths till `stop` is set. Changes are collected till
+    the paths are quiet for `debounce` seconds so that a save shows up as one
+    batch.
+    """
+
+    pending: Set[str] = set()
+
+    while not stop.is_set():
+        changed = watcher.poll(debounce if pending else idle)
+        if changed:
+            pending |= changed
+        elif pending:
+            yield pending
+            pending = set()
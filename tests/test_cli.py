@@ -0,0 +1,21 @@
+import subprocess
+import sys
+
+from mento.render import PLOT_TYPES
+
+HEAVY = ["PyQt5", "matplotlib", "numpy", "gnupg", "textblob", "tqdm", "dominate", "orgpython"]
+
+
+def test_cli_imports_are_light():
+    code = f"import sys, mento.cli; print(' '.join(m for m in {HEAVY!r} if m in sys.modules))"
+    out = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True).stdout
+    assert out.strip() == ""
+
+
+def test_render_unknown_plot(tmp_path):
+    code = "import mento.cli; mento.cli.main()"
+    args = ["render", str(tmp_path / "db.sqlite"), "--year=2021", f"--output={tmp_path / 'out.png'}", "--plot=nope"]
+    result = subprocess.run([sys.executable, "-c", code, *args], capture_output=True, text=True)
+
+    assert result.returncode == 1
+    assert result.stderr.strip() == "Unknown plot type: nope, expected one of: " + ", ".join(PLOT_TYPES)
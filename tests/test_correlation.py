@@ -0,0 +1,67 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from mento.correlation import CorrelationAccumulator, FeatureMatrix, correlate, feature_matrix, top_correlations
+from mento.frame import EntryFrame
+from mento.types import Context, Entry, Person, Tracker
+
+
+def test_feature_matrix():
+    entries = [
+        Entry("a", datetime.date(2021, 1, 1), datetime.time(9, 0), [Tracker("mood", 1), Tracker("attack")], [Person("x")]),
+        Entry("b", datetime.date(2021, 1, 1), datetime.time(21, 0), [Tracker("mood", 2)], [], [Context("work")]),
+        Entry("c", datetime.date(2021, 1, 3), None, [Tracker("mood", -1)]),
+    ]
+
+    matrix = feature_matrix(EntryFrame.from_entries(entries))
+    assert matrix.names == ["#mood", "#attack", "@x", "+work"]
+    assert matrix.period_start(2) == datetime.datetime(2021, 1, 3)
+    assert np.array_equal(matrix.values, np.array([
+        [1.5, 1, 1, 1],
+        [np.nan, np.nan, np.nan, np.nan],
+        [-1, 0, 0, 0],
+    ]), equal_nan=True)
+
+    hourly = feature_matrix(EntryFrame.from_entries(entries), period="hour")
+    assert hourly.period_start(0) == datetime.datetime(2021, 1, 1, 9)
+    assert hourly.values.shape == (13, 4)
+    assert list(hourly.values[-1]) == [2, 0, 0, 1]
+
+
+def pearson(x, y):
+    keep = ~np.isnan(x) & ~np.isnan(y)
+    return np.corrcoef(x[keep], y[keep])[0, 1]
+
+
+def feature_matrix_of(values):
+    return FeatureMatrix(0, "date", ["a", "b", "c"], values)
+
+
+def test_accumulator_matches_pairwise_pearson():
+    rng = np.random.default_rng(0)
+    values = rng.normal(size=(60, 3))
+    values[:, 2] = np.roll(values[:, 0], 1) + 0.1 * values[:, 2]
+    values[rng.random(values.shape) < 0.1] = np.nan
+
+    acc = correlate(feature_matrix_of(values), max_lag=2)
+
+    r, n = acc.result(0)
+    assert r[0, 1] == pytest.approx(pearson(values[:, 0], values[:, 1]))
+    assert n[0, 1] == np.count_nonzero(~np.isnan(values[:, 0]) & ~np.isnan(values[:, 1]))
+
+    r, _ = acc.result(1)
+    assert r[0, 2] == pytest.approx(pearson(values[:-1, 0], values[1:, 2]))
+    assert r[0, 2] > 0.9
+
+    # Adding periods in chunks gives the same sums
+    incremental = CorrelationAccumulator(3, max_lag=2)
+    for chunk in np.array_split(values, [1, 2, 25, 40]):
+        incremental.update(chunk)
+
+    for lag in range(3):
+        assert np.allclose(incremental.result(lag)[0], acc.result(lag)[0], equal_nan=True)
+
+    top = top_correlations(feature_matrix_of(values), acc, k=1, feature="c")
+    assert [(c.a, c.b, c.lag) for c in top] == [("a", "c", 1)]
@@ -0,0 +1,97 @@
+import datetime
+
+import gnupg
+import pytest
+from mento.decrypt import Decryptor
+from mento.parser import parse_org_journal_file
+from mento.store import SQLiteStore
+
+PASSPHRASE = "passphrase"
+
+
+@pytest.fixture
+def gnupghome(tmp_path):
+    home = tmp_path / "gnupg"
+    home.mkdir(mode=0o700)
+
+    try:
+        gnupg.GPG(gnupghome=str(home))
+    except OSError:
+        pytest.skip("gpg is not available")
+
+    return str(home)
+
+
+def encrypt(gnupghome: str, text: str) -> str:
+    gpg = gnupg.GPG(gnupghome=gnupghome)
+    return str(gpg.encrypt(text, recipients=None, symmetric=True, passphrase=PASSPHRASE, armor=True))
+
+
+def test_decrypt_many(gnupghome):
+    ciphertexts = [encrypt(gnupghome, f"text {i}") for i in range(3)]
+
+    with Decryptor(PASSPHRASE, workers=2, gnupghome=gnupghome) as decryptor:
+        assert decryptor.decrypt_many(ciphertexts + ["garbage"]) == ["text 0", "text 1", "text 2", None]
+
+    assert decryptor.stats.calls == 4
+    assert decryptor.stats.failures == 1
+    assert decryptor.stats.wall_time > 0
+
+
+def test_parse_org_journal_file(gnupghome, tmp_path):
+    text = "* Friday, 03/12/21\n" + encrypt(gnupghome, "** 19:34 title\n#mood(1) body\n** 20:00\nnothing\n")
+    (tmp_path / "20210312").write_text(text)
+
+    with Decryptor(PASSPHRASE, gnupghome=gnupghome) as decryptor:
+        entries = list(parse_org_journal_file(str(tmp_path / "20210312"), decryptor))
+
+    assert [(e.date, e.time) for e in entries] == [
+        (datetime.date(2021, 3, 12), datetime.time(19, 34)),
+        (datetime.date(2021, 3, 12), datetime.time(20, 0))
+    ]
+    assert entries[0].body.startswith("title\n#mood(1) body")
+
+
+def test_refresh_journal_needs_passphrase(gnupghome, tmp_path, monkeypatch):
+    monkeypatch.setenv("GNUPGHOME", gnupghome)
+
+    journal = tmp_path / "journal"
+    journal.mkdir()
+    (journal / "20210312").write_text("* Friday, 03/12/21\n" + encrypt(gnupghome, "** 19:34 title\nbody\n"))
+
+    store = SQLiteStore(str(tmp_path / "db.sqlite"), analyzer="lexicon")
+    store.con.execute("INSERT INTO sources (type, path) VALUES ('ORG_JOURNAL', ?)", (str(journal), ))
+    store.con.commit()
+
+    # Without a passphrase, or with a wrong one, the source is left alone and
+    # the passphrase is asked for again
+    asked = []
+    for passphrase in [None, "wrong"]:
+        assert store.refresh(ask=lambda source: asked.append(passphrase) or passphrase) == set()
+        assert store.passphrases == {}
+        assert store.con.execute("SELECT COUNT(*) FROM files").fetchone()[0] == 0
+
+    assert asked == [None, "wrong"]
+    assert store.entries == []
+
+    assert store.refresh(ask=lambda source: PASSPHRASE) == {datetime.date(2021, 3, 12)}
+    assert [e.body for e in store.entries] == ["title\nbody"]
+
+
+def test_refresh_skips_nodes_failing_to_decrypt(gnupghome, tmp_path, monkeypatch):
+    monkeypatch.setenv("GNUPGHOME", gnupghome)
+
+    journal = tmp_path / "journal"
+    journal.mkdir()
+    (journal / "20210312").write_text("* Friday, 03/12/21\n" + encrypt(gnupghome, "** 19:34 good\n"))
+    (journal / "20210313").write_text(
+        "* Saturday, 03/13/21\n" + encrypt(gnupghome, "** 10:00 also good\n") + "* Notes\nnot encrypted\n"
+    )
+
+    store = SQLiteStore(str(tmp_path / "db.sqlite"), analyzer="lexicon")
+    store.con.execute("INSERT INTO sources (type, path) VALUES ('ORG_JOURNAL', ?)", (str(journal), ))
+    store.con.commit()
+
+    assert store.refresh(ask=lambda source: PASSPHRASE) == {datetime.date(2021, 3, 12), datetime.date(2021, 3, 13)}
+    assert sorted(e.body for e in store.entries) == ["also good\n", "good\n"]
+    assert store.passphrases == {1: PASSPHRASE}
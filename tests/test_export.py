@@ -0,0 +1,52 @@
+import csv
+import datetime
+import io
+import json
+
+import pytest
+
+from mento.export import write_csv, write_jsonl, write_parquet
+from mento.types import Context, Entry, Person, Tracker, entry_loads
+
+ENTRIES = [
+    Entry("a, \"quoted\"\nline", datetime.date(2021, 1, 2), datetime.time(9, 30), [Tracker("mood", -1), Tracker("attack")], [Person("x")], []),
+    Entry("b", datetime.date(2021, 1, 3), None, [], [], [Context("work"), Context("home")]),
+]
+
+
+def test_write_jsonl():
+    out = io.StringIO()
+    assert write_jsonl(iter(ENTRIES), out) == 2
+
+    lines = out.getvalue().splitlines()
+    assert [entry_loads(line) for line in lines] == ENTRIES
+    assert json.loads(lines[1])["time"] is None
+
+
+def test_write_csv():
+    out = io.StringIO(newline="")
+    assert write_csv(iter(ENTRIES), out) == 2
+
+    rows = list(csv.DictReader(io.StringIO(out.getvalue(), newline="")))
+    assert rows[0] == {
+        "date": "2021-01-02",
+        "time": "09:30:00",
+        "body": "a, \"quoted\"\nline",
+        "trackers": "mood=-1;attack",
+        "people": "x",
+        "contexts": "",
+    }
+    assert rows[1]["time"] == ""
+    assert rows[1]["contexts"] == "work;home"
+
+
+def test_write_parquet(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+
+    path = str(tmp_path / "entries.parquet")
+    assert write_parquet(iter(ENTRIES), path) == 2
+
+    table = pq.read_table(path).to_pylist()
+    assert table[0]["trackers"] == [{"name": "mood", "value": -1.0}, {"name": "attack", "value": None}]
+    assert table[1]["time"] is None
+    assert table[1]["contexts"] == ["work", "home"]
@@ -0,0 +1,81 @@
+import datetime
+
+import numpy as np
+import pytest
+
+import mento.store
+from mento import stats
+from mento.frame import EntryFrame
+from mento.store import SQLiteStore
+from mento.types import Context, Entry, Person, Tracker
+
+ENTRIES = [
+    Entry("b", datetime.date(2021, 1, 2), datetime.time(10, 0), [Tracker("mood", -1)], [Person("x")], []),
+    Entry("a", datetime.date(2020, 12, 31), None, [Tracker("mood", 1)], [], [Context("work")]),
+    Entry("c", datetime.date(2021, 1, 2), datetime.time(9, 0), [Tracker("mood", 2), Tracker("mood")], [Person("y"), Person("x")], [Context("work")]),
+    Entry("d", datetime.date(2021, 1, 3), datetime.time(8, 30), [Tracker("sleep", 7)], None, None),
+]
+
+
+def assert_same(a: EntryFrame, b: EntryFrame):
+    assert list(a.dates) == list(b.dates)
+    assert list(a.minutes) == list(b.minutes)
+    assert list(a.tracker_entry) == list(b.tracker_entry)
+    assert [a.tracker_names.names[i] for i in a.tracker_name] == [b.tracker_names.names[i] for i in b.tracker_name]
+    assert np.array_equal(a.tracker_value, b.tracker_value, equal_nan=True)
+    assert list(a.people_entry) == list(b.people_entry)
+    assert [a.people_names.names[i] for i in a.people_name] == [b.people_names.names[i] for i in b.people_name]
+    assert list(a.context_entry) == list(b.context_entry)
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(mento.store, "parse_source_file", lambda source, filepath, decryptor=None: ENTRIES)
+
+    (tmp_path / "list.org").write_text("* Log\n")
+    store = SQLiteStore(str(tmp_path / "db.sqlite"), analyzer="lexicon")
+    store.con.execute("INSERT INTO sources (type, path) VALUES ('ORG_LIST', ?)", (str(tmp_path / "list.org"), ))
+    store.refresh()
+
+    return store
+
+
+def test_frame_from_store_matches_entries(store):
+    frame = EntryFrame.from_entries(ENTRIES)
+
+    assert [frame.bodies[i] for i in range(len(frame))] == ["a", "c", "b", "d"]
+    assert list(frame.minutes) == [-1, 540, 600, 510]
+    assert_same(EntryFrame.from_store(store), frame)
+
+    start = datetime.date(2021, 1, 3)
+    assert_same(EntryFrame.from_store(store, start=start), EntryFrame.from_entries([ENTRIES[3]]))
+
+    rows, values = frame.tracker("mood")
+    assert list(rows) == [0, 1, 2] and list(values) == [1, 2, -1]
+
+
+def test_take(store):
+    frame = EntryFrame.from_store(store).take(np.array([1, 2]))
+
+    assert len(frame) == 2
+    assert list(frame.people_entry) == [0, 0, 1]
+    assert list(frame.context_entry) == [0]
+
+
+def test_stats_by_date(store):
+    frame = EntryFrame.from_store(store)
+    day = datetime.date(2021, 1, 2)
+
+    assert stats.aggregate_mean_mood(ENTRIES) == pytest.approx(2 / 3)
+    assert stats.aggregate_mentions(frame) == 3
+
+    by_date = stats.aggregate_by_date(frame, stats.aggregate_mean_mood)
+    assert by_date == {datetime.date(2020, 12, 31): 1, day: 0.5, datetime.date(2021, 1, 3): None}
+    assert stats.aggregate_by_date(frame, stats.aggregate_mentions)[day] == 3
+    assert stats.aggregate_by_date(frame, stats.aggregate_count)[day] == 2
+
+    # Anything else runs per date over smaller frames
+    assert stats.aggregate_by_date(frame, lambda f: len(f.tracker_entry)) == stats.aggregate_by_date(ENTRIES, lambda f: len(f.tracker_entry))
+
+    polarity = stats.aggregate_by_date(frame, stats.aggregate_mean_polarity)
+    assert polarity == pytest.approx(stats.aggregate_by_date(ENTRIES, stats.aggregate_mean_polarity))
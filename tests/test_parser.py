@@ -1,6 +1,9 @@
+import datetime
+
 import pytest
-from mento.parser import (parse_contexts, parse_list_journal_heading,
-                          parse_people, parse_trackers)
+from mento.parser import (journal_file_date, journal_files, parse_contexts,
+                          parse_list_journal_heading, parse_people,
+                          parse_trackers)
 from mento.types import Context, Person, Tracker
 
 
@@ -40,3 +43,20 @@ def test_list_journal_parsing():
 """
 
     assert len(parse_list_journal_heading(text)) == 3
+
+
+def test_journal_files(tmp_path):
+    for name in ["20210312", "20210313.gpg", "notes.org", "12345678", ".20210314"]:
+        (tmp_path / name).write_text("")
+
+    # Nothing below the top level, like a git repository's objects
+    (tmp_path / ".git" / "objects" / "12").mkdir(parents=True)
+    (tmp_path / ".git" / "objects" / "12" / "34567890abcdef").write_text("")
+    (tmp_path / "2021").mkdir()
+    (tmp_path / "2021" / "20210315").write_text("")
+
+    assert journal_files(str(tmp_path)) == [str(tmp_path / "20210312"), str(tmp_path / "20210313.gpg")]
+    assert journal_files(str(tmp_path / "missing")) == []
+
+    assert journal_file_date("/journal/20210312.gpg") == datetime.date(2021, 3, 12)
+    assert journal_file_date("/journal/12345678") is None
@@ -0,0 +1,212 @@
+import datetime
+import random
+import re
+
+import orgparse
+import pytest
+import mento.parser
+from mento.parser import (parse_list_journal, parse_list_journal_heading,
+                          parse_org_journal_body, parse_orgzly)
+from mento.scanner import load_node, load_nodes, scan_node, scan_nodes
+
+WORDS = ["log", "Log", "felt", "okay", "#mood(-1)", "@a", "+work", "10:30", "TODO", "DONE", "[#A]",
+         ":tag:", ":a:b:", "[[https://example.com][link]]", "[[link]]", "*bold*", "  ", "State", ":"]
+
+LINES = [
+    "",
+    "  indented text",
+    ":PROPERTIES:",
+    ":CREATED:  [2021-02-21 Sun 14:59]",
+    "  :Key:  some value  ",
+    ":NOVALUE:",
+    "not a property",
+    ":END:",
+    "SCHEDULED: <2021-02-21 Sun>",
+    "CLOSED: [2021-02-21 Sun 10:00]",
+    "CLOCK: [2021-02-21 Sun 10:00]--[2021-02-21 Sun 11:00] =>  1:00",
+    "- State \"DONE\"       from \"TODO\"       [2021-02-21 Sun 10:00]",
+    ":Effort: 1:00",
+    "#+TODO: LOG | DONE",
+    "#+title: not a todo setting",
+    "+ [2021-03-12 Fri 19:34] #mood(0) hello",
+    "- [2021-03-12 Fri 19:15] @a +work",
+    "+ [2021-03-12 Fri] no time",
+    "*bold* start",
+    "*\tnot a heading",
+    "**",
+    "see [[https://example.com][the link]] and [[other]]",
+]
+
+
+def random_heading(rng, level):
+    words = [rng.choice(WORDS) for _ in range(rng.randint(0, 4))]
+    return "*" * level + " " + " ".join(words) + rng.choice(["", " ", "  "])
+
+
+def random_lines(rng, n_nodes, heading=random_heading):
+    lines = [rng.choice(LINES) for _ in range(rng.randint(0, 2))]
+    for _ in range(n_nodes):
+        lines.append(heading(rng, rng.randint(1, 3)))
+        lines.extend(rng.choice(LINES) for _ in range(rng.randint(0, 6)))
+    return lines
+
+
+def node_fields(node):
+    return node.level, node.heading, dict(node.properties), node.body
+
+
+@pytest.mark.parametrize("seed", range(300))
+def test_scan_nodes_matches_orgparse(seed):
+    rng = random.Random(seed)
+    lines = random_lines(rng, rng.randint(0, 5))
+    expected = [node_fields(n) for n in orgparse.loadi(lines)[1:]]
+
+    nodes = scan_nodes(lines)
+    if nodes is not None:
+        assert [node_fields(n) for n in nodes] == expected
+
+    text = "\n".join(lines)
+    assert [node_fields(n) for n in load_nodes(text)] == [node_fields(n) for n in orgparse.loads(text)[1:]]
+
+
+@pytest.mark.parametrize("seed", range(300))
+def test_scan_node_matches_orgparse(seed):
+    rng = random.Random(seed)
+    lines = random_lines(rng, 1)[-rng.randint(1, 7):]
+    lines[0] = random_heading(rng, rng.randint(1, 3))
+    lines = [lines[0]] + [line for line in lines[1:] if not re.match(r"\*+ ", line)]
+
+    expected = node_fields(orgparse.loadi(lines)[1])
+
+    node = scan_node(lines)
+    if node is not None:
+        assert node_fields(node) == expected
+
+    assert node_fields(load_node(lines)) == expected
+
+
+def test_scanner_falls_back_on_anomalies():
+    assert scan_node(["* log", ":PROPERTIES:", ":CREATED: [2021-02-21 Sun 14:59]", ":END:", "hello"]) is not None
+    assert scan_node(["* log", "SCHEDULED: <2021-02-21 Sun>", "hello"]) is None
+    assert scan_node(["* log", "CLOCK: [2021-02-21 Sun 10:00]", "hello"]) is None
+    assert scan_nodes(["#+TODO: LOG | DONE", "* LOG hello"]) is None
+    assert scan_node(["*\tlog"]) is None
+
+
+def outcome(fn):
+    try:
+        return fn()
+    except ValueError as e:
+        return str(e)
+
+
+def with_orgparse(monkeypatch, fn):
+    """
+    Run `fn` with the parsers loading every node through orgparse.
+    """
+
+    with monkeypatch.context() as m:
+        m.setattr(mento.parser, "load_node", lambda lines: orgparse.loadi(lines)[1])
+        m.setattr(mento.parser, "load_nodes", lambda text: orgparse.loads(text)[1:])
+        return outcome(fn)
+
+
+def orgzly_heading(rng, level):
+    return rng.choice(["* log", "* log :tag:", "** log", "* TODO log", "* not log", "* log [[link]]"])
+
+
+def list_heading(rng, level):
+    return rng.choice(["* Log", "* Log  ", "** Log :a:", "* Other", "* TODO Log"])
+
+
+@pytest.mark.parametrize("seed", range(100))
+def test_parse_orgzly_matches_orgparse(seed, tmp_path, monkeypatch):
+    rng = random.Random(seed)
+    lines = []
+    for _ in range(rng.randint(0, 5)):
+        lines.extend([orgzly_heading(rng, 1), ":PROPERTIES:", f":CREATED: [2021-02-{rng.randint(10, 28)} Sun 14:59]", ":END:"])
+        lines.extend(rng.choice(LINES) for _ in range(rng.randint(0, 3)))
+
+    path = tmp_path / "orgzly.org"
+    path.write_text("\n".join(lines))
+
+    def _parse():
+        return list(parse_orgzly(str(path)))
+
+    assert outcome(_parse) == with_orgparse(monkeypatch, _parse)
+
+
+def list_journal_baseline(text):
+    """
+    List journal parsing as it was done on a whole file orgparse tree.
+    """
+
+    entries = []
+    for node in orgparse.loads(text)[1:]:
+        if node.heading == "Log":
+            entries.extend(parse_list_journal_heading(node.body))
+    return entries
+
+
+@pytest.mark.parametrize("seed", range(100))
+def test_parse_list_journal_matches_orgparse(seed, tmp_path, monkeypatch):
+    rng = random.Random(seed)
+    text = "\n".join(random_lines(rng, rng.randint(0, 4), heading=list_heading))
+
+    path = tmp_path / "list.org"
+    path.write_text(text)
+
+    def _parse():
+        return list(parse_list_journal(str(path)))
+
+    assert outcome(_parse) == with_orgparse(monkeypatch, _parse)
+    assert outcome(_parse) == outcome(lambda: list_journal_baseline(text))
+
+
+def test_parse_list_journal_plain_text(tmp_path):
+    text = "\n".join([
+        "#+TODO: LOG | DONE",
+        "* TODO Log",
+        "+ [2021-03-12 Fri 19:34] see [[https://x.com][site]]",
+        "CLOCK: [2021-02-21 Sun 10:00]--[2021-02-21 Sun 11:00] =>  1:00",
+        "* Log",
+        "+ [2021-03-13 Sat 10:00] done",
+    ])
+    path = tmp_path / "list.org"
+    path.write_text(text)
+
+    # TODO isn't a keyword with the in-buffer setting
+    entries = list(parse_list_journal(str(path)))
+    assert [e.body for e in entries] == [" done"]
+    assert entries == list_journal_baseline(text)
+
+    path.write_text(text.split("\n", 1)[1])
+    assert [e.body for e in parse_list_journal(str(path))] == [" see site", " done"]
+
+
+class PlainDecryptor:
+    def __init__(self, texts):
+        self.texts = texts
+
+    def decrypt_many(self, ciphertexts):
+        return [self.texts[int(c)] if c.isdigit() else None for c in ciphertexts]
+
+
+def journal_heading(rng, level):
+    if level == 2:
+        return f"** {rng.randint(0, 23):02}:{rng.randint(0, 59):02} " + " ".join(rng.choice(WORDS[:7]) for _ in range(rng.randint(0, 3)))
+    return random_heading(rng, level)
+
+
+@pytest.mark.parametrize("seed", range(100))
+def test_parse_org_journal_body_matches_orgparse(seed, monkeypatch):
+    rng = random.Random(seed)
+    date = datetime.date(2021, 2, 21)
+
+    decryptor = PlainDecryptor(["\n".join(random_lines(rng, rng.randint(0, 4), heading=journal_heading)) for _ in range(3)])
+    text = "\n".join(f"* Sunday, 02/21/21 :crypt:\n{rng.choice(['0', '1', '2', 'x'])}" for _ in range(rng.randint(0, 3)))
+
+    def _parse():
+        return list(parse_org_journal_body(text, date, decryptor))
+
+    assert outcome(_parse) == with_orgparse(monkeypatch, _parse)
@@ -0,0 +1,25 @@
+import pytest
+from mento.sentiment import get_analyzer, score_texts
+
+
+def test_lexicon_analyzer():
+    analyzer = get_analyzer("lexicon")
+
+    assert analyzer.score(["a good day", "nothing", "not good"]) == pytest.approx([0.7, 0.0, -0.35])
+    assert analyzer.score(["i don't feel good", "i didn’t feel good", "can't say it's bad"]) == pytest.approx([-0.35, -0.35, 0.35])
+
+
+def test_unknown_analyzer():
+    with pytest.raises(ValueError):
+        get_analyzer("unknown")
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_score_texts_batches(workers):
+    texts = ["a good day", "a bad day", "a day"] * 5
+    progress = []
+
+    scores = dict(score_texts(texts, "lexicon", workers=workers, batch_size=4, progress=lambda done, total: progress.append((done, total))))
+
+    assert [scores[i] for i in range(len(texts))] == get_analyzer("lexicon").score(texts)
+    assert progress[-1] == (15, 15)
@@ -0,0 +1,501 @@
+import datetime
+import json
+import os
+
+import pytest
+
+import mento.store
+from mento.store import SQLiteStore
+from mento.types import Context, Entry, Person, Tracker
+
+
+@pytest.fixture
+def journal(tmp_path, monkeypatch):
+    """
+    Org journal style directory with parsing replaced by a fake that records
+    the files it was asked to parse.
+    """
+
+    directory = tmp_path / "journal"
+    directory.mkdir()
+
+    for name in ["20210101", "20210102", "20210103"]:
+        (directory / name).write_text(f"* {name}\n")
+
+    parsed = []
+
+    def _parse(source, filepath, decryptor=None):
+        parsed.append(os.path.basename(filepath))
+        return [Entry(body=os.path.basename(filepath), date=datetime.date(2021, 1, 1))]
+
+    monkeypatch.setattr(mento.store, "parse_source_file", _parse)
+    monkeypatch.setattr(mento.store, "ask_passphrase", lambda source: "secret")
+
+    store = SQLiteStore(str(tmp_path / "db.sqlite"))
+    store.con.execute("INSERT INTO sources (type, path) VALUES ('ORG_JOURNAL', ?)", (str(directory), ))
+    store.con.commit()
+
+    return store, directory, parsed
+
+
+def test_refresh_parses_only_changed_files(journal):
+    store, directory, parsed = journal
+
+    store.refresh()
+    assert sorted(parsed) == ["20210101", "20210102", "20210103"]
+
+    parsed.clear()
+    store.refresh()
+    assert parsed == []
+
+    (directory / "20210102").write_text("* changed\n")
+    (directory / "20210104").write_text("* new\n")
+    os.remove(directory / "20210101")
+
+    store.refresh()
+    assert sorted(parsed) == ["20210102", "20210104"]
+    assert sorted(e.body for e in store.entries) == ["20210102", "20210103", "20210104"]
+
+
+def test_force_refresh(journal):
+    store, _, parsed = journal
+
+    store.refresh()
+    parsed.clear()
+    store.refresh(force=True)
+
+    assert len(parsed) == 3
+    assert len(store.entries) == 3
+
+
+def test_migration_from_legacy_layout(tmp_path):
+    path = str(tmp_path / "db.sqlite")
+
+    con = mento.store.sqlite3.connect(path)
+    con.execute("CREATE TABLE sources (id INTEGER PRIMARY KEY, type, path, config, cache_state)")
+    con.execute("CREATE TABLE entries (id INTEGER PRIMARY KEY, data, source_id, FOREIGN KEY (source_id) REFERENCES sources (id))")
+    con.execute("INSERT INTO entries (data, source_id) VALUES ('{}', 1)")
+    con.commit()
+    con.close()
+
+    store = SQLiteStore(path)
+
+    assert store.con.execute("PRAGMA user_version").fetchone()[0] == len(mento.store.MIGRATIONS)
+    assert store.entries == []
+
+
+def test_failed_migration_leaves_database(tmp_path, monkeypatch):
+    path = str(tmp_path / "db.sqlite")
+    SQLiteStore(path).con.execute("INSERT INTO sources (type, path) VALUES ('ORG_LIST', 'a.org')").connection.commit()
+
+    def _fail(cur):
+        cur.execute("DROP TABLE sources")
+        raise RuntimeError("failed")
+
+    monkeypatch.setattr(mento.store, "MIGRATIONS", [*mento.store.MIGRATIONS, _fail])
+    with pytest.raises(RuntimeError):
+        SQLiteStore(path)
+
+    con = mento.store.sqlite3.connect(path)
+    assert con.execute("SELECT path FROM sources").fetchall() == [("a.org", )]
+    assert con.execute("PRAGMA user_version").fetchone()[0] == len(mento.store.MIGRATIONS) - 1
+
+
+def test_refresh_skips_hashing_unchanged_files(journal, monkeypatch):
+    store, directory, parsed = journal
+    store.refresh()
+
+    hashed = []
+    file_hash = mento.store.file_hash
+
+    def _hash(filepath):
+        hashed.append(os.path.basename(filepath))
+        return file_hash(filepath)
+
+    monkeypatch.setattr(mento.store, "file_hash", _hash)
+
+    store.refresh()
+    assert hashed == []
+
+    # Touching a file hashes it but doesn't parse it again
+    parsed.clear()
+    stat = os.stat(directory / "20210101")
+    os.utime(directory / "20210101", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    store.refresh()
+    assert hashed == ["20210101"]
+    assert parsed == []
+
+    hashed.clear()
+    store.refresh()
+    assert hashed == []
+
+
+def test_migration_from_blob_layout(tmp_path):
+    path = str(tmp_path / "db.sqlite")
+    entry = Entry(
+        body="#mood(1) with @a",
+        date=datetime.date(2021, 3, 12),
+        time=datetime.time(19, 34),
+        trackers=[Tracker("mood", 1)],
+        people=[Person("a")],
+        contexts=[]
+    )
+
+    con = mento.store.sqlite3.connect(path)
+    con.execute("CREATE TABLE sources (id INTEGER PRIMARY KEY, type, path, config, cache_state)")
+    con.execute("CREATE TABLE files (id INTEGER PRIMARY KEY, source_id, path, size, mtime, hash, inode)")
+    con.execute("CREATE TABLE entries (id INTEGER PRIMARY KEY, data, source_id, file_id)")
+    con.execute("INSERT INTO entries (data, source_id, file_id) VALUES (?, 1, 1)", (json.dumps({
+        "body": entry.body,
+        "date": "2021-03-12",
+        "time": "19:34:00",
+        "trackers": [{"name": "mood", "value": 1}],
+        "people": [{"name": "a"}],
+        "contexts": []
+    }), ))
+    con.execute("PRAGMA user_version = 2")
+    con.commit()
+    con.close()
+
+    store = SQLiteStore(path)
+
+    assert store.entries == [entry]
+    assert store.find_entries(person="a") == [entry]
+    assert store.find_entries(tracker="mood", start=datetime.date(2021, 3, 13)) == []
+    assert store.aggregate("mean", datetime.date(2021, 1, 1), datetime.date(2021, 12, 31), tracker="mood") == {datetime.date(2021, 3, 12): 1}
+
+
+@pytest.fixture
+def filled_store(tmp_path, monkeypatch):
+    entries = [
+        Entry("a", datetime.date(2020, 12, 31), None, [Tracker("mood", 1)], [], [Context("work")]),
+        Entry("b", datetime.date(2021, 1, 2), datetime.time(10, 0), [Tracker("mood", -1)], [Person("x")], []),
+        Entry("c", datetime.date(2021, 1, 2), datetime.time(9, 0), [Tracker("mood", 2), Tracker("mood")], [Person("y"), Person("x")], [Context("work")]),
+    ]
+
+    monkeypatch.setattr(mento.store, "parse_source_file", lambda source, filepath, decryptor=None: entries)
+
+    (tmp_path / "list.org").write_text("* Log\n")
+    store = SQLiteStore(str(tmp_path / "db.sqlite"))
+    store.con.execute("INSERT INTO sources (type, path) VALUES ('ORG_LIST', ?)", (str(tmp_path / "list.org"), ))
+    store.refresh()
+
+    return store
+
+
+def test_find_entries(filled_store):
+    store = filled_store
+
+    def bodies(**kwargs):
+        return [e.body for e in store.find_entries(**kwargs)]
+
+    assert bodies() == ["a", "c", "b"]
+    assert bodies(start=datetime.date(2021, 1, 1), end=datetime.date(2021, 12, 31)) == ["c", "b"]
+    assert bodies(tracker="mood") == ["a", "c", "b"]
+    assert bodies(person="y") == ["c"]
+    assert bodies(context="work", start=datetime.date(2021, 1, 1)) == ["c"]
+
+    store.refresh(force=True)
+    assert store.con.execute("SELECT COUNT(*) FROM trackers").fetchone()[0] == 4
+
+
+def test_aggregate(filled_store):
+    store = filled_store
+    start, end = datetime.date(2021, 1, 1), datetime.date(2021, 12, 31)
+    day = datetime.date(2021, 1, 2)
+
+    assert store.aggregate("count", start, end) == {day: 2}
+    assert store.aggregate("mean", start, end, tracker="mood") == {day: 0.5}
+    assert store.aggregate("mentions", start, end) == {day: 3}
+    assert store.aggregate("mentions", datetime.date(2020, 1, 1), end) == {datetime.date(2020, 12, 31): 0, day: 3}
+    assert store.aggregate("count", start, end, group_by="hour") == {9: 1, 10: 1}
+    assert store.aggregate("mean", start, end, group_by="hour", tracker="mood") == {9: 2, 10: -1}
+
+    with pytest.raises(ValueError):
+        store.aggregate("mean", start, end)
+
+
+def test_polarity_cache(filled_store, monkeypatch):
+    store = filled_store
+    start, end = datetime.date(2021, 1, 1), datetime.date(2021, 12, 31)
+
+    assert set(store.aggregate("polarity", start, end)) == {datetime.date(2021, 1, 2)}
+
+    scored = []
+
+    def _score(texts, *args, **kwargs):
+        scored.extend(texts)
+        return [(i, 0.0) for i in range(len(texts))]
+
+    monkeypatch.setattr(mento.store, "score_texts", _score)
+
+    store.refresh(force=True)
+    assert scored == []
+
+    store.con.execute("DELETE FROM polarity WHERE body_hash = (SELECT body_hash FROM entries WHERE date = '2020-12-31')")
+    store.refresh()
+    assert scored == ["a"]
+
+
+def test_refresh_multiple_sources(tmp_path):
+    store = SQLiteStore(str(tmp_path / "db.sqlite"))
+
+    for i in range(3):
+        (tmp_path / f"{i}.org").write_text(f"* Log\n+ [2021-03-1{i} Fri 19:34] #mood({i}) hello\n+ [2021-03-1{i} Fri 20:00] bye\n")
+        store.con.execute("INSERT INTO sources (type, path) VALUES ('ORG_LIST', ?)", (str(tmp_path / f"{i}.org"), ))
+    store.con.commit()
+
+    store.refresh()
+    assert store.aggregate("count", datetime.date(2021, 1, 1), datetime.date(2021, 12, 31)) == {
+        datetime.date(2021, 3, 10 + i): 2 for i in range(3)
+    }
+
+    (tmp_path / "1.org").write_text("* Log\n+ [2021-03-11 Fri 19:34] changed\n")
+    store.refresh()
+    assert [e.body.strip() for e in store.find_entries(datetime.date(2021, 3, 11), datetime.date(2021, 3, 11))] == ["changed"]
+
+
+def _crash(*args):
+    os._exit(1)
+
+
+def _unpicklable(*args):
+    pass
+
+
+_unpicklable.__qualname__ = "<local>"
+
+
+@pytest.mark.parametrize("worker, error", [(_crash, "terminated abruptly"), (_unpicklable, "pickle")])
+def test_refresh_worker_failure(tmp_path, monkeypatch, worker, error):
+    store = SQLiteStore(str(tmp_path / "db.sqlite"))
+    for i in range(2):
+        (tmp_path / f"{i}.org").write_text(f"* Log\n+ [2021-03-1{i} Fri 19:34] hello\n")
+        store.con.execute("INSERT INTO sources (type, path) VALUES ('ORG_LIST', ?)", (str(tmp_path / f"{i}.org"), ))
+    store.con.commit()
+
+    monkeypatch.setattr(mento.store, "parse_files", worker)
+
+    with pytest.raises(Exception, match=error):
+        store.refresh()
+    assert store.entries == []
+
+
+def test_passphrase_asked_before_parsing(journal, monkeypatch):
+    store, _, parsed = journal
+    events = []
+
+    monkeypatch.setattr(mento.store, "ask_passphrase", lambda source: events.append(("ask", list(parsed))))
+    store.refresh()
+
+    assert events == [("ask", [])]
+
+
+def test_refresh_inserts_in_batches(journal, monkeypatch):
+    store, _, _ = journal
+
+    def _parse(source, filepath, decryptor=None):
+        for i in range(5):
+            yield Entry(body=f"{os.path.basename(filepath)} {i}", date=datetime.date(2021, 1, 1))
+
+    monkeypatch.setattr(mento.store, "parse_source_file", _parse)
+    monkeypatch.setattr(mento.store, "BATCH_SIZE", 2)
+    monkeypatch.setattr(mento.store, "QUEUE_SIZE", 1)
+
+    store.refresh()
+    assert len(store.entries) == 15
+
+
+def test_refresh_failure_rolls_back(journal, monkeypatch):
+    store, directory, _ = journal
+    store.refresh()
+
+    def _parse(source, filepath, decryptor=None):
+        yield Entry(body="partial", date=datetime.date(2021, 1, 1))
+        raise ValueError("bad file")
+
+    monkeypatch.setattr(mento.store, "parse_source_file", _parse)
+    (directory / "20210102").write_text("* changed\n")
+
+    with pytest.raises(ValueError):
+        store.refresh()
+
+    assert sorted(e.body for e in store.entries) == ["20210101", "20210102", "20210103"]
+
+
+def test_rollups_follow_refresh(tmp_path, monkeypatch):
+    store = SQLiteStore(str(tmp_path / "db.sqlite"))
+    (tmp_path / "a.org").write_text("* Log\n+ [2021-03-10 Wed 10:00] #mood(2) with @x\n+ [2021-03-11 Thu 10:00] #mood(-1)\n")
+    (tmp_path / "b.org").write_text("* Log\n+ [2021-03-11 Thu 12:00] #mood(1)\n")
+    for name in ["a.org", "b.org"]:
+        store.con.execute("INSERT INTO sources (type, path) VALUES ('ORG_LIST', ?)", (str(tmp_path / name), ))
+    store.refresh()
+
+    start, end = datetime.date(2021, 1, 1), datetime.date(2021, 12, 31)
+    assert store.aggregate("mean", start, end, tracker="mood") == {datetime.date(2021, 3, 10): 2, datetime.date(2021, 3, 11): 0}
+    assert store.aggregate("mentions", start, end) == {datetime.date(2021, 3, 10): 1, datetime.date(2021, 3, 11): 0}
+
+    updated = []
+    update_rollups = mento.store._update_rollups
+
+    def _update(cur, dates=None):
+        updated.append(sorted(dates))
+        update_rollups(cur, dates)
+
+    monkeypatch.setattr(mento.store, "_update_rollups", _update)
+    (tmp_path / "b.org").write_text("* Log\n+ [2021-03-12 Fri 12:00] #mood(1)\n")
+    store.refresh()
+
+    assert updated[0] == ["2021-03-11", "2021-03-12"]
+    assert store.aggregate("count", start, end) == {datetime.date(2021, 3, d): 1 for d in [10, 11, 12]}
+    assert store.aggregate("mean", start, end, tracker="mood")[datetime.date(2021, 3, 11)] == -1
+
+    # Rollups match a full rebuild
+    before = store.con.execute("SELECT * FROM daily_rollups ORDER BY metric, key, date").fetchall()
+    update_rollups(store.con.cursor())
+    assert store.con.execute("SELECT * FROM daily_rollups ORDER BY metric, key, date").fetchall() == before
+
+
+def test_refresh_from_two_connections(tmp_path):
+    path = str(tmp_path / "db.sqlite")
+    first = SQLiteStore(path)
+    for name, person in [("a.org", "alice"), ("b.org", "bob")]:
+        (tmp_path / name).write_text(f"* Log\n+ [2021-03-10 Wed 10:00] with @{person}\n")
+        first.con.execute("INSERT INTO sources (type, path) VALUES ('ORG_LIST', ?)", (str(tmp_path / name), ))
+    first.con.commit()
+
+    # Both stores have loaded names before either saves any
+    second = SQLiteStore(path)
+    second.refresh(paths=[str(tmp_path / "a.org")])
+    first.refresh(paths=[str(tmp_path / "b.org")])
+
+    store = SQLiteStore(path)
+    assert sorted(p.name for e in store.entries for p in e.people) == ["alice", "bob"]
+    assert store.con.execute("SELECT name FROM names ORDER BY id").fetchall() == [("alice", ), ("bob", )]
+
+
+def test_entry_view(filled_store):
+    view = filled_store.entry_view()
+
+    assert len(view) == 3
+    assert [e.body for e in view[1:]] == ["c", "b"]
+    assert view[-1].body == "b"
+    assert view.date_counts() == [(datetime.date(2020, 12, 31), 1), (datetime.date(2021, 1, 2), 2)]
+    assert filled_store.date_range() == (datetime.date(2020, 12, 31), datetime.date(2021, 1, 2))
+
+    with pytest.raises(IndexError):
+        view[3]
+
+
+def test_entry_view_while_other_connection_writes(tmp_path):
+    path = str(tmp_path / "db.sqlite")
+    store = SQLiteStore(path)
+    for name in ["a.org", "b.org"]:
+        (tmp_path / name).write_text("* Log\n+ [2021-03-10 Wed 10:00] with @alice\n")
+        store.con.execute("INSERT INTO sources (type, path) VALUES ('ORG_LIST', ?)", (str(tmp_path / name), ))
+    store.refresh()
+    view = store.entry_view()
+
+    (tmp_path / "a.org").write_text("* Log\n+ [2021-03-09 Tue 10:00] with @bob\n")
+    SQLiteStore(path).refresh()
+
+    # Indices are of the entries at the time the view was made, with the
+    # deleted one left out
+    assert len(view) == 2
+    assert view.date_counts() == [(datetime.date(2021, 3, 10), 2)]
+    assert [e.people for e in view[0:2]] == [[Person("alice")]]
+
+    assert [e.people for e in store.entry_view()[0:2]] == [[Person("bob")], [Person("alice")]]
+
+
+def test_refresh_returns_changed_dates(journal):
+    store, directory, parsed = journal
+
+    assert store.refresh() == {datetime.date(2021, 1, 1)}
+    assert store.refresh() == set()
+
+    # Parsed again but with the same entries
+    (directory / "20210102").write_text("* changed\n")
+    assert store.refresh() == set()
+    assert parsed[-1] == "20210102"
+
+    (directory / "20210104").write_text("* new\n")
+    parsed.clear()
+    assert store.refresh(paths=[str(directory.parent / "elsewhere.org")]) == set()
+    assert parsed == []
+
+    assert store.refresh(paths=[str(directory / "20210104")]) == {datetime.date(2021, 1, 1)}
+    assert parsed == ["20210104"]
+
+
+def test_refresh_progress_and_passphrase(journal):
+    store, directory, _ = journal
+    asked = []
+    progress = []
+
+    def _ask(source):
+        asked.append(source.path)
+        return "secret"
+
+    store.refresh(progress=lambda done, total: progress.append((done, total)), ask=_ask)
+    assert asked == [str(directory)]
+    # Sources written and then entries scored
+    assert progress == [(1, 1), (3, 3)]
+
+    # Passphrases are kept for later refreshes
+    (directory / "20210104").write_text("* new\n")
+    store.refresh(ask=_ask)
+    assert asked == [str(directory)]
+    assert store.passphrases == {1: "secret"}
+
+
+def test_refresh_polarity_progress(journal):
+    store, _, _ = journal
+    progress, polarity_progress = [], []
+
+    store.refresh(
+        progress=lambda done, total: progress.append((done, total)),
+        polarity_progress=lambda done, total: polarity_progress.append((done, total))
+    )
+    assert progress == [(1, 1)]
+    assert polarity_progress == [(3, 3)]
+
+
+def test_refresh_stopped_while_scoring(journal):
+    store, _, _ = journal
+
+    class Stop(Exception):
+        pass
+
+    def _progress(done, total):
+        if total == 3:
+            raise Stop()
+
+    with pytest.raises(Stop):
+        store.refresh(progress=_progress)
+
+    assert len(store.entries) == 3
+    assert store.con.execute("SELECT COUNT(*) FROM polarity").fetchone()[0] == 0
+
+    store.refresh()
+    assert store.con.execute("SELECT COUNT(*) FROM polarity").fetchone()[0] == 3
+
+
+def test_iter_entries_and_summaries(filled_store):
+    store = filled_store
+
+    assert [e.body for e in store.iter_entries()] == ["a", "c", "b"]
+    assert [e.body for e in store.iter_entries(start=datetime.date(2021, 1, 1))] == ["c", "b"]
+    assert [e.body for e in store.iter_entries(end=datetime.date(2021, 1, 1))] == ["a"]
+
+    assert store.yearly("count") == {2020: (1, 1, 1), 2021: (2, 2, 1)}
+    assert store.yearly("tracker", "mood") == {2020: (1, 1, 1), 2021: (1, 2, 1)}
+
+    assert store.name_counts("people") == [("x", 2), ("y", 1)]
+    assert store.name_counts("trackers") == [("mood", 3)]
+    assert store.name_counts("contexts", start=datetime.date(2021, 1, 1)) == [("work", 1)]
+    assert store.name_counts("people", limit=1) == [("x", 2)]
+
+    with pytest.raises(ValueError):
+        store.name_counts("entries")
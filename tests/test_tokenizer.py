@@ -0,0 +1,46 @@
+import random
+import re
+
+import pytest
+
+from mento.tokenizer import TOKENIZER, Token, Tokenizer
+from mento.types import Context, Person, Tracker
+
+
+def reference_annotations(text):
+    trackers = [
+        Tracker(m.group(1), int(m.group(3)) if m.group(3) is not None else None)
+        for m in re.finditer(r"#([a-zA-Z\d\-]+)(\((\-?\d+)\))?", text)
+    ]
+    people = [Person(m.group(1)) for m in re.finditer(r"@([a-zA-Z\d\-]+)", text)]
+    contexts = [Context(m.group(1)) for m in re.finditer(r"\+([a-zA-Z\d\-]+)", text)]
+
+    return trackers, people, contexts
+
+
+def test_matches_separate_scans():
+    rng = random.Random(0)
+    alphabet = "ab1-#@+() .\n"
+
+    for _ in range(2000):
+        text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 30)))
+        assert TOKENIZER.annotations(text) == reference_annotations(text), text
+
+
+def test_tokens():
+    text = "slept #sleep(7h30m) at +home with @a, #mood(-1.5) #steps(900)"
+    tokens = list(Tokenizer(["duration", "float", "int"]).tokens(text))
+
+    assert tokens == [
+        Token("tracker", "sleep", 27000, 6, 19),
+        Token("context", "home", None, 23, 28),
+        Token("person", "a", None, 34, 36),
+        Token("tracker", "mood", -1.5, 38, 49),
+        Token("tracker", "steps", 900, 50, 61),
+    ]
+    assert [t.value for t in TOKENIZER.tokens(text)] == [None, None, None, None, 900]
+
+
+def test_unknown_value_type():
+    with pytest.raises(ValueError):
+        Tokenizer(["complex"])
@@ -0,0 +1,98 @@
+import json
+
+import pytest
+
+import mento.trace as trace
+from mento.trace import traced
+
+
+@pytest.fixture
+def tracer():
+    previous = trace.disable()
+    tracer = trace.Tracer()
+    trace._tracer = tracer
+    yield tracer
+    trace._tracer = previous
+
+
+@traced()
+def add(a, b):
+    return a + b
+
+
+@traced("numbers", timeline=False)
+def numbers(n):
+    yield from range(n)
+
+
+def test_disabled_records_nothing(tracer):
+    trace.disable()
+
+    assert add(1, 2) == 3
+    assert list(numbers(3)) == [0, 1, 2]
+    trace.count("calls")
+
+    assert tracer.spans == {}
+    assert tracer.counters == {}
+    assert tracer.events == []
+
+
+def test_spans_and_counters(tracer):
+    add(1, 2)
+    add(3, 4)
+    assert list(numbers(5)) == [0, 1, 2, 3, 4]
+
+    with trace.span("block", kind="test"):
+        trace.count("things", 2)
+        trace.count("things")
+
+    assert tracer.spans["add"][0] == 2
+    assert tracer.spans["numbers"][0] == 1
+    assert tracer.spans["block"][0] == 1
+    assert tracer.counters == {"things": 3}
+
+    summary = tracer.summary()
+    for name in ["add", "numbers", "block", "things"]:
+        assert name in summary
+
+
+def test_generator_closed_early(tracer):
+    it = numbers(10)
+    assert next(it) == 0
+    it.close()
+
+    assert tracer.spans["numbers"][0] == 1
+
+
+def test_exception_still_recorded(tracer):
+    @traced("fails")
+    def _fails():
+        raise ValueError()
+
+    with pytest.raises(ValueError):
+        _fails()
+
+    assert tracer.spans["fails"][0] == 1
+
+
+def test_chrome_trace(tracer):
+    add(1, 2)
+    list(numbers(3))
+    trace.count("things")
+
+    events = json.loads(json.dumps(tracer.chrome_trace()))["traceEvents"]
+    phases = [e["ph"] for e in events]
+
+    assert phases.count("M") == 1
+    assert [e["name"] for e in events if e["ph"] == "X"] == ["add"]
+    assert [e["args"]["value"] for e in events if e["ph"] == "C"] == [1]
+
+
+def test_finish_writes_trace(tracer, tmp_path, capsys):
+    tracer.path = str(tmp_path / "trace.json")
+    add(1, 2)
+    trace.finish()
+
+    assert not trace.enabled()
+    assert "traceEvents" in json.loads((tmp_path / "trace.json").read_text())
+    assert "add" in capsys.readouterr().err
@@ -0,0 +1,44 @@
+import datetime
+import json
+import pickle
+
+import pytest
+
+from mento.types import Context, Entry, Names, Person, Tracker, entry_dumps, entry_loads
+
+
+@pytest.mark.parametrize("entry", [
+    Entry("plain", datetime.date(2021, 3, 12)),
+    Entry("", datetime.date(1, 1, 1), datetime.time(0, 0), [], [], []),
+    Entry("ünïcode ✓\n", datetime.date(2021, 3, 12), datetime.time(23, 59, 59), [Tracker("mood", -3), Tracker("attack")], [Person("a"), Person("b")], [Context("work")]),
+    Entry("big", datetime.date(9999, 12, 31), None, [Tracker("steps", 2 ** 40)], None, [Context("a"), Context("a")]),
+    Entry("float", datetime.date(2021, 3, 12), None, [Tracker("weight", 71.5), Tracker("mood", 0), Tracker("sleep", 27000)]),
+])
+def test_entry_roundtrip(entry):
+    names = Names()
+    data = entry_dumps(entry, names)
+
+    assert isinstance(data, bytes)
+    assert entry_loads(data, names) == entry
+    assert pickle.loads(pickle.dumps(entry)) == entry
+
+
+def test_entry_loads_json():
+    text = json.dumps({
+        "body": "hello",
+        "date": "2021-03-12",
+        "time": None,
+        "trackers": [{"name": "mood", "value": 1}],
+        "people": None,
+        "contexts": [{"name": "work"}]
+    })
+
+    assert entry_loads(text) == Entry("hello", datetime.date(2021, 3, 12), None, [Tracker("mood", 1)], None, [Context("work")])
+
+
+def test_slots():
+    entry = Entry("a", datetime.date(2021, 1, 1))
+
+    assert not hasattr(entry, "__dict__")
+    with pytest.raises(AttributeError):
+        entry.mood = 1
@@ -0,0 +1,189 @@
+import datetime
+import os
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+QtWidgets = pytest.importorskip("PyQt5.QtWidgets")
+
+from mento.store import SQLiteStore
+from mento.types import Entry
+from mento.ui import QCalendar, QJournal
+
+
+@pytest.fixture(scope="module")
+def app():
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+
+def day(d):
+    return datetime.date(2021, 3, d)
+
+
+def make_journal(entries, page_size=2):
+    journal = QJournal()
+    journal.page_size = page_size
+    journal.render(entries)
+    return journal
+
+
+@pytest.fixture
+def store(tmp_path):
+    (tmp_path / "list.org").write_text("* Log\n+ [2020-03-10 Tue 10:00] #mood(2)\n+ [2021-03-10 Wed 10:00] #mood(-1)\n")
+
+    store = SQLiteStore(str(tmp_path / "db.sqlite"), analyzer="lexicon")
+    store.con.execute("INSERT INTO sources (type, path) VALUES ('ORG_LIST', ?)", (str(tmp_path / "list.org"), ))
+    store.refresh()
+    return store
+
+
+def test_calendar_caches_frames_of_drawn_grid(app, store):
+    calendar = QCalendar(store, lambda date: None)
+    calendar.resize(600, 400)
+
+    calendar.render(2021, "mood")
+    calendar.draw()
+    assert list(calendar.frames) == [(2021, "mood")]
+
+    # Colors of 2020 are still being computed when the canvas draws
+    calendar.compute = lambda label, fn, on_done: None
+    calendar.render(2020, "mood")
+    calendar.frames.clear()
+    calendar.draw()
+
+    assert calendar.grid.year == 2021
+    assert list(calendar.frames) == [(2021, "mood")]
+
+    # Frames of changed years aren't cached till they are drawn again
+    calendar.invalidate({2021})
+    calendar.draw()
+    assert list(calendar.frames) == []
+
+
+def test_journal_nearest_date(app):
+    journal = make_journal([Entry("a", day(1)), Entry("b", day(5)), Entry("c", day(5)), Entry("d", day(10))])
+
+    assert journal.dates == [day(1), day(5), day(10)]
+    assert journal.date_index == {day(1): 0, day(5): 1, day(10): 3}
+
+    assert journal.nearest_date(day(5)) == day(5)
+    assert journal.nearest_date(day(2)) == day(1)
+    assert journal.nearest_date(day(4)) == day(5)
+    assert journal.nearest_date(day(8)) == day(10)
+    assert journal.nearest_date(datetime.date(2020, 1, 1)) == day(1)
+    assert journal.nearest_date(datetime.date(2022, 1, 1)) == day(10)
+
+    assert make_journal([]).nearest_date(day(1)) is None
+
+
+def test_journal_scroll_past_rendered_page(app):
+    journal = make_journal([Entry(f"entry {d}", day(d)) for d in range(1, 21)], page_size=4)
+    journal.resize(400, 300)
+    assert (journal.start, journal.end) == (0, 4)
+
+    # Dates within a page past the window are rendered up to
+    journal.scroll_to_date(day(6))
+    assert (journal.start, journal.end) == (0, 6)
+    assert journal.textCursor().position() == journal.date_position(day(6))
+
+    # Dates further away get a new window around them
+    journal.scroll_to_date(datetime.date(2021, 4, 30))
+    assert (journal.start, journal.end) == (17, 20)
+    assert journal.date_position(day(1)) is None
+    assert journal.textCursor().position() == journal.date_position(day(20))
+    assert "entry 17" not in journal.toPlainText()
+
+    # Dates inside the window don't render anything
+    journal.scroll_to_date(day(19))
+    assert (journal.start, journal.end) == (17, 20)
+    assert journal.textCursor().position() == journal.date_position(day(19))
+
+
+def test_journal_pages_at_both_ends(app):
+    journal = make_journal([Entry(f"entry {d}", day(d)) for d in range(1, 31)], page_size=2)
+    journal.max_pages = 3
+
+    journal.render_more()
+    journal.render_more()
+    assert (journal.start, journal.end) == (0, 6)
+
+    # Pages past the cap are dropped from the other end
+    journal.render_more()
+    assert (journal.start, journal.end) == (2, 8)
+    assert journal.positions[0] == 0
+    assert journal.toPlainText().startswith("Mar 03 2021")
+
+    journal.render_before()
+    assert (journal.start, journal.end) == (0, 6)
+    assert journal.toPlainText().startswith("Mar 01 2021")
+    assert "entry 7" not in journal.toPlainText()
+
+    # Positions of rendered entries stay in sync with the document
+    for i, position in enumerate(journal.positions):
+        cursor = journal.textCursor()
+        cursor.setPosition(position)
+        cursor.movePosition(cursor.EndOfBlock, cursor.KeepAnchor)
+        assert cursor.selectedText().startswith(f"Mar {i + 1:02} 2021")
+
+
+def test_journal_update_renders_from_first_changed_date(app, monkeypatch):
+    entries = [Entry(f"entry {d}", day(d)) for d in range(1, 7)]
+    journal = make_journal(entries, page_size=4)
+    positions = list(journal.positions)
+
+    rendered = []
+    format_entry = journal.format_entry
+    monkeypatch.setattr(journal, "format_entry", lambda entry: rendered.append(entry.body) or format_entry(entry))
+
+    changed = [*entries[:2], Entry("changed", day(3)), Entry("added", day(3)), *entries[3:]]
+    journal.update_entries(changed, {day(3)})
+
+    # As many entries as before are rendered, only from the changed date on
+    assert rendered == ["changed", "added"]
+    assert journal.n_rendered == 4
+    assert journal.positions[:2] == positions[:2]
+
+    text = journal.toPlainText()
+    assert "changed" in text and "added" in text and "entry 3" not in text and "entry 4" not in text
+
+    # Everything stays rendered if everything was
+    journal.render_more(10)
+    rendered.clear()
+    journal.update_entries([*changed, Entry("new", day(30))], {day(30)})
+    assert rendered == ["new"]
+    assert journal.n_rendered == 8
+
+
+def test_journal_update_before_window(app, monkeypatch):
+    entries = [Entry(f"entry {d}", day(d)) for d in range(1, 21)]
+    journal = make_journal(entries, page_size=4)
+    journal.scroll_to_date(day(15))
+    window = journal.start, journal.end
+
+    rendered = []
+    format_entry = journal.format_entry
+    monkeypatch.setattr(journal, "format_entry", lambda entry: rendered.append(entry.body) or format_entry(entry))
+
+    # Changes before the window only move it
+    journal.update_entries([Entry("added", day(1)), *entries], {day(1)})
+    assert rendered == []
+    assert (journal.start, journal.end) == (window[0] + 1, window[1] + 1)
+    assert journal.entries[journal.start].body == f"entry {window[0] + 1}"
+
+    # Changes reaching into the window render it again
+    journal.update_entries(entries, {day(1), day(15)})
+    assert rendered == [f"entry {i + 1}" for i in range(*window)]
+    assert (journal.start, journal.end) == window
+
+
+def test_journal_update_from_store(app, store, tmp_path):
+    journal = make_journal(store.entry_view())
+    assert journal.dates == [datetime.date(2020, 3, 10), datetime.date(2021, 3, 10)]
+
+    (tmp_path / "list.org").write_text("* Log\n+ [2020-03-10 Tue 10:00] #mood(2)\n+ [2021-03-09 Tue 10:00] moved\n")
+    dates = store.refresh()
+
+    journal.update_entries(store.entry_view(), dates)
+    assert journal.dates == [datetime.date(2020, 3, 10), datetime.date(2021, 3, 9)]
+    assert journal.n_rendered == 2
+    assert "moved" in journal.toPlainText()
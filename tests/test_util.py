@@ -0,0 +1,8 @@
+from mento.util import file_hash
+
+
+def test_file_hash(tmp_path):
+    (tmp_path / "a").write_bytes(b"x" * 3_000_000)
+    (tmp_path / "b").write_bytes(b"x" * 3_000_000)
+
+    assert file_hash(str(tmp_path / "a")) == file_hash(str(tmp_path / "b"))
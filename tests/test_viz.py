@@ -0,0 +1,63 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from mento.types import Entry, Tracker
+from mento.viz import MoodPoints
+
+
+def test_mood_points_by_month():
+    entries = [
+        Entry("a", datetime.date(2021, 3, 1), datetime.time(6, 0), [Tracker("mood", 1)]),
+        Entry("b", datetime.date(2020, 3, 31), datetime.time(12, 0), [Tracker("mood", -2)]),
+        Entry("c", datetime.date(2021, 3, 31), datetime.time(18, 0), [Tracker("mood", 2)]),
+        Entry("d", datetime.date(2021, 3, 2), None, [Tracker("mood", 1)]),
+        Entry("e", datetime.date(2021, 4, 1), datetime.time(0, 0), [Tracker("sleep", 8)]),
+    ]
+
+    points = MoodPoints(entries)
+    assert len(points) == 3
+
+    theta, mood, jitter = points.month(2021, 3)
+    assert np.allclose(theta, [np.pi / 2, 3 * np.pi / 2])
+    assert list(mood) == [1, 2]
+    assert len(jitter) == 2
+
+    assert list(points.month(2020, 3)[1]) == [-2]
+    assert len(points.month(2021, 4)[0]) == 0
+
+
+def test_render_year_headless(tmp_path):
+    from matplotlib.figure import Figure
+
+    from mento.render import render_year
+    from mento.store import SQLiteStore
+
+    store = SQLiteStore(str(tmp_path / "db.sqlite"))
+
+    for plot_type in ["mood", "count", "mood (hour)"]:
+        fig = Figure()
+        assert render_year(fig, store, 2021, plot_type)
+        fig.savefig(str(tmp_path / "plot.png"))
+
+    with pytest.raises(ValueError):
+        render_year(Figure(), store, 2021, "unknown")
+
+
+def test_year_grid_texts_over_boxes():
+    from matplotlib.figure import Figure
+
+    from mento.viz import plot_year
+
+    fig = Figure()
+    grid = plot_year(fig, 2021, {datetime.date(2021, 3, 1): "black"})
+
+    assert len(grid.texts) == 365
+    assert all(text in fig.texts and text.get_zorder() > grid.collection.get_zorder() for text in grid.texts)
+
+    grid.set_visible(False)
+    assert not any(text.get_visible() for text in grid.texts)
+
+    grid.remove()
+    assert fig.texts == []
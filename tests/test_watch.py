@@ -0,0 +1,79 @@
+import sys
+import threading
+
+import pytest
+from mento.watch import (InotifyWatcher, PollingWatcher, Watcher,
+                         watch_changes)
+
+
+@pytest.fixture
+def tree(tmp_path):
+    journal = tmp_path / "journal"
+    journal.mkdir()
+    (journal / "20210101").write_text("* a\n")
+
+    (tmp_path / "log.org").write_text("* log\n")
+    (tmp_path / "other.org").write_text("* other\n")
+
+    return tmp_path
+
+
+def collect(watcher, n_polls=5):
+    changed = set()
+    for _ in range(n_polls):
+        changed |= watcher.poll(0.05)
+    return changed
+
+
+def change_tree(tree):
+    (tree / "journal" / "20210101").write_text("* changed\n")
+    (tree / "journal" / "2022").mkdir()
+    (tree / "journal" / "2022" / "20220101").write_text("* new\n")
+    (tree / "log.org").write_text("* log\nmore\n")
+    (tree / "other.org").write_text("* not watched\n")
+
+
+def test_polling_watcher(tree):
+    watcher = PollingWatcher([str(tree / "journal"), str(tree / "log.org")], interval=0.01)
+    assert collect(watcher) == set()
+
+    change_tree(tree)
+    assert collect(watcher) == {str(tree / "journal" / "20210101"), str(tree / "log.org")}
+
+    (tree / "log.org").unlink()
+    assert collect(watcher) == {str(tree / "log.org")}
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify is only on Linux")
+def test_inotify_watcher(tree):
+    watcher = InotifyWatcher([str(tree / "journal"), str(tree / "log.org")])
+    try:
+        assert collect(watcher) == set()
+
+        change_tree(tree)
+        assert collect(watcher) == {str(tree / "journal" / "20210101"), str(tree / "log.org")}
+
+        # Only files directly in journal directories are watched
+        (tree / "journal" / "2022" / "20220101").write_text("* changed\n")
+        (tree / "journal" / "20210102").write_text("* new\n")
+        assert collect(watcher) == {str(tree / "journal" / "20210102")}
+    finally:
+        watcher.close()
+
+
+class FakeWatcher(Watcher):
+    def __init__(self, polls):
+        super().__init__([])
+        self.polls = list(polls)
+        self.stop = threading.Event()
+
+    def poll(self, timeout):
+        if not self.polls:
+            self.stop.set()
+            return set()
+        return self.polls.pop(0)
+
+
+def test_watch_changes_batches_till_quiet():
+    watcher = FakeWatcher([{"a"}, {"b"}, set(), set(), {"a"}, set()])
+    assert list(watch_changes(watcher, watcher.stop)) == [{"a", "b"}, {"a"}]